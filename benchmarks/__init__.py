@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for wubwub.
+
+The benchmarks follow the conventions of [airspeed velocity](https://asv.readthedocs.io/)
+(asv): classes with `setup()` and `time_*` methods, parametrized with
+`params` and `param_names`.  So they can be run with asv (see `asv.conf.json`
+at the root of the repository), or with the small runner included here,
+which needs nothing beyond wubwub itself:
+
+```
+# run everything, and save the results
+python -m benchmarks run -o before.json
+
+# run only benchmarks whose name contains "build"
+python -m benchmarks run -o after.json -b build
+
+# report speedups and regressions between two runs
+python -m benchmarks compare before.json after.json
+```
+
+All samples are synthesized in-process (see `benchmarks.common`), so no
+sample downloads are needed.
+"""
@@ -0,0 +1,216 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Minimal runner for the asv-style benchmarks in this package; see the
+package docstring for usage.
+"""
+
+import argparse
+import datetime
+import importlib
+import inspect
+import itertools
+import json
+import os
+import pkgutil
+import platform
+import statistics
+import sys
+import timeit
+
+import numpy as np
+
+import wubwub as wb
+
+PACKAGE = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
+def _benchmark_classes():
+    '''Yield (name, class) for each benchmark class in the package.'''
+    here = os.path.dirname(os.path.abspath(__file__))
+    for info in sorted(pkgutil.iter_modules([here]), key=lambda i: i.name):
+        if not info.name.startswith('bench_'):
+            continue
+        try:
+            module = importlib.import_module(f'{PACKAGE}.{info.name}')
+        except ImportError as e:
+            print(f'skipping {info.name}: {e}', file=sys.stderr)
+            continue
+        for name, obj in inspect.getmembers(module, inspect.isclass):
+            if obj.__module__ == module.__name__:
+                yield f'{info.name}.{name}', obj
+
+def _param_combinations(cls):
+    '''All combinations of the (asv-style) params of a benchmark class.'''
+    params = getattr(cls, 'params', None)
+    if params is None:
+        return [()]
+    if not getattr(cls, 'param_names', None) or len(cls.param_names) == 1:
+        params = [params]
+    return list(itertools.product(*params))
+
+def _time(func, repeat, min_time):
+    '''Time `func`, calling it enough times per repeat to take `min_time`.
+    Returns the time per call for each repeat, and the calls per repeat.'''
+    timer = timeit.Timer(func)
+    warmup = timer.timeit(number=1)
+    number = max(1, int(min_time / warmup)) if warmup > 0 else 1
+    times = [t / number for t in timer.repeat(repeat=repeat, number=number)]
+    return times, number
+
+def run(bench=None, repeat=5, min_time=0.05, verbose=True):
+    '''
+    Run the benchmarks.
+
+    Parameters
+    ----------
+    bench : str, optional
+        Only run benchmarks whose full name contains this string.
+    repeat : int, optional
+        Number of timing repeats for each benchmark. The default is 5.
+    min_time : float, optional
+        Minimum time (in seconds) for each repeat; fast benchmarks are
+        called multiple times per repeat. The default is 0.05.
+    verbose : bool, optional
+        Print each result as it is measured. The default is True.
+
+    Returns
+    -------
+    dict
+        The results, in the format written by `main()`.
+
+    '''
+    results = {}
+    for clsname, cls in _benchmark_classes():
+        methods = [m for m in dir(cls) if m.startswith('time_')]
+        for params in _param_combinations(cls):
+            for method in methods:
+                name = f'{clsname}.{method}({", ".join(map(repr, params))})'
+                if bench and bench not in name:
+                    continue
+                result = {'benchmark': f'{clsname}.{method}',
+                          'params': dict(zip(getattr(cls, 'param_names', []),
+                                             map(repr, params)))}
+                try:
+                    result.update(_run_one(cls, method, params, repeat,
+                                           min_time))
+                    shown = _format_time(result['median'])
+                except Exception as e:
+                    # record failures (like asv), but keep going
+                    result['error'] = f'{type(e).__name__}: {e}'
+                    shown = 'failed: ' + result['error']
+                results[name] = result
+                if verbose:
+                    print(f'{name:<70} {shown}')
+    return results
+
+def _run_one(cls, method, params, repeat, min_time):
+    instance = cls()
+    if hasattr(instance, 'setup'):
+        instance.setup(*params)
+    try:
+        func = getattr(instance, method)
+        times, number = _time(lambda: func(*params), repeat, min_time)
+    finally:
+        if hasattr(instance, 'teardown'):
+            instance.teardown(*params)
+    return {'median': statistics.median(times), 'min': min(times),
+            'repeat': repeat, 'number': number}
+
+def _format_time(seconds):
+    for unit, factor in [('s', 1), ('ms', 1e3), ('us', 1e6)]:
+        if seconds * factor >= 1:
+            return f'{seconds * factor:.3f}{unit}'
+    return f'{seconds * 1e9:.0f}ns'
+
+def _metadata():
+    return {'date': datetime.datetime.now().isoformat(timespec='seconds'),
+            'wubwub': wb.__version__,
+            'python': platform.python_version(),
+            'numpy': np.__version__,
+            'machine': platform.machine(),
+            'platform': platform.platform()}
+
+def compare(old, new, factor=1.1):
+    '''
+    Compare two sets of results (as loaded from the JSON written by `run`).
+
+    Parameters
+    ----------
+    old, new : dict
+        Results of the baseline and the new run.
+    factor : float, optional
+        Ratio of median times above which a change is reported as a
+        regression (or below the inverse, a speedup). The default is 1.1.
+
+    Returns
+    -------
+    rows : list of tuple
+        (name, old median, new median, ratio, status) for each benchmark
+        in both runs, with status "faster", "slower", or "".
+
+    '''
+    rows = []
+    for name in sorted(set(old['results']) & set(new['results'])):
+        a = old['results'][name].get('median')
+        b = new['results'][name].get('median')
+        if a is None or b is None:
+            continue
+        ratio = b / a if a else float('inf')
+        if ratio > factor:
+            status = 'slower'
+        elif ratio < 1 / factor:
+            status = 'faster'
+        else:
+            status = ''
+        rows.append((name, a, b, ratio, status))
+    return rows
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog=f'python -m {PACKAGE}',
+                                     description='Run or compare wubwub benchmarks.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    runp = sub.add_parser('run', help='run benchmarks')
+    runp.add_argument('-o', '--output', help='JSON file to write results to')
+    runp.add_argument('-b', '--bench', help='only run benchmarks whose name '
+                      'contains this string')
+    runp.add_argument('-r', '--repeat', type=int, default=5)
+    runp.add_argument('--min-time', type=float, default=0.05)
+
+    comp = sub.add_parser('compare', help='compare two result files')
+    comp.add_argument('old')
+    comp.add_argument('new')
+    comp.add_argument('-f', '--factor', type=float, default=1.1,
+                      help='ratio counted as a change (default 1.1)')
+    comp.add_argument('--only-changed', action='store_true')
+
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(args.bench, args.repeat, args.min_time)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump({'meta': _metadata(), 'results': results}, f,
+                          indent=2)
+        return 0
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    rows = compare(old, new, args.factor)
+    print(f'{"benchmark":<70} {"before":>10} {"after":>10} {"ratio":>7}')
+    for name, a, b, ratio, status in rows:
+        if args.only_changed and not status:
+            continue
+        print(f'{name:<70} {_format_time(a):>10} {_format_time(b):>10} '
+              f'{ratio:>7.2f} {status}')
+    slower = sum(r[4] == 'slower' for r in rows)
+    faster = sum(r[4] == 'faster' for r in rows)
+    print(f'\n{faster} faster, {slower} slower, '
+          f'{len(rows) - faster - slower} unchanged (factor {args.factor})')
+    # like `asv continuous`, fail when there are regressions
+    return 1 if slower else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
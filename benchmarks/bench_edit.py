@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for creating and editing notes.
+"""
+
+import numpy as np
+
+import wubwub as wb
+
+from .common import make_sequencer, click
+
+class MakeNotes:
+    '''Fill a Track with notes.'''
+    params = [1000, 100000]
+    param_names = ['notes']
+
+    def setup(self, notes):
+        self.seq = wb.Sequencer(bpm=120, beats=notes // 4)
+        self.track = self.seq.add_sampler(click(), name='click')
+
+    def time_make_notes_every(self, notes):
+        self.track.make_notes_every(1/4)
+
+    def time_setitem_pattern(self, notes):
+        self.track[wb.Pattern([1, 1.25, 1.5, 1.75], 1) * (notes // 4)] = wb.Note()
+
+class Quantize:
+    '''Quantize notes placed off the grid.'''
+    params = ([1000, 100000], [False, True])
+    param_names = ['notes', 'merge']
+
+    def setup(self, notes, merge):
+        beats = notes // 4
+        self.seq = wb.Sequencer(bpm=120, beats=beats)
+        self.track = self.seq.add_sampler(click(), name='click')
+        rng = np.random.default_rng(0)
+        offbeats = np.sort(rng.uniform(1, beats + 1, notes))
+        self.track.add_many(offbeats, wb.Note())
+        # quantizing is in place, so each call works on a fresh copy
+        self.scratch = wb.Sequencer(bpm=120, beats=beats)
+
+    def time_quantize(self, notes, merge):
+        track = self.track.copy(newseq=self.scratch)
+        track.quantize(1/8, merge=merge)
+        self.scratch.delete_track(track)
+
+class Arpeggiate:
+    '''Arpeggiate a chord into notes.'''
+    params = ([1/4, 1/32], wb.notes.ARPEGGIO_METHODS)
+    param_names = ['freq', 'method']
+
+    def setup(self, freq, method):
+        self.chord = wb.ArpChord([wb.Note(p) for p in ['C4', 'E4', 'G4', 'B4']],
+                                 length=64)
+
+    def time_arpeggiate(self, freq, method):
+        wb.arpeggiate(self.chord, beat=1, freq=freq, method=method, seed=0)
+
+    def time_arpeggiate_arrays(self, freq, method):
+        wb.arpeggiate_arrays(self.chord, beat=1, freq=freq, method=method,
+                             seed=0)
+
+class Seqstring:
+    '''Draw the string diagram of a Sequencer.'''
+    params = [16, 256]
+    param_names = ['beats']
+
+    def setup(self, beats):
+        self.seq = make_sequencer(tracks=8, notes=2 * beats, beats=beats)
+
+    def time_seqstring(self, beats):
+        wb.seqstring(self.seq, resolution=1/4)
+
+class Join:
+    '''Join many Sequencers, matching their Tracks.'''
+    params = ([8, 64], ['name', 'sample', 'sample+type'])
+    param_names = ['sequencers', 'on']
+
+    def setup(self, sequencers, on):
+        base = make_sequencer(tracks=16, notes=64, beats=16,
+                              sample_length=2000)
+        self.seqs = [base.copy() for _ in range(sequencers)]
+
+    def time_join(self, sequencers, on):
+        wb.join(self.seqs, on=on)
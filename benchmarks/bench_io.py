@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for reading samples.
+"""
+
+import os
+import shutil
+import tempfile
+
+from wubwub import sounds
+
+from .common import SAMPLES
+
+class SoundsLoad:
+    '''Load a sample collection with `wubwub.sounds.load()`, from a temporary
+    collection of synthetic WAV files.'''
+    params = ([4, 32], [100, 2000])
+    param_names = ['files', 'sample_length']
+
+    def setup(self, files, sample_length):
+        self.tmp = tempfile.mkdtemp()
+        folder = os.path.join(self.tmp, sounds.SAMPLESDIRNAME, 'bench')
+        os.makedirs(folder)
+        makers = list(SAMPLES.values())
+        for i in range(files):
+            sample = makers[i % len(makers)](duration=sample_length)
+            sample.export(os.path.join(folder, f'sample{i}.wav'), format='wav')
+        self.old = (sounds.SAMPLESDIR, sounds.SAMPLEFOLDERDICT)
+        sounds.SAMPLESDIR = os.path.join(self.tmp, sounds.SAMPLESDIRNAME)
+        sounds.SAMPLEFOLDERDICT = {'bench': folder}
+
+    def teardown(self, files, sample_length):
+        sounds.SAMPLESDIR, sounds.SAMPLEFOLDERDICT = self.old
+        shutil.rmtree(self.tmp)
+
+    def time_load(self, files, sample_length):
+        sounds.load('bench')
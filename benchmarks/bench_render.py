@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmarks for rendering audio.
+"""
+
+import shutil
+import tempfile
+
+import wubwub as wb
+
+from .common import make_sequencer, sine
+
+class TrackBuild:
+    '''Render one Sampler, scaling the number of notes and sample length.'''
+    params = ([16, 128, 1024], [50, 500, 2000])
+    param_names = ['notes', 'sample_length']
+
+    def setup(self, notes, sample_length):
+        seq = make_sequencer(tracks=1, notes=notes, beats=16,
+                             sample_length=sample_length)
+        self.track = seq.tracks()[0]
+
+    def time_sampler_build(self, notes, sample_length):
+        self.track.build()
+
+class SequencerBuild:
+    '''Render a whole Sequencer, scaling the number of tracks and beats.'''
+    params = ([1, 4, 16], [8, 32])
+    param_names = ['tracks', 'beats']
+
+    def setup(self, tracks, beats):
+        self.seq = make_sequencer(tracks=tracks, notes=4 * beats, beats=beats)
+
+    def time_build(self, tracks, beats):
+        self.seq.build()
+
+    def time_build_stream(self, tracks, beats):
+        self.seq.build(mode='stream')
+
+    def peakmem_build(self, tracks, beats):
+        self.seq.build()
+
+    def peakmem_build_stream(self, tracks, beats):
+        self.seq.build(mode='stream')
+
+class Estimate:
+    '''Estimate the cost of rendering a Sequencer (without rendering).'''
+    params = ([4, 16], [32, 512])
+    param_names = ['tracks', 'beats']
+
+    def setup(self, tracks, beats):
+        self.seq = make_sequencer(tracks=tracks, notes=4 * beats, beats=beats)
+
+    def time_estimate(self, tracks, beats):
+        self.seq.estimate()
+
+class StoredBuild:
+    '''Read a Sequencer build from the render store.'''
+    params = ([4, 16], [8, 32])
+    param_names = ['tracks', 'beats']
+
+    def setup(self, tracks, beats):
+        self.seq = make_sequencer(tracks=tracks, notes=4 * beats, beats=beats)
+        self.folder = tempfile.mkdtemp()
+        self.previous = wb.set_render_store(self.folder)
+        self.seq.build()
+
+    def teardown(self, tracks, beats):
+        wb.set_render_store(self.previous)
+        shutil.rmtree(self.folder)
+
+    def time_build_stored(self, tracks, beats):
+        self.seq.build()
+
+    def time_render_key(self, tracks, beats):
+        wb.render_key(self.seq)
+
+class OptimizedBuild:
+    '''Render layered copies of a sample, with and without the render graph.'''
+    params = [2, 8]
+    param_names = ['layers']
+
+    def setup(self, layers):
+        self.seq = wb.Sequencer(bpm=120, beats=16)
+        sample = sine(300)
+        for i in range(layers):
+            track = self.seq.add_sampler(sample, name=f'layer{i}')
+            track.make_notes_every(1/2, pitches=[0, 7, 0, 12], volumes=-12)
+
+    def time_build(self, layers):
+        self.seq.optimize = False
+        self.seq.build()
+
+    def time_build_optimized(self, layers):
+        self.seq.optimize = True
+        self.seq.build()
+
+    def time_report(self, layers):
+        self.seq.render_graph().report()
+
+class MixedFormatBuild:
+    '''Render samples recorded at other rates, in a render format.'''
+    params = [22050, 44100, 48000]
+    param_names = ['frame_rate']
+
+    def setup(self, frame_rate):
+        self.seq = wb.Sequencer(bpm=120, beats=16, frame_rate=frame_rate)
+        for i, rate in enumerate([22050, 32000, 44100, 48000]):
+            track = self.seq.add_sampler(sine(300, rate=rate), name=f's{i}')
+            track.make_notes_every(1/4, pitches=[0, 5, 7])
+
+    def time_build(self, frame_rate):
+        self.seq.build()
+
+class StitchLoop:
+    '''Concatenate renders of several Sequencers.'''
+    params = [2, 8]
+    param_names = ['sequencers']
+
+    def setup(self, sequencers):
+        self.seqs = [make_sequencer(tracks=2, notes=32, beats=8)
+                     for _ in range(sequencers)]
+
+    def time_stitch(self, sequencers):
+        wb.stitch(self.seqs, internal_overhang=1)
+
+    def time_loop(self, sequencers):
+        wb.loop(self.seqs[0], times=sequencers)
+
+class ArpeggiatorBuild:
+    '''Render an Arpeggiator, scaling the arpeggiation rate.'''
+    params = [1/4, 1/16, 1/32]
+    param_names = ['freq']
+
+    def setup(self, freq):
+        seq = wb.Sequencer(bpm=120, beats=32)
+        self.arp = seq.add_arpeggiator(sine(200), freq=freq, method='updown')
+        self.arp.make_chord_every(4, pitches=['C4', 'E4', 'G4', 'B4'],
+                                  length=4)
+
+    def time_build(self, freq):
+        self.arp.build()
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Synthetic samples and Sequencers shared by the benchmarks.
+"""
+
+import warnings
+
+import numpy as np
+import pydub
+
+import wubwub as wb
+
+warnings.simplefilter('ignore', wb.WubWubWarning)
+
+RATE = 44100
+
+def _segment(samples, rate=RATE):
+    '''Convert float samples (-1 to 1) to a mono 16 bit AudioSegment.'''
+    ints = (np.clip(samples, -1, 1) * 32767).astype(np.int16)
+    return pydub.AudioSegment(ints.tobytes(), frame_rate=rate,
+                              sample_width=2, channels=1)
+
+def sine(duration=500, freq=440, rate=RATE):
+    '''Sine tone, `duration` milliseconds long.'''
+    t = np.arange(int(rate * duration / 1000)) / rate
+    return _segment(0.5 * np.sin(2 * np.pi * freq * t), rate)
+
+def noise(duration=500, rate=RATE, seed=0):
+    '''White noise with an exponential decay (like a snare or hat).'''
+    n = int(rate * duration / 1000)
+    rng = np.random.default_rng(seed)
+    decay = np.exp(-np.arange(n) / (rate * duration / 5000))
+    return _segment(0.5 * rng.uniform(-1, 1, n) * decay, rate)
+
+def click(duration=20, rate=RATE):
+    '''Very short click.'''
+    n = int(rate * duration / 1000)
+    return _segment(np.linspace(1, 0, n) ** 4, rate)
+
+SAMPLES = {'sine': sine, 'noise': noise, 'click': click}
+
+def make_sequencer(tracks=4, notes=64, beats=16, sample_length=500,
+                   bpm=120):
+    '''Create a Sequencer with `tracks` Samplers (cycling through the
+    synthetic samples), each with `notes` Notes evenly spread over `beats`,
+    and a mix of pitches.'''
+    seq = wb.Sequencer(bpm=bpm, beats=beats)
+    makers = list(SAMPLES.values())
+    step = beats / notes
+    for i in range(tracks):
+        sample = makers[i % len(makers)](duration=sample_length)
+        track = seq.add_sampler(sample, name=f'track{i}', overlap=i % 2 == 0)
+        track.make_notes_every(step, pitches=0)
+        pitched = track.array_of_beats()[::3]
+        track[pitched] = wb.Note(pitch=i % 12)
+    return seq
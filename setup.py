@@ -34,6 +34,7 @@ setup(name='wubwub',
       license='MIT',
       packages=['wubwub'],
       install_requires=requirements,
+      entry_points={'console_scripts': ['wubwub=wubwub.cli:main']},
       include_package_data=True,
       zip_safe=False,
       long_description=long_description,
@@ -0,0 +1,32 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Shared fixtures: synthetic samples, so the tests need no audio files.
+"""
+
+import warnings
+
+import numpy as np
+import pydub
+import pytest
+
+import wubwub as wb
+
+warnings.simplefilter('ignore', RuntimeWarning)
+warnings.simplefilter('ignore', wb.WubWubWarning)
+
+def make_tone(freq=440, duration=200, rate=44100, channels=1):
+    '''Sine tone, `duration` milliseconds long, at a quarter of full scale.'''
+    t = np.arange(int(rate * duration / 1000)) / rate
+    x = np.sin(2 * np.pi * freq * t) * 0.25 * 32768
+    x = np.repeat(x, channels).astype('<i2')
+    return pydub.AudioSegment(x.tobytes(), frame_rate=rate, sample_width=2,
+                              channels=channels)
+
+@pytest.fixture
+def tone():
+    return make_tone
+
+@pytest.fixture
+def seq():
+    return wb.Sequencer(bpm=120, beats=8)
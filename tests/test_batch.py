@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Batch rendering of manifests, and resuming them.
+"""
+
+import json
+
+import pydub
+import pytest
+
+import wubwub as wb
+from wubwub import audio
+from wubwub.batch import RECORD_SUFFIX, read_manifest, render_manifest
+
+from conftest import make_tone
+
+def _save(path, pitches=(0, 5, 7)):
+    seq = wb.Sequencer(bpm=120, beats=4)
+    seq.add_sampler(make_tone(), name='s').make_notes_every(1, pitches=pitches)
+    seq.save(str(path))
+    return seq
+
+@pytest.fixture
+def manifest(tmp_path):
+    _save(tmp_path / 'a.wub')
+    _save(tmp_path / 'b.wub', pitches=(-2, 3))
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps(
+        {'defaults': {'overhang': 1},
+         'jobs': [{'project': 'a.wub', 'output': 'out/a.wav'},
+                  {'project': 'b.wub', 'output': 'out/b.wav', 'id': 'b'}]}))
+    return path
+
+def test_read_manifest(manifest, tmp_path):
+    a, b = read_manifest(str(manifest))
+    assert a.project == str(tmp_path / 'a.wub')
+    assert a.output == str(tmp_path / 'out' / 'a.wav')
+    assert (a.fmt, a.overhang, a.id) == ('wav', 1, 'out/a.wav')
+    assert b.id == 'b'
+
+def test_read_manifest_lines(tmp_path):
+    path = tmp_path / 'jobs.jsonl'
+    path.write_text('{"project": "a.wub", "output": "a.wav"}\n\n'
+                    '{"project": "b.wub", "output": "b.wav", "mode": "stream"}\n')
+    jobs = read_manifest(str(path))
+    assert [job.mode for job in jobs] == [None, 'stream']
+
+@pytest.mark.parametrize('jobs', [
+    [{'project': 'a.wub'}],
+    [{'project': 'a.wub', 'output': 'a.wav', 'tempo': 90}],
+    [{'project': 'a.wub', 'output': 'a.wav'},
+     {'project': 'b.wub', 'output': 'a.wav'}],
+    {'jobs': 'not a list'}])
+def test_read_manifest_rejects(tmp_path, jobs):
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps(jobs))
+    with pytest.raises(wb.WubWubError):
+        read_manifest(str(path))
+
+def test_render_and_resume(manifest, tmp_path):
+    seen = []
+    results = render_manifest(str(manifest), workers=1, callback=seen.append)
+    assert [r.status for r in results] == ['rendered', 'rendered']
+    assert sorted(r.id for r in seen) == ['b', 'out/a.wav']
+    a = tmp_path / 'out' / 'a.wav'
+    expected = wb.load_project(str(tmp_path / 'a.wub')).build(overhang=1)
+    assert pydub.AudioSegment.from_wav(str(a)).raw_data == expected.raw_data
+    record = json.loads((tmp_path / ('out/a.wav' + RECORD_SUFFIX)).read_text())
+    assert record['hash'] == read_manifest(str(manifest))[0].content_hash()
+    # no temporary files are left behind
+    assert sorted(p.name for p in (tmp_path / 'out').iterdir()) == \
+        ['a.wav', 'a.wav' + RECORD_SUFFIX, 'b.wav', 'b.wav' + RECORD_SUFFIX]
+    # the shift cache of the batch is not left installed
+    assert audio._shift_cache is None
+
+    results = render_manifest(str(manifest), workers=1)
+    assert [r.status for r in results] == ['skipped', 'skipped']
+
+    # changing a project (or the settings) renders it again
+    _save(tmp_path / 'a.wub', pitches=(12,))
+    results = render_manifest(str(manifest), workers=1)
+    assert [r.status for r in results] == ['rendered', 'skipped']
+    results = render_manifest(str(manifest), workers=1, resume=False)
+    assert [r.status for r in results] == ['rendered', 'rendered']
+
+def test_content_hash(manifest, tmp_path):
+    a, b = read_manifest(str(manifest))
+    assert a.content_hash() == a.content_hash() != b.content_hash()
+    before = a.content_hash()
+    a.overhang = 2
+    assert a.content_hash() != before
+
+def test_missing_output_is_rendered(manifest, tmp_path):
+    render_manifest(str(manifest), workers=1)
+    (tmp_path / 'out' / 'b.wav').unlink()
+    results = render_manifest(str(manifest), workers=1)
+    assert [r.status for r in results] == ['skipped', 'rendered']
+
+def test_failed_jobs(manifest, tmp_path):
+    jobs = read_manifest(str(manifest))
+    (tmp_path / 'a.wub').unlink()
+    (tmp_path / 'b.wub').write_bytes(b'not a project')
+    results = render_manifest(jobs, workers=1)
+    assert [r.status for r in results] == ['failed', 'failed']
+    assert not any(r.ok for r in results)
+    assert all(r.error for r in results)
+    assert not (tmp_path / 'out' / 'b.wav').exists()
+    assert results[1].to_dict()['status'] == 'failed'
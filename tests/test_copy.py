@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Copying Tracks and Sequencers: copies share their notes until either side
+modifies them.
+"""
+
+import pytest
+from sortedcontainers import SortedDict
+
+import wubwub as wb
+from wubwub.notetable import NoteTable
+
+@pytest.fixture
+def sampler(seq, tone):
+    track = seq.add_sampler(tone(), name='s')
+    track.make_notes_every(1, pitches=[0, 2])
+    return track
+
+def _beats(track):
+    return list(track.slice[:].keys())
+
+def test_copies_share_until_modified(seq, sampler):
+    copy = seq.copy()
+    assert copy['s']._notes is sampler._notes
+    copy['s'].add(1.5, wb.Note(7))
+    assert 1.5 not in _beats(sampler)
+    assert 1.5 in _beats(copy['s'])
+    assert copy['s']._notes is not sampler._notes
+
+def test_original_edits_do_not_leak_into_copy(seq, sampler):
+    copy = seq.copy()
+    sampler.delete(1)
+    assert 1 in _beats(copy['s'])
+
+def test_exposed_notedict_is_not_shared(seq, sampler):
+    notes = sampler.notedict
+    copy = sampler.copy(newname='c')
+    notes[1.25] = wb.Note(3)
+    assert 1.25 not in _beats(copy)
+    copy.notedict[1.75] = wb.Note(5)
+    assert 1.75 not in _beats(sampler)
+
+def test_notedict_setter_is_exposed(seq, sampler):
+    new = SortedDict(sampler.notedict)
+    sampler.notedict = new
+    copy = sampler.copy(newname='c')
+    sampler.notedict[2.5] = wb.Note(1)
+    assert 2.5 not in _beats(copy)
+
+def test_deleting_a_copy_releases_the_notes(seq, sampler):
+    copy = sampler.copy(newname='c')
+    assert sampler._notes.refs == 2
+    seq.delete_track(copy)
+    del copy
+    assert sampler._notes.refs == 1
+
+def test_split_and_duplicate_are_isolated(seq, sampler):
+    a, b = seq.split(5)
+    a['s'].add(2.5, wb.Note(0))
+    assert 2.5 not in _beats(sampler)
+    dup = seq.duplicate_track(sampler, newname='d')
+    dup.add(3.5, wb.Note(0))
+    assert 3.5 not in _beats(sampler)
+
+@pytest.mark.parametrize('with_notes', [True, False])
+def test_copy_keeps_note_storage(seq, sampler, with_notes):
+    sampler.set_note_storage('table')
+    copy = sampler.copy(newname='c', with_notes=with_notes)
+    assert isinstance(copy._notes.data, NoteTable)
+    assert len(copy._notes.data) == (8 if with_notes else 0)
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Editing the Notes of a Track.
+"""
+
+import pytest
+
+import wubwub as wb
+
+@pytest.fixture
+def sampler(seq, tone):
+    return seq.add_sampler(tone(), name='s')
+
+def _beats(track):
+    return list(track.slice[:].keys())
+
+def test_quantize_to_nearest(sampler):
+    sampler.add_many([1.1, 1.4, 2.126, 3.9], wb.Note(0))
+    sampler.quantize(1/4)
+    assert _beats(sampler) == [1, 1.5, 2.25, 4]
+
+def test_quantize_ties_go_earlier(sampler):
+    sampler.add(1.125, wb.Note(0))
+    sampler.quantize(1/4)
+    assert _beats(sampler) == [1]
+
+def test_quantize_strength(sampler):
+    sampler.add_many([1.2, 2.4], wb.Note(0))
+    sampler.quantize(1/2, strength=0.5)
+    assert _beats(sampler) == pytest.approx([1.1, 2.45])
+
+def test_quantize_swing(sampler):
+    sampler.add_many([1.5, 2.1, 2.7], wb.Note(0))
+    sampler.quantize(1/2, swing=1/3)
+    assert _beats(sampler) == pytest.approx([1 + 1/2 + 1/6, 2, 2 + 1/2 + 1/6])
+
+def test_quantize_several_resolutions(sampler):
+    sampler.add_many([1.3, 1.76], wb.Note(0))
+    sampler.quantize([1/3, 1/4])
+    assert _beats(sampler) == pytest.approx([1 + 1/3, 1.75])
+
+def test_quantize_merge(sampler):
+    sampler.add_many([1.9, 2.1], [wb.Note(0), wb.Note(4)])
+    sampler.quantize(1, merge=True)
+    assert _beats(sampler) == [2]
+    assert sampler[2].pitches == [0, 4]
+
+def test_quantize_without_merge_keeps_last(sampler):
+    sampler.add_many([1.9, 2.1], [wb.Note(0), wb.Note(4)])
+    sampler.quantize(1)
+    assert _beats(sampler) == [2]
+    assert isinstance(sampler[2], wb.Note)
+
+def test_quantize_bad_resolution(sampler):
+    with pytest.raises(wb.WubWubError):
+        sampler.quantize(0.3)
+
+def test_add_many_single_element(sampler):
+    sampler.add_many([1, 2, 3], wb.Note(5))
+    assert _beats(sampler) == [1, 2, 3]
+    assert sampler[2] is wb.Note(5)
+
+def test_add_many_length_mismatch(sampler):
+    with pytest.raises(wb.WubWubError):
+        sampler.add_many([1, 2], [wb.Note(0)])
+
+def test_add_many_skips_outsiders(sampler):
+    sampler.add_many([1, 8.5, 9, 12], wb.Note(0))
+    assert _beats(sampler) == [1, 8.5]
+
+def test_add_many_adds_outsiders(sampler):
+    sampler.add_many([1, 9, 12], wb.Note(0), outsiders='add')
+    assert _beats(sampler) == [1, 9, 12]
+
+def test_add_many_raises_on_outsiders(sampler):
+    with pytest.raises(wb.WubWubError):
+        sampler.add_many([1, 9], wb.Note(0), outsiders='raise')
+
+def test_add_many_merge(sampler):
+    sampler.add(1, wb.Note(0))
+    sampler.add_many([1, 1, 2], [wb.Note(4), wb.Note(7), wb.Note(2)],
+                     merge=True)
+    assert sampler[1].pitches == [0, 4, 7]
+    assert sampler[2] is wb.Note(2)
+
+def test_add_many_without_merge_replaces(sampler):
+    sampler.add(1, wb.Note(0))
+    sampler.add_many([1, 1], [wb.Note(4), wb.Note(7)])
+    assert sampler[1] is wb.Note(7)
+
+def test_make_chord_every(seq, tone):
+    arp = seq.add_arpeggiator(tone(), name='a', freq=1/4)
+    arp.make_chord_every(1/3, pitches=[0, 4, 7], length=1, end=3)
+    assert _beats(arp) == pytest.approx([1, 4/3, 5/3, 2, 7/3, 8/3])
+    assert all(type(c) is wb.ArpChord for c in arp.slice[:].values())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Render graphs: what they report, and how close optimized renders are to
+the default ones.
+"""
+
+import numpy as np
+import pydub
+import pytest
+
+import wubwub as wb
+from wubwub import metrics
+
+@pytest.fixture
+def project(seq, tone):
+    kick = tone(60, rate=22050)
+    a = seq.add_sampler(kick, name='a')
+    a.make_notes_every(1, pitches=[0, 3])
+    # the same Notes on another Track: merged into the voices of `a`
+    b = seq.add_sampler(kick, name='b')
+    b.make_notes_every(1, pitches=[0, 3], volumes=[-3])
+    drums = seq.add_multisampler(name='drums')
+    drums.add_sample('hat', tone(5000, 50))
+    drums.add_sample('empty', pydub.AudioSegment.empty())
+    drums.make_notes_every(1/2, pitches=['hat', 'empty'])
+    # panned, so on a bus of its own
+    c = seq.add_sampler(tone(330), name='c')
+    c.make_notes_every(2, pitches=[0, 0, 7])
+    c.pan = -.5
+    arp = seq.add_arpeggiator(tone(440), name='arp', freq=1/4)
+    arp.make_chord(1, [0, 4, 7], 2)
+    for track in seq.tracks():
+        track.volume = -6
+    return seq
+
+def test_report_counts(project):
+    report = project.render_graph().report()
+    assert report.tracks == 5
+    # a, b, and the drums share a bus; c and the Arpeggiator have their own
+    assert report.buses == 3
+    assert report.notes == 8 + 8 + 16 + 4 + 8
+    assert report.silent == 8
+    # b is merged into a; the silent Notes are dropped
+    assert report.voices == report.notes - 8 - report.silent
+    assert [row['name'] for row in report.rows][1:] == ['c', 'arp']
+    assert report.seconds < report.seconds_before
+    assert 0 < report.eliminated < 1
+    assert report.to_dict()['voices'] == report.voices
+    assert 'tracks -> buses:    5 -> 3' in report.table()
+
+def test_report_resamples(project):
+    report = project.render_graph().report()
+    _, profile = project.build(profile=True)
+    assert report.resamples_before == profile._sum_counts('resamples')
+    # a and b share 2 pitches (of a sample not at the render frame rate),
+    # c shifts 1, and the Arpeggiator 3
+    assert report.resamples == 2 + 1 + 3
+
+    project.optimize = True
+    before = metrics.RESAMPLES.get()
+    project.build()
+    assert metrics.RESAMPLES.get() - before == report.resamples
+
+def test_unmerged_graph(project):
+    graph = wb.RenderGraph(project, merge=False)
+    report = graph.report()
+    assert report.buses == report.tracks == 5
+    assert report.resamples == report.resamples_before
+
+def _samples(audio):
+    return np.frombuffer(audio.raw_data, dtype='<i2').astype(int)
+
+@pytest.mark.parametrize('mode', ['segment', 'stream'])
+def test_optimized_render_is_close(project, mode):
+    plain = project.build(overhang=1, mode=mode)
+    project.optimize = True
+    optimized = project.build(overhang=1, mode=mode)
+    assert (optimized.frame_rate, optimized.channels,
+            optimized.sample_width) == (plain.frame_rate, plain.channels,
+                                        plain.sample_width)
+    x, y = _samples(plain), _samples(optimized)
+    assert len(x) == len(y)
+    # far from saturating, so only the rounding differs
+    assert np.abs(x).max() < 30000
+    assert np.abs(x - y).max() <= 4
+
+def test_optimized_modes_agree(project):
+    project.optimize = True
+    assert (project.build(mode='stream').raw_data ==
+            project.build(mode='segment').raw_data)
+
+def test_empty_graph(seq):
+    graph = seq.render_graph()
+    assert graph.report().voices == 0
+    seq.optimize = True
+    assert seq.build().raw_data == wb.Sequencer(bpm=120, beats=8).build().raw_data
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Render hooks and cancellation.
+"""
+
+import json
+
+import pytest
+
+import wubwub as wb
+from wubwub import hooks
+from wubwub.errors import RenderCancelled
+
+@pytest.fixture
+def project(seq, tone):
+    track = seq.add_sampler(tone(), name='s')
+    track.make_notes_every(1/16)
+    seq.add_sampler(tone(880), name='t').make_notes_every(1)
+    return seq
+
+def test_events_are_nested(project):
+    events = []
+    project.add_hook(events.append)
+    project.build()
+    assert events[0].stage == 'sequencer' and events[0].phase == 'begin'
+    assert events[-1].stage == 'sequencer' and events[-1].phase == 'end'
+    open_stages = []
+    for event in events:
+        if event.phase == 'begin':
+            open_stages.append(event.stage)
+        else:
+            assert open_stages.pop() == event.stage
+    assert not open_stages
+    tracks = [e.track for e in events if e.stage == 'track' and e.phase == 'begin']
+    assert tracks == ['s', 't']
+
+def test_notes_are_batched(project):
+    events = []
+    project.add_hook(events.append)
+    project.build()
+    batches = [e for e in events if e.stage == 'notes' and e.phase == 'begin'
+               and e.track == 's']
+    assert len(batches) == -(-128 // hooks.NOTE_BATCH)
+    assert all(1 <= e.start <= e.end < 9 for e in batches)
+
+def test_hooks_do_not_change_output(project):
+    plain = project.build()
+    project.add_hook(lambda event: None)
+    assert project.build().raw_data == plain.raw_data
+
+def test_remove_hook(project):
+    events = []
+    project.add_hook(events.append)
+    project.remove_hook(events.append)
+    project.build()
+    assert not events
+    with pytest.raises(wb.WubWubError):
+        project.remove_hook(events.append)
+    with pytest.raises(wb.WubWubError):
+        project.add_hook('not callable')
+
+def test_cancel_token(project):
+    token = wb.CancelToken()
+    project.cancel_token = token
+    token.cancel()
+    with pytest.raises(RenderCancelled):
+        project.build()
+    with pytest.raises(RenderCancelled):
+        project.build(mode='stream')
+    token.reset()
+    assert not token.cancelled
+    project.build()
+
+def test_cancel_from_hook(project):
+    token = wb.CancelToken()
+    project.cancel_token = token
+    seen = []
+    def cancel_after_first_batch(event):
+        seen.append(event)
+        if event.stage == 'notes' and event.phase == 'end':
+            token.cancel()
+    project.add_hook(cancel_after_first_batch)
+    with pytest.raises(RenderCancelled):
+        project.build()
+    assert sum(e.stage == 'notes' and e.phase == 'begin' for e in seen) == 1
+
+def test_chrome_trace(project, tmp_path):
+    trace = wb.ChromeTrace()
+    project.add_hook(trace)
+    project.build()
+    path = tmp_path / 'trace.json'
+    trace.to_json(str(path))
+    data = json.loads(path.read_text())
+    phases = [e['ph'] for e in data['traceEvents']]
+    assert phases.count('B') == phases.count('E') > 0
+    trace.clear()
+    assert not trace.events
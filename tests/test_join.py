@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Joining Sequencers, matching their Tracks by name or by sample.
+"""
+
+import pytest
+
+import wubwub as wb
+from wubwub.notetable import NoteTable
+
+@pytest.fixture
+def project(seq, tone):
+    kick = seq.add_sampler(tone(60), name='kick')
+    kick.make_notes_every(2)
+    snare = seq.add_sampler(tone(200), name='snare')
+    snare.set_note_storage('table')
+    snare.make_notes_every(2, offset=1, pitches=[0, 2])
+    drums = seq.add_multisampler(name='drums')
+    drums.add_sample('hat', tone(5000, 50))
+    drums.make_notes_every(1/2, pitches=['hat'])
+    return seq
+
+def _notes(track):
+    return list(track.notedict.items())
+
+def test_split_and_join(project):
+    a, b = project.split(5)
+    out = wb.join([a, b])
+    assert out.beats == project.beats
+    assert out.tracknames() == project.tracknames()
+    for track in project.tracks():
+        assert _notes(out[track.name]) == _notes(track)
+    assert isinstance(out['snare']._notes.data, NoteTable)
+    assert out.build().raw_data == project.build().raw_data
+
+def test_unmatched_tracks_are_kept(project, tone):
+    other = wb.Sequencer(bpm=120, beats=4)
+    other.add_sampler(tone(60), name='bass').add(1, wb.Note(-12))
+    out = wb.join([project, other])
+    assert out.tracknames() == project.tracknames() + ['bass']
+    assert _notes(out['bass']) == [(9, wb.Note(-12))]
+    # the joined Tracks are copies
+    assert out['kick'] is not project['kick']
+    assert out['kick'].sequencer is out
+
+@pytest.mark.parametrize('on', ['sample', 'sample+type'])
+def test_join_on_sample(project, tone, on):
+    other = wb.Sequencer(bpm=120, beats=4)
+    # an equal (but distinct) sample, under another name
+    other.add_sampler(tone(200), name='snare2').add(2, wb.Note(5))
+    out = wb.join([project, other], on=on)
+    assert out.tracknames() == project.tracknames()
+    assert _notes(out['snare'])[-1] == (10, wb.Note(5))
+
+def test_join_on_sample_and_type(project, tone):
+    other = wb.Sequencer(bpm=120, beats=4)
+    other.add_arpeggiator(tone(60), name='arp').make_chord(1, [0, 4, 7], 2)
+    assert wb.join([project, other], on='sample').tracknames() == \
+        project.tracknames()
+    assert wb.join([project, other], on='sample+type').tracknames() == \
+        project.tracknames() + ['arp']
+
+def test_multisamplers(project, tone):
+    other = wb.Sequencer(bpm=120, beats=4)
+    drums = other.add_multisampler(name='drums')
+    drums.add_sample('hat', tone(5000, 50))
+    drums.add(1, wb.Note('hat'))
+    # matched by name, but never by sample
+    out = wb.join([project, other])
+    assert out.tracknames() == project.tracknames()
+    assert _notes(out['drums'])[-1] == (9, wb.Note('hat'))
+    # so under another name, they are kept apart
+    drums.name = 'drums2'
+    out = wb.join([project, other], on='sample')
+    assert out.tracknames() == project.tracknames() + ['drums2']
+    assert _notes(out['drums2']) == [(9, wb.Note('hat'))]
+
+def test_join_keeps_render_format(project):
+    project.set_render_format(frame_rate=22050, channels=1)
+    out = wb.join(project.split(5))
+    assert out.render_format == (22050, 1, 2)
+
+def test_join_rejects_unknown_keys(project):
+    with pytest.raises(wb.WubWubError):
+        wb.join([project, project], on='color')
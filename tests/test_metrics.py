@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The metrics registry and its exporters.
+"""
+
+import json
+import socket
+import threading
+
+import pytest
+
+import wubwub as wb
+from wubwub import metrics
+
+@pytest.fixture
+def registry():
+    return metrics.MetricsRegistry()
+
+def test_counter(registry):
+    c = registry.counter('things_total', 'Things.')
+    c.inc()
+    c.inc(4)
+    assert c.get() == 5
+    assert registry.snapshot() == {'things_total': 5}
+    assert registry.counter('things_total', 'Things.') is c
+
+def test_labelled_counter(registry):
+    c = registry.counter('lookups_total', 'Lookups.', labelnames=('result',))
+    c.inc(result='hit')
+    c.inc(2, result='miss')
+    assert c.get(result='miss') == 2
+    with pytest.raises(wb.WubWubError):
+        c.inc(kind='x')
+    assert registry.snapshot()['lookups_total'] == [
+        {'result': 'hit', 'value': 1}, {'result': 'miss', 'value': 2}]
+
+def test_histogram(registry):
+    h = registry.histogram('seconds', 'Seconds.', buckets=(1, 5))
+    for value in (0.5, 2, 10):
+        h.observe(value)
+    snap = registry.snapshot()['seconds']
+    assert snap['count'] == 3
+    assert snap['sum'] == 12.5
+    assert snap['buckets'] == {'1': 1, '5': 2, '+Inf': 3}
+
+def test_kind_conflict(registry):
+    registry.counter('x', 'X.')
+    with pytest.raises(wb.WubWubError):
+        registry.histogram('x', 'X.')
+
+def test_prometheus_format(registry):
+    registry.counter('a_total', 'A.', labelnames=('name',)).inc(name='q"\n')
+    registry.histogram('b', 'B.', buckets=(1,)).observe(0.5)
+    text = registry.to_prometheus()
+    assert '# TYPE a_total counter' in text
+    assert 'a_total{name="q\\"\\n"} 1' in text
+    assert 'b_bucket{le="1"} 1' in text
+    assert 'b_bucket{le="+Inf"} 1' in text
+    assert 'b_count 1' in text
+    assert text.endswith('\n')
+
+def test_export_file(registry, tmp_path):
+    registry.counter('a_total', 'A.').inc(3)
+    path = tmp_path / 'metrics.prom'
+    registry.export(str(path))
+    assert 'a_total 3' in path.read_text()
+    registry.export(str(path), fmt='json')
+    assert json.loads(path.read_text()) == {'a_total': 3}
+    with pytest.raises(wb.WubWubError):
+        registry.export(str(path), fmt='xml')
+    assert [p.name for p in tmp_path.iterdir()] == ['metrics.prom']
+
+def test_export_socket(registry):
+    registry.counter('a_total', 'A.').inc()
+    server = socket.create_server(('127.0.0.1', 0))
+    received = []
+    def accept():
+        conn, _ = server.accept()
+        with conn:
+            received.append(conn.makefile('rb').read())
+    thread = threading.Thread(target=accept)
+    thread.start()
+    registry.export(server.getsockname(), fmt='json')
+    thread.join(5)
+    server.close()
+    assert json.loads(received[0]) == {'a_total': 1}
+
+def test_renders_update_metrics(seq, tone):
+    track = seq.add_sampler(tone(), name='s')
+    track.make_notes_every(1, pitches=[0, 2])
+    metrics.reset()
+    seq.build()
+    snap = metrics.snapshot()
+    assert snap['wubwub_notes_rendered_total'] == 8
+    assert snap['wubwub_resamples_total'] == 8
+    assert snap['wubwub_sequencer_build_seconds']['count'] == 1
+    assert snap['wubwub_track_build_seconds'][0]['kind'] == 'Sampler'
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Notes, Chords, and ArpChords: interning, immutability, and adding.
+"""
+
+import copy
+import pickle
+
+import pytest
+
+import wubwub as wb
+
+def test_notes_are_interned():
+    assert wb.Note(0, 1, 0) is wb.Note(0, 1, 0)
+    assert wb.Note('C4') is wb.Note('C4')
+    assert wb.Note(0) is not wb.Note(0.0)
+    assert wb.Note(0) == wb.Note(0.0)
+
+def test_notes_are_immutable():
+    note = wb.Note(0)
+    with pytest.raises(AttributeError):
+        note.pitch = 2
+
+def test_chords_are_interned():
+    a = wb.Chord([wb.Note(7), wb.Note(0)])
+    assert a is wb.Chord([wb.Note(0), wb.Note(7)])
+    assert a.pitches == [0, 7]
+    assert wb.ArpChord(a.notes, 2) is wb.ArpChord(a.notes, 2)
+    assert wb.ArpChord(a.notes, 2) is not wb.ArpChord(a.notes, 3)
+
+def test_chord_notes_are_immutable():
+    chord = wb.Chord([wb.Note(0), wb.Note(4)])
+    assert isinstance(chord.notes, tuple)
+    with pytest.raises(AttributeError):
+        chord.notes = ()
+    assert wb.Chord([wb.Note(0), wb.Note(4)]).pitches == [0, 4]
+
+def test_interned_objects_survive_copy_and_pickle():
+    note = wb.Note(3, 2, -1)
+    chord = wb.ArpChord([wb.Note(4), note], 2)
+    for obj in (note, chord):
+        assert copy.deepcopy(obj) is obj
+        assert pickle.loads(pickle.dumps(obj)) is obj
+
+def test_note_plus_note():
+    chord = wb.Note(4) + wb.Note(0)
+    assert type(chord) is wb.Chord
+    assert chord.pitches == [0, 4]
+
+@pytest.mark.parametrize('cls, args', [(wb.Chord, ()), (wb.ArpChord, (2,))])
+def test_note_plus_chord(cls, args):
+    chord = cls([wb.Note(0), wb.Note(7)], *args)
+    out = wb.Note(4) + chord
+    assert type(out) is wb.Chord
+    assert out.pitches == [0, 4, 7]
+
+def test_chord_plus_note():
+    out = wb.Chord([wb.Note(0), wb.Note(7)]) + wb.Note(4)
+    assert out.pitches == [0, 4, 7]
+
+def test_arpchord_plus_arpchord_keeps_longer_length():
+    a = wb.ArpChord([wb.Note(0)], 1)
+    b = wb.ArpChord([wb.Note(4)], 3)
+    out = a + b
+    assert type(out) is wb.ArpChord
+    assert out.length == 3
+
+def test_merge_notes_matches_adding():
+    elements = [wb.Note(4), wb.Chord([wb.Note(0), wb.Note(7)]), wb.Note(2)]
+    assert wb.notes.merge_notes(elements) is (elements[0] + elements[1]
+                                              + elements[2])
+
+def test_merge_chord_onto_note(seq, tone):
+    track = seq.add_sampler(tone(), name='s')
+    track.make_notes([1])
+    track.make_chord(1, [0, 4], merge=True)
+    assert track[1].pitches == [0, 0, 4]
+    track.add(2, wb.Note(2))
+    track.add(2, wb.ArpChord([wb.Note(5)], 2), merge=True)
+    assert track[2].pitches == [2, 5]
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+NoteTable storage behaves like the default SortedDict storage.
+"""
+
+import numpy as np
+import pytest
+from sortedcontainers import SortedDict
+
+import wubwub as wb
+from wubwub.notetable import NoteTable
+
+@pytest.fixture
+def pair(seq, tone):
+    '''The same Sampler with dict and with table storage.'''
+    tracks = []
+    for storage in ('dict', 'table'):
+        track = seq.add_sampler(tone(), name=storage)
+        track.set_note_storage(storage)
+        track.make_notes_every(1/2, pitches=[0, 'E4', 7.5], volumes=[0, -3])
+        track.make_chord(3, [0, 4, 7], lengths=[1, 2, 1])
+        tracks.append(track)
+    return tracks
+
+def assert_same(a, b):
+    assert list(a.slice[:].items()) == list(b.slice[:].items())
+    assert a.unpack_notes() == b.unpack_notes()
+    for x, y in zip(a._note_columns(), b._note_columns()):
+        assert list(x) == list(y)
+
+def test_storage(pair):
+    assert isinstance(pair[0]._notes.data, SortedDict)
+    assert isinstance(pair[1]._notes.data, NoteTable)
+    assert_same(*pair)
+
+def test_add(pair):
+    for t in pair:
+        t.add(2.25, wb.Note(5, 0.5, -6))
+        t.add(3, wb.Note(12), merge=True)
+        t.add(1, wb.Chord([wb.Note(1), wb.Note(2)]))
+    assert_same(*pair)
+
+def test_add_many(pair):
+    for t in pair:
+        t.add_many([1.1, 1.1, 4.5, 9], [wb.Note(1), wb.Note(2), wb.Note(3),
+                                         wb.Note(4)], merge=True)
+    assert_same(*pair)
+
+@pytest.mark.parametrize('kwargs', [{}, {'strength': 0.5},
+                                    {'swing': 1/3, 'merge': True},
+                                    {'resolution': [1/3, 1/4]}])
+def test_quantize(pair, kwargs):
+    for t in pair:
+        t.add_many([1.2, 2.6, 5.1], wb.Note(2))
+        t.quantize(**kwargs)
+    assert_same(*pair)
+
+@pytest.mark.parametrize('merge', [False, True])
+def test_shift(pair, merge):
+    for t in pair:
+        t.shift([1, 1.5, 3, 8.5], 0.5, merge=merge)
+    assert_same(*pair)
+
+def test_delete(pair):
+    for t in pair:
+        t.delete([1, 3])
+        t.delete_fromrange(5, 6.5)
+        t.clean()
+    assert_same(*pair)
+
+def test_unpack_range(pair):
+    a, b = pair
+    assert a.unpack_notes(2, 4) == b.unpack_notes(2, 4)
+    assert len(a.unpack_notes(3, 3.5)) == 3
+
+def test_mapping_matches_sorteddict():
+    rng = np.random.default_rng(0)
+    table, ref = NoteTable(), SortedDict()
+    for i in range(500):
+        beat = float(rng.integers(0, 40)) / 4
+        if rng.random() < 0.3 and beat in ref:
+            del table[beat]
+            del ref[beat]
+        else:
+            note = wb.Note(int(rng.integers(-12, 12)), 1, -float(i % 3))
+            table[beat] = ref[beat] = note
+        if i % 50 == 0:
+            assert list(table.items()) == list(ref.items())
+        assert (beat in table) == (beat in ref)
+        assert table.get(beat) == ref.get(beat)
+    assert list(table.items()) == list(ref.items())
+    assert (list(table.irange(2, 5, inclusive=(True, False))) ==
+            list(ref.irange(2, 5, inclusive=(True, False))))
+
+def test_int_values_stay_ints():
+    table = NoteTable([(1, wb.Note(3, 2, -1))])
+    note = table[1]
+    assert type(note.pitch) is int and type(note.length) is int
+    assert type(note.volume) is int
+    table[2] = wb.Note(3.0, 2.5)
+    assert type(table[2].pitch) is float
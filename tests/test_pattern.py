@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Patterns, including lazily repeated ones.
+"""
+
+import pytest
+
+import wubwub as wb
+
+def test_pattern_is_sorted():
+    p = wb.Pattern([3, 1, 2.5], 4)
+    assert p.pattern.tolist() == [1, 2.5, 3]
+    assert list(p) == [1, 2.5, 3]
+    assert len(p) == 3
+
+def test_set_pattern():
+    p = wb.Pattern([1, 2], 4) * 3
+    p.pattern = [4, 1, 3]
+    assert p.pattern.tolist() == [1, 3, 4]
+    assert p.length == 12
+    assert len(p) == 3
+    assert (p * 2).pattern.tolist() == [1, 3, 4, 13, 15, 16]
+
+def test_set_length():
+    p = wb.Pattern([1, 2], 2) * 2
+    p.length = 8
+    assert p.pattern.tolist() == [1, 2, 3, 4]
+    assert (p * 2).pattern.tolist() == [1, 2, 3, 4, 9, 10, 11, 12]
+
+def test_repeat():
+    p = wb.Pattern([1, 1.5], 2) * 3
+    assert p.pattern.tolist() == [1, 1.5, 3, 3.5, 5, 5.5]
+    assert list(p) == p.pattern.tolist()
+    assert len(p) == 6
+    assert p.length == 6
+    assert p == wb.Pattern([1, 1.5, 3, 3.5, 5, 5.5], 6)
+    assert 2 * wb.Pattern([1], 1) == wb.Pattern([1, 2], 2)
+
+def test_repeat_interleaving():
+    # beats beyond the length overlap the next repeat
+    p = wb.Pattern([1, 3.5], 2) * 3
+    assert p.pattern.tolist() == [1, 3, 3.5, 5, 5.5, 7.5]
+    assert list(p) == p.pattern.tolist()
+
+def test_repeat_zero_and_bad():
+    p = wb.Pattern([1, 2], 2)
+    assert len(p * 0) == 0
+    with pytest.raises(TypeError):
+        p * 1.5
+
+def test_repeat_repeated():
+    p = (wb.Pattern([1], 2) * 2) * 2
+    assert p.pattern.tolist() == [1, 3, 5, 7]
+    p *= 2
+    assert len(p) == 8 and p.length == 16
+
+@pytest.mark.parametrize('lazy', [False, True])
+def test_chop(lazy):
+    p = wb.Pattern([1, 1.5], 2) * 3
+    if not lazy:
+        p.pattern
+    c = p.chop(4)
+    assert c.pattern.tolist() == [1, 1.5, 3, 3.5]
+    assert c.length == 3
+    assert p.chop(1).pattern.tolist() == []
+    assert p.chop(100).pattern.tolist() == p.pattern.tolist()
+
+def test_chop_empty():
+    assert (wb.Pattern([], 4) * 3).chop(3) == wb.Pattern([], 2)
+    assert wb.Pattern([], 4).chop(3) == wb.Pattern([], 2)
+
+def test_add_and_merge():
+    a = wb.Pattern([1, 2], 2)
+    b = wb.Pattern([1.5], 1)
+    assert (a + b) == wb.Pattern([1, 2, 3.5], 3)
+    assert sum([a, b]) == a + b
+    assert a.merge(wb.Pattern([2, 2.5], 4)) == wb.Pattern([1, 2, 2.5], 4)
+
+def test_on_and_until():
+    p = wb.Pattern([1, 1.5], 2) * 2
+    assert p.on(3).pattern.tolist() == [3, 3.5, 5, 5.5]
+    assert p.onmeasure(2).pattern.tolist() == [5, 5.5, 7, 7.5]
+    assert wb.Pattern([1, 2], 2).until(5).pattern.tolist() == [1, 2, 3, 4, 5]
+
+def test_copy_is_independent():
+    p = wb.Pattern([1, 2], 2) * 2
+    c = p.copy()
+    c.pattern = [1]
+    assert p.pattern.tolist() == [1, 2, 3, 4]
+
+def test_add_pattern_to_track(seq, tone):
+    track = seq.add_sampler(tone(), name='s')
+    track[wb.Pattern([1, 1.5], 2) * 4] = wb.Note(0)
+    assert list(track.slice[:].keys()) == [1, 1.5, 3, 3.5, 5, 5.5, 7, 7.5]
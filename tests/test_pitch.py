@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Pitch parsing and conversion.
+"""
+
+import numpy as np
+import pydub
+import pytest
+
+import wubwub as wb
+from wubwub import pitch
+
+@pytest.mark.parametrize('s, expected', [('C4', ('C', 4, 60)),
+                                         ('A4', ('A', 4, 69)),
+                                         ('C#-1', ('C#', -1, 1)),
+                                         ('Bb10', ('Bb', 10, 142)),
+                                         ('C-2', ('C', -2, -12))])
+def test_parse_pitch(s, expected):
+    assert pitch.parse_pitch(s) == expected
+
+@pytest.mark.parametrize('s', ['H4', 'C', '4', 'c4', 'C4.5', 'C 4', ''])
+def test_invalid_pitch(s):
+    assert not pitch.valid_pitch_str(s)
+    with pytest.raises(wb.WubWubError):
+        pitch.parse_pitch(s)
+
+def test_relative_pitches():
+    assert pitch.relative_pitch_to_int('C4', 'G4') == 7
+    assert pitch.relative_pitch_to_int('C4', 'C3') == -12
+    assert pitch.relative_pitch_to_int('B9', 'C10') == 1
+    assert pitch.pitch_from_semitones('A4', 3) == 'C5'
+    assert pitch.pitch_from_semitones('C0', -13) == 'B-2'
+    assert pitch.splitoctave('F#12') == ('F#', 12)
+
+def test_chord_names():
+    assert pitch.valid_chord_str('C#m7')
+    assert pitch.valid_chord_str('G+')
+    assert not pitch.valid_chord_str('Cx')
+    assert pitch.splitchordname('Ebmaj7') == ('Eb', 'maj7')
+    assert pitch.splitchordname('F#+') == ('F#', '+')
+
+def test_shift_pitch():
+    sound = pydub.AudioSegment.silent(1000, frame_rate=22050)
+    up = pitch.shift_pitch(sound, 12)
+    assert up.frame_rate == 44100
+    assert len(up) == pytest.approx(500, abs=1)
+    assert pitch.shift_pitch(sound, 0, 22050).frame_rate == 22050
+
+def test_pitches_to_midi():
+    midi = pitch.pitches_to_midi(['C4', 'A4', 'C-1', 'B10', 'C4', 'Db-2'])
+    assert midi.tolist() == [60, 69, 0, 143, 60, -11]
+    assert pitch.pitches_to_midi([]).tolist() == []
+    with pytest.raises(wb.WubWubError):
+        pitch.pitches_to_midi(['C4', 'X4'])
+
+def test_midi_to_pitches_round_trip():
+    midi = np.arange(-30, 160)
+    names = pitch.midi_to_pitches(midi)
+    assert names[list(midi).index(60)] == 'C4'
+    assert names[0] == 'F#-4'
+    assert pitch.pitches_to_midi(names).tolist() == midi.tolist()
+    with pytest.raises(wb.WubWubError):
+        pitch.midi_to_pitches([60.5])
+
+def test_pitches_to_semitones():
+    out = pitch.pitches_to_semitones([0, 'E4', None, 2.5, 'C-1', 'C10'],
+                                     basepitch='C4')
+    assert np.isnan(out[2])
+    assert out[[0, 1, 3, 4, 5]].tolist() == [0, 4, 2.5, -60, 72]
+    with pytest.raises(wb.WubWubError):
+        pitch.pitches_to_semitones(['C4'])
+
+def test_semitones_to_ratios():
+    assert pitch.semitones_to_ratios([0, 12, -12]).tolist() == [1, 2, 0.5]
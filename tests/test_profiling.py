@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profiled builds.
+"""
+
+import json
+
+import pytest
+
+import wubwub as wb
+from wubwub import profiling
+
+@pytest.fixture
+def project(seq, tone):
+    kick = seq.add_sampler(tone(60), name='kick')
+    kick.make_notes_every(1, pitches=[0, 3])
+    hat = seq.add_sampler(tone(5000, 50), name='hat')
+    hat.make_notes_every(1/2)
+    arp = seq.add_arpeggiator(tone(440), name='arp', freq=1/4)
+    arp.make_chord(1, [0, 4, 7], 2)
+    return seq
+
+def test_profile_matches_plain_build(project):
+    audio, profile = project.build(profile=True)
+    assert audio.raw_data == project.build().raw_data
+    assert isinstance(profile, wb.RenderProfile)
+    assert [c.name for c in profile.children] == ['kick', 'hat', 'arp']
+    assert profile.total > 0
+
+def test_profile_counts(project):
+    _, profile = project.build(profile=True)
+    kick, hat, arp = profile.children
+    assert kick.counts['notes'] == 8
+    assert kick.counts['resamples'] == 8
+    assert hat.counts['notes'] == 16
+    assert arp.counts['notes'] == 8
+    assert profile._sum_counts('notes') == 32
+    assert {'pitch shift', 'overlay', 'trim & fade', 'volume'} <= set(kick.stages)
+    assert kick.bytes['notes'] > 0
+
+def test_slowest_notes(project):
+    _, profile = project.build(profile=True)
+    slowest = profile.slowest_notes()
+    assert 0 < len(slowest) <= 10
+    seconds = [n['seconds'] for n in slowest]
+    assert seconds == sorted(seconds, reverse=True)
+    assert all(1 <= n['beat'] < 9 for n in slowest)
+
+def test_profile_serializes(project, tmp_path):
+    _, profile = project.build(profile=True)
+    path = tmp_path / 'profile.json'
+    profile.to_json(str(path))
+    data = json.loads(path.read_text())
+    assert data['name'] == 'Sequencer'
+    assert len(data['children']) == 3
+    assert 'slowest notes' in profile.table()
+
+def test_track_profile(project):
+    audio, profile = project['kick'].build(profile=True)
+    assert profile.kind == 'Sampler'
+    assert profile.counts['notes'] == 8
+
+def test_nothing_recorded_without_profile(project):
+    project.build()
+    assert profiling._active is None
+    assert profiling.stage('x') is profiling.stage('y')
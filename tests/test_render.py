@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Regression tests comparing renders against the output of wubwub before
+render formats were added (recorded as SHA-256 hashes of the raw audio).
+"""
+
+import hashlib
+import warnings
+
+import numpy as np
+import pydub
+
+import wubwub as wb
+
+warnings.simplefilter('ignore', RuntimeWarning)
+
+# hashes of the builds of `_project()`, rendered before render formats
+BASELINE = {
+    'sequencer': '531231e328e7796742da3e9b6c44a9b164d91903013e8dfb9b19480ec470c634',
+    'low': '372d223bf56721f71b1f1680a857e47610558a16697933cc9666aa5d5bc12212',
+    'high': '4c4f19a21e0f1ad7622579688d40afce04880749bd056cb3243eaf47fd7cae39',
+    'arp': '55efd06efeaff546f7f1c15380273cf7d6b3ed9b28d6f826877b6c99320d335d'}
+
+def _tone(freq, duration, rate, channels=1):
+    '''Sine tone, `duration` milliseconds long, at a quarter of full scale.'''
+    t = np.arange(int(rate * duration / 1000)) / rate
+    x = np.sin(2 * np.pi * freq * t) * 0.25 * 32768
+    x = np.repeat(x, channels).astype('<i2')
+    return pydub.AudioSegment(x.tobytes(), frame_rate=rate, sample_width=2,
+                              channels=channels)
+
+def _project():
+    '''Pitched Tracks whose samples are not at the render frame rate.'''
+    seq = wb.Sequencer(bpm=120, beats=4)
+    low = seq.add_sampler(_tone(220, 300, 22050), name='low')
+    low.make_notes_every(1/2, pitches=[0, 3, 7, 12], volumes=[0, -3])
+    high = seq.add_sampler(_tone(440, 200, 48000, channels=2), name='high')
+    high.make_notes_every(1, pitches=[0, -5])
+    arp = seq.add_arpeggiator(_tone(330, 200, 22050), name='arp', freq=1/4)
+    arp.make_chord(1, [0, 4, 7], 2)
+    return seq
+
+def _hash(audio):
+    return hashlib.sha256(audio.raw_data).hexdigest()
+
+def test_resampled_samples_match_baseline():
+    seq = _project()
+    out = seq.build(overhang=1)
+    assert (out.frame_rate, out.channels, out.sample_width) == (44100, 2, 2)
+    assert _hash(out) == BASELINE['sequencer']
+    for track in seq.tracks():
+        assert _hash(track.build(overhang=1)) == BASELINE[track.name]
+
+def test_stream_matches_baseline():
+    out = _project().build(overhang=1, mode='stream')
+    assert _hash(out) == BASELINE['sequencer']
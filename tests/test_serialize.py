@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saving and loading projects.
+"""
+
+import pickle
+
+import pytest
+from sortedcontainers import SortedDict
+
+import wubwub as wb
+from wubwub import serialize
+from wubwub.notetable import NoteTable
+
+@pytest.fixture
+def project(seq, tone):
+    seq.volume = -2
+    seq.pan = .25
+    s = seq.add_sampler(tone(), name='s', basepitch='A4')
+    s.make_notes_every(1/2, pitches=[0, 'E4', 7.5], volumes=[0, -3])
+    s.make_chord(3, [0, 4, 7], lengths=[1, 2, 1])
+    s.pan = -.5
+    t = seq.add_sampler(tone(330, rate=22050, channels=2), name='t',
+                        overlap=True)
+    t.set_note_storage('table')
+    t.make_notes_every(1, pitches=[0, -5], lengths=[2, 1])
+    m = seq.add_multisampler(name='m')
+    m.add_sample('kick', tone(60))
+    m.add_sample(3, tone(880))
+    m.add(1, wb.Note('kick'))
+    m.add(2.5, wb.Note(3, volume=-6))
+    a = seq.add_arpeggiator(tone(550), name='a', freq=1/8, method='updown')
+    a.make_chord(5, [0, 3, 7, 12], 2)
+    return seq
+
+def assert_same(a, b):
+    assert (a.bpm, a.beats, a.volume, a.pan, a.render_format) == \
+        (b.bpm, b.beats, b.volume, b.pan, b.render_format)
+    assert a.tracknames() == b.tracknames()
+    for x, y in zip(a.tracks(), b.tracks()):
+        assert type(x) is type(y)
+        assert type(x._notes.data) is type(y._notes.data)
+        assert list(x.notedict.items()) == list(y.notedict.items())
+        assert (x.volume, x.pan, x.postprocess_steps) == \
+            (y.volume, y.pan, y.postprocess_steps)
+    assert a.build(overhang=1).raw_data == b.build(overhang=1).raw_data
+
+def test_round_trip(project, tmp_path):
+    path = str(tmp_path / 'song.wub')
+    project.save(path)
+    loaded = wb.load_project(path)
+    assert_same(project, loaded)
+    assert isinstance(loaded['s']._notes.data, SortedDict)
+    assert isinstance(loaded['t']._notes.data, NoteTable)
+    assert loaded['s'].basepitch == 'A4'
+    assert loaded['t'].overlap
+    assert sorted(loaded['m'].samples, key=str) == [3, 'kick']
+    assert (loaded['a'].freq, loaded['a'].method) == (1/8, 'updown')
+    # the loaded project can be edited and saved again
+    loaded['s'].add(7, wb.Note(2))
+    assert serialize.project_to_bytes(loaded) != \
+        serialize.project_to_bytes(project)
+    project['s'].add(7, wb.Note(2))
+    assert_same(project, serialize.project_from_bytes(
+        serialize.project_to_bytes(loaded)))
+
+def test_render_format(project):
+    project.set_render_format(frame_rate=22050, channels=1)
+    assert_same(project, serialize.project_from_bytes(
+        serialize.project_to_bytes(project)))
+
+def test_samples_are_stored_once(seq, tone):
+    sample = tone()
+    for name in 'abc':
+        seq.add_sampler(sample, name=name).add(1, wb.Note())
+    one = len(serialize.project_to_bytes(seq))
+    seq.add_sampler(tone(660), name='d')
+    assert len(serialize.project_to_bytes(seq)) > one + len(sample.raw_data)
+    header, _ = serialize._read_header(serialize.project_to_bytes(seq))
+    assert len(header['samples']) == 2
+
+def test_referenced_samples(seq, tone, tmp_path):
+    wav = str(tmp_path / 'tone.wav')
+    tone().export(wav, format='wav')
+    seq.add_sampler(wav, name='s').make_notes_every(1)
+    path = str(tmp_path / 'song.wub')
+    seq.save(path, embed_samples=False)
+    assert_same(seq, wb.load_project(path))
+    tone(220).export(wav, format='wav')
+    with pytest.raises(wb.WubWubError):
+        wb.load_project(path)
+
+def test_refuses_pickles(project, tmp_path):
+    path = tmp_path / 'song.pkl'
+    path.write_bytes(pickle.dumps(project))
+    with pytest.raises(wb.WubWubError):
+        wb.load_project(str(path))
+    with pytest.raises(wb.WubWubError):
+        serialize.project_from_bytes(pickle.dumps(project))
+
+def test_refuses_newer_versions(project):
+    data = serialize.project_to_bytes(project)
+    start = len(serialize.MAGIC)
+    _, length = serialize._PREAMBLE.unpack_from(data, start)
+    newer = (data[:start] +
+             serialize._PREAMBLE.pack(serialize.FORMAT_VERSION + 1, length) +
+             data[start + serialize._PREAMBLE.size:])
+    with pytest.raises(wb.WubWubError, match='format version'):
+        serialize.project_from_bytes(newer)
+
+def test_unsaveable(project):
+    class Effects:
+        pass
+    project['s'].effects = Effects()
+    with pytest.raises(wb.WubWubError):
+        serialize.project_to_bytes(project)
+    project['s'].effects = None
+    project['m'].add_sample(('a', 'tuple'), project['m'].samples['kick'])
+    with pytest.raises(wb.WubWubError):
+        serialize.project_to_bytes(project)
+
+def test_effects_commands(project):
+    class Effects:
+        command = ['reverb', '50']
+    project['s'].effects = Effects()
+    data = serialize.project_to_bytes(project)
+    header, _ = serialize._read_header(data)
+    assert header['tracks'][0]['effects'] == ['reverb', '50']
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The render store: hits, misses, eviction, and what can be keyed.
+"""
+
+import os
+
+import pydub
+import pytest
+
+import wubwub as wb
+from wubwub import metrics, store as renderstore
+from wubwub.store import RenderStore, render_key
+
+@pytest.fixture
+def store(tmp_path):
+    store = RenderStore(str(tmp_path / 'store'), max_bytes=None)
+    previous = wb.set_render_store(store)
+    yield store
+    wb.set_render_store(previous)
+
+@pytest.fixture
+def project(seq, tone):
+    seq.add_sampler(tone(), name='s').make_notes_every(1, pitches=[0, 4, 7])
+    return seq
+
+def _hits():
+    return metrics.CACHE_LOOKUPS.get(cache='render store', result='hit')
+
+def _misses():
+    return metrics.CACHE_LOOKUPS.get(cache='render store', result='miss')
+
+def test_hit_and_miss(store, project):
+    hits, misses = _hits(), _misses()
+    first = project.build()
+    assert (_hits(), _misses()) == (hits, misses + 1)
+    assert render_key(project) in store and len(store) == 1
+    second = project.build()
+    assert (_hits(), _misses()) == (hits + 1, misses + 1)
+    assert second.raw_data == first.raw_data
+    assert (second.frame_rate, second.channels, second.sample_width) == \
+        (first.frame_rate, first.channels, first.sample_width)
+    # changing the Notes (but not the name) changes the key
+    key = render_key(project)
+    track = project['s']
+    track.name = 'renamed'
+    assert render_key(project) == key
+    track.add(8, wb.Note(12))
+    assert render_key(project) != key
+    assert render_key(project, overhang=1) != render_key(project)
+    project.build()
+    assert _misses() == misses + 2 and len(store) == 2
+
+def test_view_and_export(store, project, tmp_path):
+    out = project.build()
+    view = store.view(render_key(project))
+    assert view.shape == (out.frame_count(), out.channels)
+    assert view.tobytes() == out.raw_data
+    path = str(tmp_path / 'out.wav')
+    project.export(path)
+    assert pydub.AudioSegment.from_wav(path).raw_data == out.raw_data
+    assert store.get('0' * 64) is None and store.view('0' * 64) is None
+
+def test_eviction(store, project, tone):
+    size = len(project.build().raw_data) + 64
+    store.max_bytes = 2 * size
+    keys = [render_key(project)]
+    for pitch in (2, 3):
+        project['s'].add(8, wb.Note(pitch), merge=True)
+        project.build()
+        keys.append(render_key(project))
+    assert len(store) == 2 and store.size() <= store.max_bytes
+    assert keys[0] not in store and keys[2] in store
+    # renders larger than the store are not kept
+    store.max_bytes = size - 1
+    store.clear()
+    project.build()
+    assert len(store) == 0
+
+def test_stitch(store, project, seq):
+    other = wb.Sequencer(bpm=120, beats=4)
+    other.add_sampler(project['s'].sample, name='x').add(1, wb.Note(-5))
+    first = wb.stitch([project, other, project])
+    n = len(store)
+    second = wb.stitch([project, other, project])
+    assert len(store) == n and second.raw_data == first.raw_data
+
+def test_unkeyable(store, project, tone):
+    class Effects:
+        pass
+    project['s'].effects = Effects()
+    with pytest.raises(wb.UnkeyableError):
+        render_key(project)
+    assert renderstore._lookup(project, 0, 'beats') == (None, None)
+    project['s'].effects = None
+
+    arp = project.add_arpeggiator(tone(), name='a', method='random')
+    arp.make_chord(1, [0, 3, 7, 12], 4)
+    with pytest.raises(wb.UnkeyableError):
+        render_key(project)
+    project.build()
+    assert len(store) == 0
+    arp.seed = 7
+    project.build()
+    assert len(store) == 1
+
+def test_errors_are_not_hidden(store, project, monkeypatch):
+    def broken(track, writer):
+        raise AttributeError('bug')
+    monkeypatch.setattr(renderstore, '_track_to_dict', broken)
+    with pytest.raises(AttributeError):
+        project.build()
+
+def test_set_render_store(tmp_path):
+    previous = wb.set_render_store(str(tmp_path / 'a'), max_bytes=10)
+    try:
+        assert wb.get_render_store().max_bytes == 10
+        assert os.path.isdir(tmp_path / 'a')
+        with pytest.raises(wb.WubWubError):
+            wb.set_render_store(42)
+    finally:
+        wb.set_render_store(previous)
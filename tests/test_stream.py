@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Streamed renders, and their memory estimates.
+"""
+
+import tracemalloc
+
+import pytest
+
+import wubwub as wb
+from wubwub.audio import BLOCK_FRAMES
+from wubwub.resources import MINUTE
+
+def _project(tone, channels=2):
+    # 16 beats at 120 BPM is several blocks of audio
+    seq = wb.Sequencer(bpm=120, beats=16, channels=channels)
+    seq.add_sampler(tone(), name='a').make_notes_every(1/4, pitches=[0, 5])
+    seq.add_sampler(tone(660, channels=2), name='b').make_notes_every(1)
+    seq.volume = -3
+    seq.pan = .4
+    return seq
+
+@pytest.mark.parametrize('channels', [1, 2])
+def test_stream_matches_segment(tone, channels):
+    seq = _project(tone, channels)
+    segment = seq.build(overhang=1)
+    stream = seq.build(overhang=1, mode='stream')
+    assert segment.frame_count() > 3 * BLOCK_FRAMES
+    assert (stream.channels, stream.sample_width, stream.frame_rate) == \
+        (segment.channels, segment.sample_width, segment.frame_rate)
+    assert stream.raw_data == segment.raw_data
+
+def test_stream_without_postprocessing(tone):
+    seq = _project(tone)
+    seq.postprocess_steps = []
+    assert (seq.build(mode='stream').raw_data == seq.build().raw_data)
+
+def test_stream_postprocess_in_place(tone):
+    seq = _project(tone)
+    seq.beats = 64
+    tracemalloc.start()
+    try:
+        mix = seq._render(0, 'beats', MINUTE / seq.bpm, stream=True)
+        size = mix.nbytes()
+        before, _ = tracemalloc.get_traced_memory()
+        tracemalloc.reset_peak()
+        out = seq._postprocess_stream(mix)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    assert len(out.raw_data) == size
+    # only a few blocks are held on top of the mix, not a second copy
+    assert peak - before < size / 2
+    assert not mix.frames
+
+def test_estimate(tone):
+    seq = _project(tone)
+    segment = seq.estimate(overhang=1)
+    stream = seq.estimate(overhang=1, mode='stream')
+    out = seq.build(overhang=1)
+    assert segment.mode == 'segment' and stream.mode == 'stream'
+    assert stream.peak_bytes < segment.peak_bytes
+    for estimate in (segment, stream):
+        assert estimate.channels == out.channels
+        assert estimate.frame_rate == out.frame_rate
+        assert estimate.sample_width == out.sample_width
+        assert estimate.duration == pytest.approx(len(out), abs=10)
+    assert stream.peak_bytes >= 2 * len(out.raw_data)
+
+def test_memory_budget(tone):
+    seq = _project(tone)
+    stream = seq.estimate(mode='stream')
+    seq.memory_budget = stream.peak_bytes
+    assert seq.build().raw_data == seq.build(mode='stream').raw_data
+    seq.over_budget = 'error'
+    seq.memory_budget = stream.peak_bytes // 4
+    with pytest.raises(wb.MemoryBudgetError):
+        seq.build()
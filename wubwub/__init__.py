@@ -9,11 +9,18 @@ del v
 # imports
 from .audio import *
 from .errors import *
+from .estimate import *
+from .graph import *
+from .hooks import *
 from .notes import *
+from .notetable import *
 from .pattern import *
 from .pitch import *
 from .plots import *
+from .profiling import *
 from .resources import *
 from .seqstring import *
 from .sequencer import *
+from .serialize import *
+from .store import *
 from .tracks import *
\ No newline at end of file
@@ -0,0 +1,13 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run the `wubwub` command line tool with `python -m wubwub`; see
+`wubwub.cli`.
+"""
+
+import sys
+
+from wubwub.cli import main
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -5,14 +5,25 @@ This module provides some functions for manipulating pydub AudioSegments.
 """
 
 import array
+from functools import lru_cache
+import hashlib
+import struct
 
 import numpy as np
+import pydub
 from pydub.playback import play as _play
+from pydub.utils import audioop
 
+from wubwub import metrics, profiling
 from wubwub.errors import WubWubError
 from wubwub.pitch import relative_pitch_to_int, shift_pitch
 
+# cache of pitch shifted sounds kept across renders (by the render workers
+# of `wubwub.batch`); None when disabled
+_shift_cache = None
+
 __pdoc__ = {'add_note_to_audio': False,
+            'add_sample_to_audio': False,
             'add_effects': False}
 
 def add_note_to_audio(note, audio, sample, position, duration, basepitch=None,
@@ -45,31 +56,342 @@ def add_note_to_audio(note, audio, sample, position, duration, basepitch=None,
     audio : pydub.AudioSegment
         Audio with the sample added.
 
+    '''
+    return add_sample_to_audio(audio=audio,
+                               sample=sample,
+                               position=position,
+                               duration=duration,
+                               pitch=note.pitch,
+                               volume=note.volume,
+                               basepitch=basepitch,
+                               fade=fade,
+                               shift=shift)
+
+def add_sample_to_audio(audio, sample, position, duration, pitch=0, volume=0,
+                        basepitch=None, fade=10, shift=True):
+    '''
+    Like `add_note_to_audio()`, but taking the pitch and volume directly
+    rather than from a `wubwub.notes.Note`.  This lets Tracks render from
+    arrays of note attributes without creating Notes.
     '''
     if shift:
-        pitch = note.pitch
         if pitch is None:
             return audio
         if isinstance(pitch, str) and pitch != 0:
             pitch = relative_pitch_to_int(basepitch, pitch)
-        sample = shift_pitch(sample, pitch)
-    sound = sample
-    sound += note.volume
-    sound = sound[:duration]
-    sound = sound.fade_out(fade)
-    audio = audio.overlay(sound, position=position)
+    with profiling.note(position, pitch):
+        with profiling.stage('pitch shift'):
+            if shift:
+                sample = _shift_sample(sample, pitch, audio.frame_rate)
+        with profiling.stage('volume'):
+            sound = sample
+            sound += volume
+        with profiling.stage('trim & fade'):
+            sound = sound[:duration]
+            sound = sound.fade_out(fade)
+        profiling.record_bytes('notes', 3 * len(sound.raw_data))
+        with profiling.stage('overlay'):
+            audio = audio.overlay(sound, position=position)
+        overlaid = _overlaid_bytes(audio)
+        profiling.record_bytes('overlay', overlaid)
+        metrics.NOTES_RENDERED.inc()
+        metrics.OVERLAY_BYTES.inc(overlaid)
     return audio
 
+def _shift_sample(sound, semitones, frame_rate):
+    '''`wubwub.pitch.shift_pitch()` for rendering: uses the shift cache of
+    render workers (if any), and records each resample in the metrics and
+    the active profile.'''
+    cache = _shift_cache
+    if cache is not None:
+        key = (id(sound), semitones, frame_rate)
+        hit = cache.get(key)
+        profiling.cache('shifted samples', hit is not None)
+        metrics.cache('shifted samples', hit is not None)
+        if hit is not None:
+            return hit
+    shifted = shift_pitch(sound, semitones, frame_rate)
+    if cache is not None:
+        cache.put(key, sound, shifted)
+    metrics.RESAMPLES.inc()
+    profiling.count('resamples')
+    profiling.record_bytes('resample', len(shifted.raw_data))
+    return shifted
+
 def add_effects(sound, fx):
     '''Add a pysndfx AudioEffectsChain to a pydub AudioSegment.'''
     if fx is None:
         return sound
+    profiling.count('effect launches')
+    metrics.EFFECT_LAUNCHES.inc()
     samples = np.array(sound.get_array_of_samples())
     samples = fx(samples)
     samples = array.array(sound.array_type, samples)
     effected = sound._spawn(samples)
     return effected
 
+@lru_cache(maxsize=256)
+def _ratecv_frames(frames, inrate, outrate, chunk=1 << 16):
+    '''Number of frames pydub produces when changing the frame rate of
+    `frames` frames of silence; converted in chunks to save memory.'''
+    if inrate == outrate:
+        return frames
+    silence = bytes(2 * chunk)
+    state = None
+    total = 0
+    while frames > 0:
+        n = min(chunk, frames)
+        out, state = audioop.ratecv(silence[:2 * n], 2, 1, inrate, outrate,
+                                    state)
+        total += len(out) // 2
+        frames -= n
+    return total
+
+class _MixBuffer:
+    '''
+    Mutable stand-in for a silent pydub AudioSegment, used when rendering
+    in the streaming mode.  `overlay()` adds onto the buffer in place
+    (rather than copying all of the audio for each Note, as pydub does),
+    with the same result as `pydub.AudioSegment.overlay()`.  The buffer is
+    only allocated once something is overlaid, in the format pydub would
+    convert the audio to.
+    '''
+    def __init__(self, duration, fmt=None):
+        if fmt is None:
+            fmt = (11025, 1, 2)
+        self.frame_rate, self.channels, self.sample_width = fmt
+        self.frames = int(self.frame_rate * (duration / 1000.0))
+        self.copied = 0
+        self._data = None
+
+    def __repr__(self):
+        return (f'_MixBuffer(frames={self.frames}, frame_rate={self.frame_rate}, '
+                f'channels={self.channels}, sample_width={self.sample_width})')
+
+    def __len__(self):
+        return round(1000 * (self.frames / self.frame_rate))
+
+    @property
+    def frame_width(self):
+        return self.channels * self.sample_width
+
+    def nbytes(self):
+        '''Bytes of audio held (or that will be held, once allocated).'''
+        return self.frames * self.frame_width
+
+    def _sync(self, seg):
+        '''Convert self and `seg` to a common format, like pydub.'''
+        fmt = (max(self.channels, seg.channels),
+               max(self.frame_rate, seg.frame_rate),
+               max(self.sample_width, seg.sample_width))
+        if fmt != (self.channels, self.frame_rate, self.sample_width):
+            self._convert(*fmt)
+        return (seg.set_channels(fmt[0]).set_frame_rate(fmt[1])
+                .set_sample_width(fmt[2]))
+
+    def _convert(self, channels, frame_rate, sample_width):
+        if self._data is None:
+            self.frames = _ratecv_frames(self.frames, self.frame_rate,
+                                         frame_rate)
+        else:
+            seg = (self.to_segment().set_channels(channels)
+                   .set_frame_rate(frame_rate).set_sample_width(sample_width))
+            self._data = bytearray(seg.raw_data)
+            self.frames = int(seg.frame_count())
+        self.channels = channels
+        self.frame_rate = frame_rate
+        self.sample_width = sample_width
+
+    def overlay(self, seg, position=0):
+        '''Overlay `seg` at `position` (milliseconds), in place.  Returns
+        self, so this can be used like `pydub.AudioSegment.overlay()`.'''
+        seg = self._sync(seg)
+        if position < 0:
+            position = len(self) - abs(position)
+        start = int(min(position, len(self)) * (self.frame_rate / 1000.0))
+        self._resize()
+        self._add(seg.raw_data, start)
+        return self
+
+    def overlay_frames(self, seg, frame, resize=True):
+        '''Overlay `seg`, which must have the same frame rate as self,
+        starting at a frame (rather than a position in milliseconds).
+        Pass `resize=False` for all but the first of several blocks
+        making up one overlay.'''
+        seg = self._sync(seg)
+        if seg.frame_rate != self.frame_rate:
+            raise WubWubError('Can only overlay frames at the same frame rate.')
+        if resize:
+            self._resize()
+        self._add(seg.raw_data, frame)
+
+    def _resize(self):
+        '''pydub rebuilds overlaid audio from slices in milliseconds, which
+        pads (or trims) it to the whole millisecond length; do the same.'''
+        frames = int(len(self) * (self.frame_rate / 1000.0))
+        if frames == self.frames:
+            return
+        if self._data is not None:
+            fw = self.frame_width
+            if frames > self.frames:
+                self._data.extend(bytes((frames - self.frames) * fw))
+            else:
+                del self._data[frames * fw:]
+        self.frames = frames
+
+    def _add(self, data, start):
+        fw = self.frame_width
+        if self._data is None:
+            self._data = bytearray(self.frames * fw)
+        a = start * fw
+        n = min(len(data), len(self._data) - a)
+        if n > 0:
+            self._data[a:a + n] = audioop.add(self._data[a:a + n], data[:n],
+                                              self.sample_width)
+        self.copied = max(n, 0)
+
+    def _segment(self, data):
+        return pydub.AudioSegment(data=data,
+                                  sample_width=self.sample_width,
+                                  frame_rate=self.frame_rate,
+                                  channels=self.channels)
+
+    def to_segment(self):
+        '''Return the audio as a pydub AudioSegment.'''
+        if self._data is None:
+            return self._segment(bytes(self.nbytes()))
+        return self._segment(bytes(self._data))
+
+    def blocks(self, frames, consume=False):
+        '''Yield the starting frame and audio (as a pydub AudioSegment) of
+        consecutive blocks of `frames` frames.  With `consume`, the blocks
+        are yielded last to first, and removed from the buffer as they go
+        (so the audio is never held twice).'''
+        fw = self.frame_width
+        starts = range(0, self.frames, frames)
+        if consume:
+            starts = reversed(starts)
+        for start in starts:
+            n = min(frames, self.frames - start)
+            if self._data is None:
+                data = bytes(n * fw)
+            else:
+                with memoryview(self._data) as view:
+                    data = bytes(view[start * fw:(start + n) * fw])
+                if consume:
+                    del self._data[start * fw:]
+            yield start, self._segment(data)
+        if consume:
+            self.frames = 0
+            self._data = None
+
+    def transform(self, func, frames):
+        '''Apply `func` (which maps a pydub AudioSegment to one of the same
+        length) to blocks of `frames` frames, and return the result as a
+        pydub AudioSegment, emptying the buffer.  Blocks are written back
+        in place, unless `func` changes the frame width (e.g. panning mono
+        audio), in which case they are written into a new buffer.'''
+        out = data = None
+        for start, block in self.blocks(frames):
+            block = func(block)
+            fw = block.frame_width
+            if out is None:
+                out = block
+                if fw == self.frame_width and self._data is not None:
+                    data = self._data
+                else:
+                    data = bytearray(self.frames * fw)
+            data[start * fw:start * fw + len(block.raw_data)] = block.raw_data
+        self.frames = 0
+        self._data = None
+        return out._spawn(data)
+
+def _new_audio(duration, stream=False, fmt=None):
+    '''Silent audio to render onto: a pydub AudioSegment, or a `_MixBuffer`
+    when streaming.  `fmt` is the render format (frame rate, channels, and
+    sample width) to create it in; by default, pydub's silence (which is
+    converted by the first overlay).'''
+    if stream:
+        return _MixBuffer(duration, fmt)
+    if fmt is None:
+        return pydub.AudioSegment.silent(duration=duration)
+    frame_rate, channels, sample_width = fmt
+    frames = int(frame_rate * (duration / 1000.0))
+    return pydub.AudioSegment(data=bytes(frames * channels * sample_width),
+                              sample_width=sample_width,
+                              frame_rate=frame_rate,
+                              channels=channels)
+
+def conform(sample, fmt, keep_mono=False):
+    '''
+    Convert a pydub AudioSegment to a render format.  Tracks convert their
+    samples to the format of their Sequencer (see
+    `wubwub.sequencer.Sequencer.set_render_format()`) when they are added,
+    so that overlaying Notes never converts audio.
+
+    Parameters
+    ----------
+    sample : pydub.AudioSegment
+        Audio to convert.
+    fmt : tuple
+        Frame rate, number of channels, and sample width (in bytes).
+    keep_mono : bool, optional
+        Leave mono audio in mono, rather than converting it to more
+        channels. Tracks keep mono samples mono until they are panned.
+        The default is False.
+
+    Returns
+    -------
+    pydub.AudioSegment
+        The converted audio; `sample` itself when it is already in `fmt`.
+
+    '''
+    frame_rate, channels, sample_width = fmt
+    if keep_mono:
+        channels = min(channels, sample.channels)
+    if (sample.frame_rate, sample.channels,
+        sample.sample_width) == (frame_rate, channels, sample_width):
+        return sample
+    metrics.SAMPLE_CONVERSIONS.inc()
+    return (sample.set_sample_width(sample_width)
+            .set_frame_rate(frame_rate).set_channels(channels))
+
+# frames postprocessed at once when streaming
+BLOCK_FRAMES = 1 << 16
+
+def _mix_postprocessed(master, audio, postprocess, pointwise):
+    '''
+    Apply `postprocess` to `audio` and overlay the result onto `master`
+    (both `_MixBuffer`s), consuming `audio`.  When the postprocessing is
+    `pointwise` (and no resampling is needed to mix), this is done a block
+    at a time, so the whole postprocessed audio is never held in memory.
+    '''
+    if pointwise and audio.frame_rate >= master.frame_rate:
+        for i, (start, block) in enumerate(audio.blocks(BLOCK_FRAMES,
+                                                        consume=True)):
+            block = postprocess(block)
+            with profiling.stage('mix'):
+                master.overlay_frames(block, start, resize=i == 0)
+            metrics.OVERLAY_BYTES.inc(master.copied)
+    else:
+        build = postprocess(audio.to_segment())
+        with profiling.stage('mix'):
+            master.overlay(build)
+        metrics.OVERLAY_BYTES.inc(master.copied)
+
+def _pan(audio, pan, channels):
+    '''Pan audio (which makes it stereo) when rendering in stereo;
+    audio rendered in mono cannot be panned.'''
+    if channels == 1:
+        return audio
+    return audio.pan(pan)
+
+def _overlaid_bytes(audio):
+    '''Bytes copied by the last overlay onto `audio`.'''
+    if isinstance(audio, _MixBuffer):
+        return audio.copied
+    return len(audio.raw_data)
+
 def _overhang_to_milli(overhang, overhang_type, b=600):
     '''Return an ovehang in seconds or beats into milliseconds.'''
     if overhang_type == 'beats':
@@ -80,6 +402,33 @@ def _overhang_to_milli(overhang, overhang_type, b=600):
         raise WubWubError('overhang must be "beats" or "seconds"')
     return overhang
 
+def sample_hash(sample):
+    '''
+    Fingerprint of a sample: the SHA-256 hash of the audio (and format) of
+    a pydub AudioSegment.  The hash is computed once and kept on the
+    AudioSegment (which pydub never modifies), so comparing samples by
+    their hash does not read the audio again.
+
+    Parameters
+    ----------
+    sample : pydub.AudioSegment
+        Sample to hash.
+
+    Returns
+    -------
+    str
+        Hexadecimal hash.
+
+    '''
+    digest = getattr(sample, '_wubwub_hash', None)
+    if digest is None:
+        h = hashlib.sha256()
+        h.update(struct.pack('<III', sample.frame_rate, sample.channels,
+                             sample.sample_width))
+        h.update(sample.raw_data)
+        digest = sample._wubwub_hash = h.hexdigest()
+    return digest
+
 def play(audiosegment, convert=True):
     '''Playback a pydub AudioSegment.  Essentially calls `pydub.play`.
 
@@ -0,0 +1,399 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Render many projects in parallel.  A manifest (JSON) lists render jobs,
+each a saved project (see `wubwub.sequencer.Sequencer.save()`) and an
+output file:
+
+```json
+{"defaults": {"overhang": 1},
+ "jobs": [{"project": "songs/a.wub", "output": "out/a.wav"},
+          {"project": "songs/b.wub", "output": "out/b.mp3", "mode": "stream"}]}
+```
+
+Relative paths are relative to the manifest.  Jobs accept the arguments
+of `wubwub.sequencer.Sequencer.export()` (`format`, `overhang`,
+`overhang_type`, `mode`) and an optional `id`.  The manifest can also be
+a JSON list of jobs, or JSON lines (one job per line).
+
+Render a manifest from the command line:
+
+```
+wubwub render manifest.json --workers 8 --report report.json
+```
+
+or with `render_manifest()`.  Jobs run on a process pool.  Each worker
+keeps its samples (and pitch shifted samples) between jobs, so sounds
+shared by many projects are only resampled once per worker.  Outputs are
+written atomically, next to a small record of the content hash of the
+job (`<output>.wubwub.json`); with `resume` (the default), jobs whose
+output exists with a matching hash are skipped.  With a render store (see
+`wubwub.store`), workers also share renders of identical projects, and of
+the Sequencers stitched by them.
+"""
+
+__all__ = ['RenderJob', 'JobResult', 'read_manifest', 'render_manifest']
+
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+import hashlib
+import json
+import os
+import tempfile
+import time
+import traceback
+
+from wubwub import audio, store as renderstore
+from wubwub._version import v as _VERSION
+from wubwub.audio import sample_hash
+from wubwub.errors import WubWubError
+from wubwub.serialize import MAGIC, _read_header, load_project
+
+__pdoc__ = {'run_job': False}
+
+# pitch shifted samples kept by each worker
+SHIFT_CACHE_SIZE = 512
+
+RECORD_SUFFIX = '.wubwub.json'
+
+class RenderJob:
+    '''
+    One project to render, read from a manifest by `read_manifest()`.
+
+    Attributes
+    ----------
+    project : str
+        Path to the saved project.
+    output : str
+        Path to write the audio to.
+    fmt : str
+        Audio format (inferred from the `output` extension by default).
+    overhang, overhang_type, mode
+        Passed to `wubwub.sequencer.Sequencer.export()`.
+    id : str
+        Name of the job, for reporting (the `output` by default).
+
+    '''
+    def __init__(self, project, output, fmt=None, overhang=0,
+                 overhang_type='beats', mode=None, id=None):
+        self.project = project
+        self.output = output
+        if fmt is None:
+            fmt = os.path.splitext(output)[1].lstrip('.')
+        self.fmt = fmt
+        self.overhang = overhang
+        self.overhang_type = overhang_type
+        self.mode = mode
+        self.id = output if id is None else id
+
+    def __repr__(self):
+        return f'RenderJob(id="{self.id}")'
+
+    def settings(self):
+        '''Render settings of the job, which are part of its hash.'''
+        return {'format': self.fmt,
+                'overhang': self.overhang,
+                'overhang_type': self.overhang_type,
+                'mode': self.mode}
+
+    def content_hash(self):
+        '''Hash of the project file, of any samples it references by path
+        (i.e. saved with `embed_samples=False`), the render settings, and the
+        wubwub version; outputs are only reused when this matches.'''
+        h = hashlib.sha256()
+        with open(self.project, 'rb') as f:
+            data = f.read()
+        h.update(data)
+        if data.startswith(MAGIC):
+            header, _ = _read_header(memoryview(data))
+            for entry in header['samples']:
+                if 'data' not in entry:
+                    h.update(entry['path'].encode('utf-8'))
+                    _hash_file(entry['path'], h)
+        h.update(json.dumps([self.settings(), _VERSION],
+                            sort_keys=True).encode('utf-8'))
+        return h.hexdigest()
+
+    def is_done(self, content_hash):
+        '''Whether the output exists and was rendered from `content_hash`.'''
+        if not os.path.exists(self.output):
+            return False
+        try:
+            with open(self.output + RECORD_SUFFIX) as f:
+                return json.load(f).get('hash') == content_hash
+        except (OSError, ValueError):
+            return False
+
+class JobResult:
+    '''
+    Outcome of a `RenderJob`.
+
+    Attributes
+    ----------
+    id, output : str
+        From the job.
+    status : str
+        `'rendered'`, `'skipped'` (the output was up to date), or `'failed'`.
+    seconds : float
+        Time taken by the job (loading, rendering, and writing).
+    error : str or None
+        Traceback of the failure.
+    worker : int or None
+        Process ID of the worker which ran the job.
+
+    '''
+    def __init__(self, id, output, status, seconds=0.0, error=None,
+                 worker=None):
+        self.id = id
+        self.output = output
+        self.status = status
+        self.seconds = seconds
+        self.error = error
+        self.worker = worker
+
+    def __repr__(self):
+        return (f'JobResult(id="{self.id}", status="{self.status}", '
+                f'seconds={self.seconds:.3f})')
+
+    @property
+    def ok(self):
+        return self.status != 'failed'
+
+    def to_dict(self):
+        '''Return the result as a (JSON serializable) dict.'''
+        return {'id': self.id,
+                'output': self.output,
+                'status': self.status,
+                'seconds': self.seconds,
+                'error': self.error,
+                'worker': self.worker}
+
+def read_manifest(path):
+    '''
+    Read the render jobs of a manifest; see the module documentation for
+    the format.
+
+    Parameters
+    ----------
+    path : str
+        Path to the manifest (JSON, or JSON lines).
+
+    Returns
+    -------
+    list of RenderJob
+
+    '''
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    try:
+        data = json.loads(text)
+    except ValueError:
+        data = [json.loads(line) for line in text.splitlines() if line.strip()]
+    defaults = {}
+    if isinstance(data, dict):
+        defaults = data.get('defaults', {})
+        data = data.get('jobs', [])
+    if not isinstance(data, list):
+        raise WubWubError('A manifest must be a list of jobs, or an object '
+                          'with a "jobs" list.')
+
+    root = os.path.dirname(os.path.abspath(path))
+    jobs = []
+    for i, entry in enumerate(data):
+        entry = dict(defaults, **entry)
+        try:
+            project = entry.pop('project')
+            output = entry.pop('output')
+        except KeyError as e:
+            raise WubWubError(f'Job {i} of the manifest has no {e}.')
+        if 'format' in entry:
+            entry['fmt'] = entry.pop('format')
+        entry.setdefault('id', output)
+        try:
+            job = RenderJob(os.path.join(root, project),
+                            os.path.join(root, output), **entry)
+        except TypeError:
+            raise WubWubError(f'Job {i} of the manifest has unknown keys: '
+                              f'{sorted(entry)}.')
+        jobs.append(job)
+
+    outputs = [job.output for job in jobs]
+    if len(set(outputs)) != len(outputs):
+        raise WubWubError('Jobs of a manifest must have different outputs.')
+    return jobs
+
+def _hash_file(path, h):
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            h.update(chunk)
+
+def _atomic_write(path, write):
+    '''Call `write` with a temporary path next to `path`, and move the
+    result into place (so readers never see a partial file).'''
+    folder = os.path.dirname(os.path.abspath(path))
+    os.makedirs(folder, exist_ok=True)
+    ext = os.path.splitext(path)[1]
+    fd, tmp = tempfile.mkstemp(dir=folder, prefix='.wubwub-render-',
+                               suffix=ext)
+    os.close(fd)
+    try:
+        write(tmp)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+class _ShiftCache:
+    '''Bounded (least recently used) cache of pitch shifted samples,
+    installed as `wubwub.audio._shift_cache` in render workers.'''
+    def __init__(self, maxsize=SHIFT_CACHE_SIZE):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+
+    def get(self, key):
+        entry = self._data.get(key)
+        if entry is None:
+            return None
+        self._data.move_to_end(key)
+        return entry[1]
+
+    def put(self, key, sound, shifted):
+        # holding the sound keeps its id (part of the key) from being reused
+        self._data[key] = (sound, shifted)
+        if len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+# samples seen by this worker, by content; projects are made to share them
+# so that pitch shifting is cached across jobs
+_samples = {}
+
+def _init_worker(cache_size=SHIFT_CACHE_SIZE, store=None):
+    audio._shift_cache = _ShiftCache(cache_size)
+    _samples.clear()
+    if store is not None:
+        renderstore.set_render_store(store)
+
+def _shared_sample(sample):
+    return _samples.setdefault(sample_hash(sample), sample)
+
+def _share_samples(sequencer):
+    '''Replace the samples of `sequencer` with identical ones already used
+    by this worker.'''
+    for track in sequencer.tracks():
+        if hasattr(track, 'samples'):
+            for key, sample in list(track.samples.items()):
+                track.samples[key] = _shared_sample(sample)
+        elif getattr(track, 'sample', None) is not None:
+            track.sample = _shared_sample(track.sample)
+
+def run_job(job, content_hash=None):
+    '''Render a `RenderJob`, returning a `JobResult` (rather than raising
+    on failure).'''
+    start = time.perf_counter()
+    try:
+        sequencer = load_project(job.project)
+        if audio._shift_cache is not None:
+            _share_samples(sequencer)
+        _atomic_write(job.output,
+                      lambda tmp: sequencer.export(tmp, job.overhang,
+                                                   job.overhang_type,
+                                                   fmt=job.fmt, mode=job.mode))
+        if content_hash is not None:
+            record = {'hash': content_hash, 'project': job.project,
+                      'settings': job.settings()}
+            _atomic_write(job.output + RECORD_SUFFIX,
+                          lambda tmp: _write_json(tmp, record))
+    except Exception:
+        return JobResult(job.id, job.output, 'failed',
+                         time.perf_counter() - start,
+                         error=traceback.format_exc(), worker=os.getpid())
+    return JobResult(job.id, job.output, 'rendered',
+                     time.perf_counter() - start, worker=os.getpid())
+
+def _write_json(path, data):
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+
+def render_manifest(manifest, workers=None, resume=True, callback=None,
+                    cache_size=SHIFT_CACHE_SIZE, store=None):
+    '''
+    Render every job of a manifest.
+
+    Parameters
+    ----------
+    manifest : str or list of RenderJob
+        Path to a manifest, or jobs from `read_manifest()`.
+    workers : int, optional
+        Number of worker processes. The default is None, which uses the
+        number of CPUs.  With 1, jobs are rendered in this process.
+    resume : bool, optional
+        Skip jobs whose output exists and was rendered from the same
+        project and settings. The default is True.
+    callback : callable, optional
+        Called with each `JobResult` as soon as its job finishes (in the
+        order jobs finish). The default is None.
+    cache_size : int, optional
+        Pitch shifted samples kept by each worker between jobs.
+        The default is 512.
+    store : wubwub.store.RenderStore or str, optional
+        Render store (or its directory) for the workers to use.
+        The default is None, which uses the store enabled in this process
+        (if any) when rendering in this process, and no store otherwise.
+
+    Returns
+    -------
+    list of JobResult
+        The result of each job, in the order of the manifest.
+
+    '''
+    jobs = read_manifest(manifest) if isinstance(manifest, str) else manifest
+    results = {}
+
+    def finish(i, result):
+        results[i] = result
+        if callback is not None:
+            callback(result)
+
+    pending = []
+    for i, job in enumerate(jobs):
+        try:
+            content_hash = job.content_hash()
+        except OSError:
+            finish(i, JobResult(job.id, job.output, 'failed',
+                                error=traceback.format_exc()))
+            continue
+        if resume and job.is_done(content_hash):
+            finish(i, JobResult(job.id, job.output, 'skipped'))
+        else:
+            pending.append((i, job, content_hash))
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers == 1 or len(pending) <= 1:
+        previous = audio._shift_cache, renderstore.get_render_store()
+        _init_worker(cache_size, store)
+        try:
+            for i, job, content_hash in pending:
+                finish(i, run_job(job, content_hash))
+        finally:
+            audio._shift_cache = previous[0]
+            renderstore.set_render_store(previous[1])
+            _samples.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=min(workers, len(pending)),
+                                 initializer=_init_worker,
+                                 initargs=(cache_size, store)) as pool:
+            futures = {pool.submit(run_job, job, content_hash): (i, job)
+                       for i, job, content_hash in pending}
+            for future in as_completed(futures):
+                i, job = futures[future]
+                try:
+                    result = future.result()
+                except BrokenProcessPool:
+                    result = JobResult(job.id, job.output, 'failed',
+                                       error=traceback.format_exc())
+                finish(i, result)
+
+    return [results[i] for i in range(len(jobs))]
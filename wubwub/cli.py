@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+The `wubwub` command line tool.
+
+```
+wubwub render manifest.json [--workers N] [--no-resume] [--report FILE]
+                            [--store DIR]
+```
+
+See `wubwub.batch` for the manifest format.
+"""
+
+import argparse
+import sys
+
+from wubwub import batch
+
+def _render(args):
+    jobs = batch.read_manifest(args.manifest)
+    total = len(jobs)
+    done = []
+
+    def report(result):
+        done.append(result)
+        if not args.quiet or not result.ok:
+            print(f'[{len(done)}/{total}] {result.status:8s} '
+                  f'{result.seconds:8.3f}s  {result.id}', flush=True)
+        if result.error and not args.quiet:
+            print(result.error, file=sys.stderr, flush=True)
+
+    results = batch.render_manifest(jobs, workers=args.workers,
+                                    resume=not args.no_resume,
+                                    callback=report, store=args.store)
+    counts = {s: sum(r.status == s for r in results)
+              for s in ('rendered', 'skipped', 'failed')}
+    seconds = sum(r.seconds for r in results)
+    print(f'{counts["rendered"]} rendered, {counts["skipped"]} skipped, '
+          f'{counts["failed"]} failed ({seconds:.2f}s of rendering)')
+    if args.report:
+        data = {'manifest': args.manifest,
+                'counts': counts,
+                'jobs': [r.to_dict() for r in results]}
+        batch._atomic_write(args.report,
+                            lambda tmp: batch._write_json(tmp, data))
+    return 1 if counts['failed'] else 0
+
+def main(argv=None):
+    '''Run the `wubwub` command line tool; returns the exit code.'''
+    parser = argparse.ArgumentParser(prog='wubwub',
+                                     description='wubwub command line tool.')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    render = sub.add_parser('render', help='render the projects of a manifest')
+    render.add_argument('manifest', help='manifest of render jobs (JSON)')
+    render.add_argument('-w', '--workers', type=int, default=None,
+                        help='worker processes (default: number of CPUs)')
+    render.add_argument('--no-resume', action='store_true',
+                        help='render every job, even if its output is up to date')
+    render.add_argument('-r', '--report', default=None,
+                        help='write the result of each job to this JSON file')
+    render.add_argument('-s', '--store', default=None,
+                        help='directory of a render store to share renders '
+                             'between workers (see wubwub.store)')
+    render.add_argument('-q', '--quiet', action='store_true',
+                        help='only print failures and the summary')
+    render.set_defaults(func=_render)
+
+    args = parser.parse_args(argv)
+    return args.func(args)
@@ -1,11 +1,22 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Custom error and warning for wubwub.
+Custom errors and warning for wubwub.
 """
 
 class WubWubError(Exception):
     """Class for errors in WubWub."""
 
+class RenderCancelled(WubWubError):
+    """Raised when a render is stopped by a `wubwub.hooks.CancelToken`."""
+
+class MemoryBudgetError(WubWubError):
+    """Raised when a render would exceed the `memory_budget` of a Sequencer."""
+
+class UnkeyableError(WubWubError):
+    """Raised when a Sequencer cannot be saved, or cannot be keyed in a
+    render store (see `wubwub.store.render_key()`), e.g. because it has
+    Tracks of custom types, or unseeded Arpeggiators playing at random."""
+
 class WubWubWarning(Warning):
     """Class for warnings in WubWub."""
\ No newline at end of file
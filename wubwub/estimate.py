@@ -0,0 +1,468 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Estimate the cost of a render before doing it.  `wubwub.sequencer.Sequencer.estimate()`,
+`estimate_stitch()`, and `estimate_loop()` predict the duration of the
+output, the peak memory used while rendering, the number of Notes and
+resamples, and the CPU time, without rendering anything:
+
+```python
+import wubwub as wb
+
+seq = wb.Sequencer(bpm=100, beats=512)
+...
+seq.estimate()
+# RenderEstimate(mode="segment", duration=307.2s, peak=541.9 MB, ...)
+```
+
+There are two render modes.  In the "segment" mode (the default), Tracks
+are rendered onto pydub AudioSegments, which are immutable: each Note
+overlaid copies all of the audio so far, so several copies of each Track
+and of the mix can be held at once.  In the "stream" mode, audio is mixed
+in place, and postprocessing is applied a block at a time; the output is
+the same, but the peak memory is about twice the size of the output.
+
+Setting the `memory_budget` (in bytes) of a Sequencer makes `build()` check
+the estimate first: when the default mode would exceed the budget, the
+Sequencer switches to streaming (or raises a
+`wubwub.errors.MemoryBudgetError`, if its `over_budget` is `'error'`).
+
+Estimates of CPU time use the per-operation costs in `COSTS`, which can be
+measured on the current machine with `calibrate()`.
+"""
+
+__all__ = ['RenderEstimate', 'estimate_stitch', 'estimate_loop']
+
+from time import perf_counter
+
+import numpy as np
+import pydub
+
+from wubwub.audio import _overhang_to_milli, BLOCK_FRAMES
+from wubwub.errors import MemoryBudgetError, WubWubError
+from wubwub.pitch import pitches_to_semitones, shift_pitch
+from wubwub.resources import MINUTE
+from wubwub.tracks import Arpeggiator, MultiSampler, Track
+
+__pdoc__ = {'estimate_sequencer': False, 'calibrate': True}
+
+MODES = ('segment', 'stream')
+
+# seconds per operation (or per byte processed), as measured by
+# `calibrate()` on a modest laptop
+COSTS = {'overlay': 4.1e-10,      # per byte of audio copied by an overlay
+         'resample': 1.05e-8,     # per byte produced by pitch shifting
+         'note': 1.4e-4,          # per Note, on top of copying its audio
+         'note_bytes': 5.2e-9,    # per byte of Note audio (volume & fade)
+         'postprocess': 1.6e-8}   # per byte of Track audio postprocessed
+
+# peak memory of each operation relative to the size of its input; pydub
+# builds overlays with an io.BytesIO and copies the result, and panning
+# splits, scales, and recombines each channel
+_OVERLAY = 4.0
+_PAN = 6.0
+_EFFECTS = 12.0
+_CONVERT = 2.5
+
+class RenderEstimate:
+    '''
+    Predicted cost of a render, from `wubwub.sequencer.Sequencer.estimate()`,
+    `estimate_stitch()`, or `estimate_loop()`.
+
+    Attributes
+    ----------
+    mode : str
+        Render mode estimated: `'segment'` or `'stream'`.
+    duration : float
+        Length of the output (milliseconds, like `len()` of a pydub
+        AudioSegment).
+    frame_rate, channels, sample_width : int
+        Format of the output.
+    output_bytes : int
+        Size of the output audio.
+    peak_bytes : int
+        Approximate peak memory used for audio while rendering.
+    notes : int
+        Notes rendered.
+    resamples : int
+        Pitch shifts (resamplings) performed.
+    seconds : float
+        Approximate CPU time of the render.
+    tracks : list of dict
+        Estimates for each Track (or for each Sequencer, when stitching).
+
+    '''
+    def __init__(self, mode, duration, frame_rate, channels, sample_width,
+                 peak_bytes, notes, resamples, seconds, tracks=None):
+        self.mode = mode
+        self.duration = duration
+        self.frame_rate = frame_rate
+        self.channels = channels
+        self.sample_width = sample_width
+        self.peak_bytes = int(peak_bytes)
+        self.notes = int(notes)
+        self.resamples = int(resamples)
+        self.seconds = seconds
+        self.tracks = tracks if tracks is not None else []
+
+    def __repr__(self):
+        return (f'RenderEstimate(mode="{self.mode}", '
+                f'duration={self.duration / 1000:.1f}s, '
+                f'peak={self.peak_bytes / 1e6:.1f} MB, '
+                f'notes={self.notes}, resamples={self.resamples}, '
+                f'seconds={self.seconds:.2f})')
+
+    @property
+    def output_bytes(self):
+        return _nbytes(self.duration, self.frame_rate, self.channels,
+                       self.sample_width)
+
+    def fits(self, budget):
+        '''Whether the peak memory is within `budget` bytes (or `budget`
+        is None).'''
+        return budget is None or self.peak_bytes <= budget
+
+    def to_dict(self):
+        '''Return the estimate as a (JSON serializable) dict.'''
+        return {'mode': self.mode,
+                'duration': self.duration,
+                'frame_rate': self.frame_rate,
+                'channels': self.channels,
+                'sample_width': self.sample_width,
+                'output_bytes': self.output_bytes,
+                'peak_bytes': self.peak_bytes,
+                'notes': self.notes,
+                'resamples': self.resamples,
+                'seconds': self.seconds,
+                'tracks': self.tracks}
+
+def _nbytes(duration, frame_rate, channels, sample_width):
+    return int(duration * frame_rate / 1000) * channels * sample_width
+
+def _render_format(obj):
+    '''The render format of a Sequencer or Track, as (channels, frame
+    rate, and sample width).'''
+    if isinstance(obj, Track):
+        rate, channels, width = obj._render_format()
+    else:
+        rate, channels, width = obj.render_format
+    return (channels, rate, width)
+
+def _format(formats, fmt):
+    '''Format pydub converts silent audio in the format `fmt` to when
+    overlaying sounds with each of `formats` (channels, frame rate, and
+    sample width) onto it.'''
+    for f in formats:
+        fmt = tuple(max(a, b) for a, b in zip(fmt, f))
+    return fmt
+
+def _pitched_format(sample, rate):
+    '''Format of `sample` after `wubwub.pitch.shift_pitch()` (to `rate`).'''
+    return (sample.channels, rate, sample.sample_width)
+
+def _pitched_frames(sample, semitones, rate):
+    '''Frames of `sample` after `wubwub.pitch.shift_pitch()` (to `rate`).'''
+    frames = sample.frame_count() * rate / sample.frame_rate
+    return frames / 2.0 ** (np.asarray(semitones, dtype=float) / 12)
+
+def _track_notes(track, b):
+    '''Return the notes, resamples, bytes resampled, bytes of Note audio,
+    overlays onto Track-sized audio, and the formats of the sounds overlaid
+    for a Track.'''
+    if isinstance(track, Arpeggiator):
+        return _arpeggiator_notes(track, b)
+
+    beats, pitches, lengths, volumes = track._note_columns()
+    durations = lengths * b
+    if isinstance(track, MultiSampler):
+        sounds = [track.get_sample(p) for p in pitches]
+        frames = np.array([s.frame_count() for s in sounds], dtype=float)
+        rates = np.array([s.frame_rate for s in sounds], dtype=float)
+        widths = np.array([s.frame_width for s in sounds], dtype=float)
+        note_bytes = np.minimum(frames, durations * rates / 1000) * widths
+        formats = {(s.channels, s.frame_rate, s.sample_width) for s in sounds}
+        return len(sounds), 0, 0, note_bytes.sum(), len(sounds), formats
+
+    sample = track.sample
+    rate = track.sequencer.render_format[0]
+    semis = pitches_to_semitones(pitches, track.basepitch)
+    keep = ~np.isnan(semis)
+    frames = _pitched_frames(sample, semis[keep], rate)
+    fw = sample.frame_width
+    resampled = frames.sum() * fw
+    note_bytes = np.minimum(frames, durations[keep] * rate / 1000).sum() * fw
+    n = int(keep.sum())
+    formats = {_pitched_format(sample, rate)} if n else set()
+    return n, n, resampled, note_bytes, n, formats
+
+def _arpeggiator_notes(track, b):
+    sample = track.sample
+    rate = track.sequencer.render_format[0]
+    fw = sample.frame_width
+    notes = 0
+    note_bytes = 0
+    chords = 0
+    pitches = {0.0}
+    next_beat = np.inf
+    for beat, chord in reversed(track._notes.data.items()):
+        try:
+            length = chord.length
+        except AttributeError:
+            length = max(n.length for n in chord.notes)
+        if beat + length >= next_beat:
+            length = next_beat - beat
+        next_beat = beat
+        beats, indices, lengths = track._arpeggiate(chord, beat, length)
+        if not len(beats):
+            continue
+        semis = pitches_to_semitones(chord.pitches, track.basepitch)[indices]
+        keep = ~np.isnan(semis)
+        frames = _pitched_frames(sample, semis[keep], rate)
+        note_bytes += (np.minimum(frames, lengths[keep] * b * rate / 1000)
+                       .sum() * fw)
+        pitches.update(semis[keep].tolist())
+        notes += int(keep.sum())
+        chords += 1
+    resampled = _pitched_frames(sample, sorted(pitches), rate).sum() * fw
+    formats = {_pitched_format(sample, rate)} if chords else set()
+    return notes, len(pitches), resampled, note_bytes, chords, formats
+
+def estimate_sequencer(sequencer, overhang=0, overhang_type='beats',
+                       mode='segment'):
+    '''Implementation of `wubwub.sequencer.Sequencer.estimate()`.'''
+    if mode not in MODES:
+        raise WubWubError(f'mode must be one of {MODES}')
+    b = (1/sequencer.bpm) * MINUTE
+    duration = (sequencer.beats * b +
+                _overhang_to_milli(overhang, overhang_type, b))
+    stream = mode == 'stream'
+
+    # the mix and each Track start as silent audio in the render format
+    master = _render_format(sequencer)
+    master_bytes = _nbytes(duration, master[1], master[0], master[2])
+    # audio rendered in mono is not panned
+    stereo = master[0] > 1
+    peak = master_bytes
+    notes = resamples = 0
+    seconds = 0.0
+    tracks = []
+    for track in sequencer.tracks():
+        n, r, resampled, note_bytes, overlays, formats = _track_notes(track, b)
+        fmt = _render_format(track)
+        ch, rate, width = _format(formats, fmt)
+        size = _nbytes(duration, rate, ch, width)
+        pan = stereo and 'pan' in track.postprocess_steps
+        out = (2 if pan else ch, rate, width)
+        out_bytes = _nbytes(duration, out[1], out[0], out[2])
+        effects = (track.effects is not None and
+                   'effects' in track.postprocess_steps)
+
+        new_master = (max(master[0], out[0]), max(master[1], out[1]),
+                      max(master[2], out[2]))
+        new_master_bytes = _nbytes(duration, new_master[1], new_master[0],
+                                   new_master[2])
+        if stream:
+            # rendered in place, then postprocessed onto the mix in blocks
+            track_peak = size + (_EFFECTS * size if effects else 0)
+            if effects or out[1] < new_master[1]:
+                track_peak += _PAN * size
+            else:
+                track_peak += _PAN * BLOCK_FRAMES * out[0] * width
+            track_peak += new_master_bytes
+            if (ch, rate, width) != fmt:
+                # converting the Track once partly rendered
+                track_peak = max(track_peak, _CONVERT * size)
+            copied = note_bytes
+        else:
+            # each overlay copies the Track audio
+            track_peak = max(_OVERLAY * size,
+                             (_EFFECTS if effects else _PAN) * size)
+            track_peak = max(track_peak + master_bytes,
+                             out_bytes + master_bytes + _OVERLAY * new_master_bytes)
+            copied = overlays * size
+        peak = max(peak, track_peak)
+        track_seconds = (COSTS['overlay'] * copied +
+                         COSTS['resample'] * resampled +
+                         COSTS['note'] * n +
+                         COSTS['note_bytes'] * note_bytes +
+                         COSTS['postprocess'] * size +
+                         COSTS['overlay'] * new_master_bytes)
+        tracks.append({'name': track.name,
+                       'kind': type(track).__name__,
+                       'notes': n,
+                       'resamples': r,
+                       'bytes': size,
+                       'peak_bytes': int(track_peak),
+                       'seconds': track_seconds})
+        notes += n
+        resamples += r
+        seconds += track_seconds
+        master, master_bytes = new_master, new_master_bytes
+
+    pan = stereo and 'pan' in sequencer.postprocess_steps
+    effects = (sequencer.effects is not None and
+               'effects' in sequencer.postprocess_steps)
+    out = (2 if pan else master[0], master[1], master[2])
+    out_bytes = _nbytes(duration, out[1], out[0], out[2])
+    if stream and not effects:
+        # postprocessed in place a block at a time, into a new buffer only
+        # when panning makes the mix stereo
+        final = master_bytes + _PAN * BLOCK_FRAMES * out[0] * out[2]
+        if out[0] != master[0]:
+            final += out_bytes
+    else:
+        final = (_EFFECTS if effects else _PAN) * master_bytes
+    peak = max(peak, final)
+    seconds += COSTS['postprocess'] * master_bytes
+    return RenderEstimate(mode, duration, out[1], out[0], out[2], peak,
+                          notes, resamples, seconds, tracks)
+
+def estimate_stitch(sequencers, internal_overhang=0, end_overhang=0,
+                    overhang_type='beats', mode='segment'):
+    '''
+    Estimate the cost of `wubwub.sequencer.stitch()`, without rendering.
+
+    Parameters
+    ----------
+    sequencers : list-like
+        Sequencers to stitch.
+    internal_overhang, end_overhang, overhang_type
+        As for `wubwub.sequencer.stitch()`.
+    mode : str -> "segment" or "stream", optional
+        Render mode to estimate. The default is 'segment'.
+
+    Returns
+    -------
+    RenderEstimate
+        The estimate; `tracks` holds the estimate for each Sequencer.
+
+    '''
+    if mode not in MODES:
+        raise WubWubError(f'mode must be one of {MODES}')
+    sequencers = list(sequencers)
+    if not sequencers:
+        raise WubWubError('No Sequencers to stitch.')
+    duration = 0
+    estimates = []
+    known = {}
+    for seq in sequencers:
+        b = (1/seq.bpm) * MINUTE
+        duration += seq.beats * b
+        if id(seq) not in known:
+            known[id(seq)] = estimate_sequencer(seq, internal_overhang,
+                                                overhang_type, mode)
+        estimates.append(known[id(seq)])
+    duration += _overhang_to_milli(end_overhang, overhang_type, b)
+
+    fmt = tuple(map(max, zip(*(_render_format(seq) for seq in sequencers))))
+    size = _nbytes(duration, fmt[1], fmt[0], fmt[2])
+    peak = size
+    seconds = 0.0
+    for est in estimates:
+        fmt = (max(fmt[0], est.channels), max(fmt[1], est.frame_rate),
+               max(fmt[2], est.sample_width))
+        new = _nbytes(duration, fmt[1], fmt[0], fmt[2])
+        if mode == 'stream':
+            overlay = new + est.output_bytes
+        else:
+            overlay = size + est.output_bytes + _OVERLAY * new
+        peak = max(peak, size + est.peak_bytes, overlay)
+        seconds += est.seconds + COSTS['overlay'] * new
+        size = new
+    if mode == 'stream':
+        # the mix is copied into an AudioSegment at the end
+        peak = max(peak, 2 * size)
+    tracks = [dict(est.to_dict(), index=i, tracks=len(est.tracks))
+              for i, est in enumerate(estimates)]
+    return RenderEstimate(mode, duration, fmt[1], fmt[0], fmt[2], peak,
+                          sum(est.notes for est in estimates),
+                          sum(est.resamples for est in estimates),
+                          seconds, tracks)
+
+def estimate_loop(sequencer, times=4, internal_overhang=0, end_overhang=0,
+                  overhang_type='beats', mode='segment'):
+    '''Estimate the cost of `wubwub.sequencer.loop()`; see
+    `estimate_stitch()`.'''
+    return estimate_stitch([sequencer] * times, internal_overhang,
+                           end_overhang, overhang_type, mode)
+
+def _choose_mode(mode, budget, over_budget, estimate):
+    '''
+    Resolve the render mode for a build.  An explicit `mode` is used as is
+    (provided it fits within the `budget`); otherwise, the segment mode is
+    used unless it would exceed the `budget`, in which case the stream mode
+    is used (when `over_budget` is `'stream'`).  `estimate` is a function
+    returning the `RenderEstimate` for a mode.
+    '''
+    if mode is not None and mode not in MODES:
+        raise WubWubError(f'mode must be None or one of {MODES}')
+    if over_budget not in ('stream', 'error'):
+        raise WubWubError('over_budget must be "stream" or "error"')
+    if budget is None:
+        return 'segment' if mode is None else mode
+    if mode is not None:
+        candidates = [mode]
+    elif over_budget == 'stream':
+        candidates = list(MODES)
+    else:
+        candidates = ['segment']
+    for mode in candidates:
+        est = estimate(mode)
+        if est.fits(budget):
+            return mode
+    raise MemoryBudgetError(f'Rendering needs about {est.peak_bytes / 1e6:.1f} MB '
+                            f'(in the "{mode}" mode), more than the memory '
+                            f'budget of {budget / 1e6:.1f} MB.')
+
+def calibrate(seconds=2, repeat=5, update=True):
+    '''
+    Measure the per-operation costs used for estimating render times
+    (`COSTS`) on this machine, using the same synthetic sounds as the
+    benchmarks (`python -m benchmarks`).
+
+    Parameters
+    ----------
+    seconds : int or float, optional
+        Length of the audio timed. The default is 2.
+    repeat : int, optional
+        Times to repeat each measurement (the fastest is kept).
+        The default is 5.
+    update : bool, optional
+        Whether to replace the values in `COSTS`. The default is True.
+
+    Returns
+    -------
+    dict
+        The measured costs.
+
+    '''
+    rate = 44100
+    t = np.arange(int(rate * seconds)) / rate
+    data = (0.5 * np.sin(2 * np.pi * 440 * t) * 32767).astype(np.int16)
+    audio = pydub.AudioSegment(data.tobytes(), frame_rate=rate,
+                               sample_width=2, channels=1)
+    short = audio[:100]
+    tiny = short[:5]
+    size = len(audio.raw_data)
+
+    def best(func):
+        times = []
+        for _ in range(repeat):
+            start = perf_counter()
+            func()
+            times.append(perf_counter() - start)
+        return min(times)
+
+    def note():
+        sound = shift_pitch(tiny, 2) + -3
+        return tiny.overlay(sound[:5].fade_out(1))
+
+    costs = {'overlay': best(lambda: audio.overlay(short, position=50)) / size,
+             'resample': best(lambda: shift_pitch(audio, 3)) /
+                         len(shift_pitch(audio, 3).raw_data),
+             'note': best(note),
+             'note_bytes': best(lambda: (audio + -3)[:len(audio)].fade_out(10)) / size,
+             'postprocess': best(lambda: (audio + -2).pan(.3)) / size}
+    if update:
+        COSTS.update(costs)
+    return costs
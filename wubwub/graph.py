@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Render graphs.  A Sequencer can be rendered by compiling it to a graph of
+the work to do: each sample, each sample at each pitch, each Note voice
+(a pitched sample with a volume, length, and position), each Track bus
+(where voices are mixed and postprocessed), and the master mix.  The
+graph removes redundant work before rendering:
+
+- each sample is pitch shifted once per pitch, however many Notes (or
+Tracks) play it at that pitch;
+- Tracks whose postprocessing is only linear (volume and panning, without
+effects) and identical share one bus, so they are mixed and postprocessed
+together;
+- identical voices on a bus (the same sample, pitch, length, and position,
+e.g. two Tracks playing the same Note, or a MultiSampler and a Sampler
+triggering the same file) are rendered once: the gain of each copy is
+applied in floating point, and the copies are summed and clipped once
+before the fade.
+
+Set the `optimize` attribute of a Sequencer to render through the graph,
+and use `RenderGraph.report()` to see what it would save without
+rendering:
+
+```python
+import wubwub as wb
+
+seq = wb.Sequencer(bpm=100, beats=8)
+...
+print(seq.render_graph().report())
+seq.optimize = True
+seq.build()
+```
+
+Optimized renders are not bit for bit identical to the default ones.  A
+merged voice is faded once rather than each copy, and a bus is mixed (and
+its volume and pan applied) once rather than each Track, so the rounding
+differs by a few least significant bits.  Where merged voices (or Tracks
+sharing a bus) are loud enough to saturate, they are clipped once, where
+the default render clips as each copy is mixed, so the fades and sums of
+clipped passages can differ by more.  Arpeggiators (and other Track types)
+are rendered as they are, on their own bus.
+"""
+
+__all__ = ['RenderGraph', 'GraphReport']
+
+import time
+
+import numpy as np
+from pydub.utils import db_to_float
+
+from wubwub import hooks, metrics, profiling
+from wubwub.audio import (sample_hash, _mix_postprocessed, _new_audio,
+                          _overhang_to_milli, _overlaid_bytes, _shift_sample)
+from wubwub.estimate import (COSTS, estimate_sequencer, _format, _nbytes,
+                             _pitched_format, _pitched_frames)
+from wubwub.resources import MINUTE
+from wubwub.tracks import MultiSampler, Sampler
+
+# fade (milliseconds) at the end of each Note; see
+# `wubwub.audio.add_note_to_audio()`
+FADE = 10
+
+class _Voice:
+    '''A pitched sample placed on a bus; `volumes` holds the volume (dB)
+    of each Note it stands for.'''
+    __slots__ = ('pitched', 'position', 'duration', 'volumes')
+
+    def __init__(self, pitched, position, duration):
+        self.pitched = pitched
+        self.position = position
+        self.duration = duration
+        self.volumes = []
+
+class _Bus:
+    '''Tracks mixed and postprocessed together, and their voices (or, for
+    an `opaque` Track, its own rendering).'''
+    def __init__(self, tracks, opaque=False):
+        self.tracks = tracks
+        self.opaque = opaque
+        self.voices = {}
+        self.notes = 0
+        self.silent = 0
+
+    @property
+    def name(self):
+        return '+'.join(track.name for track in self.tracks)
+
+def _bus_key(track):
+    '''Tracks with the same key can share a bus: they are Samplers or
+    MultiSamplers with the same linear postprocessing.'''
+    if type(track) not in (Sampler, MultiSampler):
+        return None
+    if track.effects is not None and 'effects' in track.postprocess_steps:
+        return None
+    return (tuple(track.postprocess_steps), track.volume, track.pan)
+
+def _batches(seq, voices, name):
+    '''Split voices into batches, between which the render can be
+    cancelled (and hooks are told which beats are being rendered).'''
+    if not seq._hooks and seq.cancel_token is None:
+        yield voices
+        return
+    b = (1/seq.bpm) * MINUTE
+    for i in range(0, len(voices), hooks.NOTE_BATCH):
+        batch = voices[i:i + hooks.NOTE_BATCH]
+        beats = [voice.position / b + 1 for voice in batch]
+        with hooks.span(seq, 'notes', name, min(beats), max(beats)):
+            yield batch
+
+def _sum_gains(sound, volumes):
+    '''Mix copies of `sound` at each of `volumes` (dB).  Each gain is
+    applied (and rounded) like `pydub.AudioSegment.apply_gain()`, but the
+    copies are summed in floating point and clipped once.'''
+    dtype = np.dtype(f'<i{sound.sample_width}')
+    info = np.iinfo(dtype)
+    samples = np.frombuffer(sound.raw_data, dtype=dtype).astype(float)
+    total = np.zeros_like(samples)
+    for volume in volumes:
+        total += np.floor(np.clip(samples * db_to_float(volume),
+                                  info.min, info.max))
+    np.clip(total, info.min, info.max, out=total)
+    return sound._spawn(total.astype(dtype).tobytes())
+
+class RenderGraph:
+    '''
+    Render graph of a Sequencer, from
+    `wubwub.sequencer.Sequencer.render_graph()`; see the module
+    documentation.
+
+    Parameters
+    ----------
+    sequencer : wubwub.sequencer.Sequencer
+        Sequencer to compile.
+    overhang, overhang_type
+        As for `wubwub.sequencer.Sequencer.build()`.
+    merge : bool, optional
+        Remove redundant work. The default is True.  When False, the graph
+        does the same work as rendering each Track on its own.
+
+    Attributes
+    ----------
+    buses : list
+        The buses of the graph, in the order they are mixed.
+    samples : dict
+        Each sample used, by `wubwub.audio.sample_hash()`.
+    pitched : dict
+        The sample and pitch (semitones, or None for no pitch shift) of
+        each pitched sample.
+
+    '''
+    def __init__(self, sequencer, overhang=0, overhang_type='beats',
+                 merge=True):
+        self.sequencer = sequencer
+        self.overhang = overhang
+        self.overhang_type = overhang_type
+        self.merge = merge
+        self.render_format = sequencer.render_format
+        b = (1/sequencer.bpm) * MINUTE
+        self.b = b
+        self.duration = (sequencer.beats * b +
+                         _overhang_to_milli(overhang, overhang_type, b))
+        self.buses = []
+        self.samples = {}
+        self.pitched = {}
+        buses = {}
+        for track in sequencer.tracks():
+            key = _bus_key(track) if merge else None
+            if key is None:
+                bus = _Bus([track], opaque=type(track) not in (Sampler,
+                                                                MultiSampler))
+                self.buses.append(bus)
+            elif key in buses:
+                bus = buses[key]
+                bus.tracks.append(track)
+            else:
+                bus = buses[key] = _Bus([track])
+                self.buses.append(bus)
+            if not bus.opaque:
+                self._add_voices(bus, track)
+
+    def __repr__(self):
+        voices = sum(len(bus.voices) for bus in self.buses)
+        return (f'RenderGraph(buses={len(self.buses)}, '
+                f'pitched={len(self.pitched)}, voices={voices})')
+
+    def _pitched_key(self, sample, semitones):
+        h = sample_hash(sample)
+        self.samples.setdefault(h, sample)
+        # shifting by 0 semitones only resamples to the render frame rate
+        rate = self.render_format[0]
+        if semitones is not None and (semitones != 0 or
+                                      sample.frame_rate != rate):
+            key = (h, semitones)
+        else:
+            key = (h, None)
+        if not self.merge:
+            # every Note is pitch shifted on its own, as by `Sampler._render()`
+            key = (h, semitones, len(self.pitched))
+        self.pitched.setdefault(key, (h, key[1]))
+        return key
+
+    def _add_voices(self, bus, track):
+        if isinstance(track, MultiSampler):
+            schedule = ((position, duration, track.get_sample(pitch), None,
+                         volume) for position, duration, pitch, volume
+                        in track._note_schedule(self.b))
+        else:
+            schedule = ((position, duration, track.sample, pitch, volume)
+                        for position, duration, pitch, volume
+                        in track._note_schedule(self.b, semitones=True))
+        for position, duration, sample, semitones, volume in schedule:
+            bus.notes += 1
+            if self.merge and not sample.frame_count():
+                bus.silent += 1
+                continue
+            pitched = self._pitched_key(sample, semitones)
+            key = (pitched, position, duration)
+            if not self.merge:
+                key = len(bus.voices)
+            if key not in bus.voices:
+                bus.voices[key] = _Voice(pitched, position, duration)
+            bus.voices[key].volumes.append(volume)
+
+    def render(self, stream=False):
+        '''
+        Render the master mix (before the postprocessing of the
+        Sequencer).
+
+        Parameters
+        ----------
+        stream : bool, optional
+            Render in the streaming mode (see
+            `wubwub.sequencer.Sequencer.build()`). The default is False.
+
+        Returns
+        -------
+        pydub.AudioSegment or wubwub.audio._MixBuffer
+            The mix.
+
+        '''
+        seq = self.sequencer
+        master = _new_audio(self.duration, stream, self.render_format)
+        shifted = {}
+        for bus in self.buses:
+            hooks.check(seq)
+            start = time.perf_counter()
+            track = bus.tracks[0]
+            with hooks.span(seq, 'track', bus.name, 1, seq.beats + 1):
+                if bus.opaque:
+                    audio = track._render(self.overhang, self.overhang_type,
+                                          stream)
+                else:
+                    audio = self._render_bus(bus, stream, shifted)
+                if stream:
+                    with hooks.span(seq, 'postprocess', bus.name):
+                        _mix_postprocessed(master, audio,
+                                           track._postprocess_steps,
+                                           track._pointwise_postprocess())
+                else:
+                    build = track.postprocess(audio)
+                    with profiling.stage('mix'):
+                        master = master.overlay(build)
+                    metrics.OVERLAY_BYTES.inc(_overlaid_bytes(master))
+            metrics.TRACK_BUILD_SECONDS.observe(time.perf_counter() - start,
+                                                kind=type(track).__name__)
+        return master
+
+    def _sound(self, key, shifted):
+        '''The pitched sample for `key`, shifting it if needed.'''
+        if key in shifted:
+            return shifted[key]
+        h, semitones = self.pitched[key]
+        sample = self.samples[h]
+        if semitones is not None:
+            with profiling.stage('pitch shift'):
+                sample = _shift_sample(sample, semitones,
+                                     self.render_format[0])
+        if self.merge:
+            shifted[key] = sample
+        return sample
+
+    def _bus_format(self, bus):
+        '''Format to render a bus in: with as many channels as the widest
+        of its Tracks (see `wubwub.tracks.Track._render_format()`).'''
+        rate, _, width = self.render_format
+        channels = max(track._render_format()[1] for track in bus.tracks)
+        return (rate, channels, width)
+
+    def _render_bus(self, bus, stream, shifted):
+        seq = self.sequencer
+        audio = _new_audio(self.duration, stream, self._bus_format(bus))
+        voices = list(bus.voices.values())
+        for batch in _batches(seq, voices, bus.name):
+            hooks.check(seq)
+            for voice in batch:
+                if self.merge:
+                    hit = voice.pitched in shifted
+                    profiling.cache('pitched samples', hit)
+                    metrics.cache('pitched samples', hit)
+                sound = self._sound(voice.pitched, shifted)
+                with profiling.stage('trim & fade'):
+                    sound = sound[:voice.duration]
+                with profiling.stage('volume'):
+                    if len(voice.volumes) == 1:
+                        sound += voice.volumes[0]
+                    else:
+                        sound = _sum_gains(sound, voice.volumes)
+                with profiling.stage('trim & fade'):
+                    sound = sound.fade_out(FADE)
+                with profiling.stage('overlay'):
+                    audio = audio.overlay(sound, position=voice.position)
+                profiling.count('notes')
+                metrics.NOTES_RENDERED.inc()
+                metrics.OVERLAY_BYTES.inc(_overlaid_bytes(audio))
+        return audio
+
+    def _bus_costs(self, bus, estimate):
+        '''Notes, voices, resamples, and approximate CPU seconds of
+        rendering a bus, using the costs of `wubwub.estimate`;
+        `estimate` is the estimate for the first Track of the bus.'''
+        if bus.opaque:
+            return (estimate['notes'], estimate['notes'],
+                    estimate['resamples'], estimate['seconds'])
+        formats = set()
+        note_bytes = 0
+        pitched = {}
+        for voice in bus.voices.values():
+            h, semitones = self.pitched[voice.pitched]
+            sample = self.samples[h]
+            if semitones is None:
+                frames = sample.frame_count()
+                rate = sample.frame_rate
+                formats.add((sample.channels, rate, sample.sample_width))
+            else:
+                rate = self.render_format[0]
+                frames = float(_pitched_frames(sample, semitones, rate))
+                formats.add(_pitched_format(sample, rate))
+                pitched[voice.pitched] = frames * sample.frame_width
+            note_bytes += (min(frames, voice.duration * rate / 1000) *
+                           sample.frame_width)
+        resampled = sum(pitched.values())
+        rate, ch, width = self._bus_format(bus)
+        ch, rate, width = _format(formats, (ch, rate, width))
+        size = _nbytes(self.duration, rate, ch, width)
+        voices = len(bus.voices)
+        seconds = (COSTS['overlay'] * voices * size +
+                   COSTS['resample'] * resampled +
+                   COSTS['note'] * voices +
+                   COSTS['note_bytes'] * note_bytes +
+                   COSTS['postprocess'] * size +
+                   COSTS['overlay'] * size)
+        return bus.notes, voices, len(pitched), seconds
+
+    def report(self):
+        '''
+        Dry run: compare the work of rendering through this graph with
+        rendering each Track on its own, without rendering anything.
+
+        Returns
+        -------
+        GraphReport
+            The report.
+
+        '''
+        plain = (self if not self.merge else
+                 RenderGraph(self.sequencer, self.overhang,
+                             self.overhang_type, merge=False))
+        estimate = estimate_sequencer(self.sequencer, self.overhang,
+                                      self.overhang_type)
+        tracks = {track.name: t for track, t
+                  in zip(self.sequencer.tracks(), estimate.tracks)}
+        rows = []
+        for graph in (plain, self):
+            rows.append([(bus.name, len(bus.tracks)) + graph._bus_costs(
+                bus, tracks[bus.tracks[0].name]) for bus in graph.buses])
+        return GraphReport(rows[0], rows[1],
+                           sum(bus.silent for bus in self.buses))
+
+class GraphReport:
+    '''
+    Work saved by a `RenderGraph`, from `RenderGraph.report()`.
+
+    Attributes
+    ----------
+    tracks : int
+        Tracks in the Sequencer.
+    buses : int
+        Buses in the graph (Tracks mixed and postprocessed together).
+    notes : int
+        Notes to render.
+    voices : int
+        Voices rendered by the graph (Notes, less those merged or silent).
+    silent : int
+        Notes dropped because their sample is empty.
+    resamples_before, resamples : int
+        Pitch shifts done rendering each Track on its own, and by the graph.
+    seconds_before, seconds : float
+        Approximate CPU time rendering each Track on its own, and through
+        the graph (see `wubwub.estimate.COSTS`).
+    rows : list of dict
+        The report for each bus.
+
+    '''
+    def __init__(self, before, after, silent):
+        self.tracks = len(before)
+        self.buses = len(after)
+        self.notes = sum(row[2] for row in after)
+        self.voices = sum(row[3] for row in after)
+        self.silent = silent
+        self.resamples_before = sum(row[4] for row in before)
+        self.resamples = sum(row[4] for row in after)
+        self.seconds_before = sum(row[5] for row in before)
+        self.seconds = sum(row[5] for row in after)
+        keys = ['name', 'tracks', 'notes', 'voices', 'resamples', 'seconds']
+        self.rows = [dict(zip(keys, row)) for row in after]
+
+    def __repr__(self):
+        return (f'GraphReport(tracks={self.tracks}, buses={self.buses}, '
+                f'notes={self.notes}, voices={self.voices}, '
+                f'resamples={self.resamples_before}->{self.resamples}, '
+                f'seconds={self.seconds_before:.3f}->{self.seconds:.3f})')
+
+    def __str__(self):
+        return self.table()
+
+    @property
+    def eliminated(self):
+        '''Fraction of the estimated CPU time removed by the graph.'''
+        if not self.seconds_before:
+            return 0.0
+        return 1 - self.seconds / self.seconds_before
+
+    def to_dict(self):
+        '''Return the report as a (JSON serializable) dict.'''
+        return {'tracks': self.tracks,
+                'buses': self.buses,
+                'notes': self.notes,
+                'voices': self.voices,
+                'silent': self.silent,
+                'resamples_before': self.resamples_before,
+                'resamples': self.resamples,
+                'seconds_before': self.seconds_before,
+                'seconds': self.seconds,
+                'eliminated': self.eliminated,
+                'buses_detail': [dict(r) for r in self.rows]}
+
+    def table(self):
+        '''Return a printable table summarizing the report.'''
+        header = ['bus', 'tracks', 'notes', 'voices', 'resamples', 'seconds']
+        lines = [[r['name'], str(r['tracks']), str(r['notes']),
+                  str(r['voices']), str(r['resamples']),
+                  f"{r['seconds']:.3f}s"] for r in self.rows]
+        widths = [max(len(row[i]) for row in [header] + lines)
+                  for i in range(len(header))]
+        fmt = lambda row: '  '.join(c.ljust(w) for c, w in zip(row, widths))
+        out = [fmt(header), fmt(['-' * w for w in widths])]
+        out += [fmt(row) for row in lines]
+        out += ['',
+                f'tracks -> buses:    {self.tracks} -> {self.buses}',
+                f'notes -> voices:    {self.notes} -> {self.voices} '
+                f'({self.silent} silent)',
+                f'resamples:          {self.resamples_before} -> {self.resamples}',
+                f'estimated seconds:  {self.seconds_before:.3f} -> '
+                f'{self.seconds:.3f} ({self.eliminated:.0%} eliminated)']
+        return '\n'.join(out)
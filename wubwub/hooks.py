@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Hooks for instrumenting renders.  Callbacks added to a Sequencer with
+`wubwub.sequencer.Sequencer.add_hook()` receive a `RenderEvent` at the
+beginning and end of each stage of rendering (and exporting) it: the
+Sequencer build, each Track build, each batch of Notes, postprocessing,
+and effects.
+
+A `CancelToken` set as the `cancel_token` of a Sequencer stops a render
+(from another thread, or from a hook) between Tracks and batches of Notes,
+by raising `wubwub.errors.RenderCancelled`.
+
+```python
+import wubwub as wb
+
+seq = wb.Sequencer(bpm=100, beats=8)
+...
+trace = wb.ChromeTrace()
+seq.add_hook(trace)
+seq.build()
+trace.to_json('render.json')   # open in chrome://tracing or Perfetto
+```
+"""
+
+__all__ = ['RenderEvent', 'CancelToken', 'ChromeTrace']
+
+import json
+import os
+import threading
+import time
+
+from wubwub.errors import RenderCancelled
+
+__pdoc__ = {'span': False, 'check': False, 'NOTE_BATCH': False}
+
+# number of Notes rendered between events & cancellation checks
+NOTE_BATCH = 32
+
+class RenderEvent:
+    '''
+    Event passed to render hooks.
+
+    Attributes
+    ----------
+    phase : str
+        `'begin'` or `'end'`.
+    stage : str
+        One of `'sequencer'`, `'track'`, `'notes'`, `'postprocess'`,
+        `'effects'`, or `'export'`.
+    track : str or None
+        Name of the Track being rendered (None for Sequencer stages).
+    start, end : number or None
+        Range of beats covered by the stage.
+    time : float
+        `time.perf_counter()` when the event was emitted.
+
+    '''
+    __slots__ = ('phase', 'stage', 'track', 'start', 'end', 'time')
+
+    def __init__(self, phase, stage, track=None, start=None, end=None):
+        self.phase = phase
+        self.stage = stage
+        self.track = track
+        self.start = start
+        self.end = end
+        self.time = time.perf_counter()
+
+    def __repr__(self):
+        return (f'RenderEvent(phase="{self.phase}", stage="{self.stage}", '
+                f'track={self.track!r}, start={self.start}, end={self.end})')
+
+class CancelToken:
+    '''Flag for stopping a render.  Set it as the `cancel_token` of a
+    Sequencer, and call `cancel()` (e.g. from another thread) to make the
+    render raise `wubwub.errors.RenderCancelled`.'''
+    def __init__(self):
+        self._event = threading.Event()
+
+    def __repr__(self):
+        return f'CancelToken(cancelled={self.cancelled})'
+
+    @property
+    def cancelled(self):
+        '''Whether `cancel()` has been called.'''
+        return self._event.is_set()
+
+    def cancel(self):
+        '''Request that renders using this token stop.'''
+        self._event.set()
+
+    def reset(self):
+        '''Clear the cancellation, so the token can be reused.'''
+        self._event.clear()
+
+    def check(self):
+        '''Raise `RenderCancelled` if `cancel()` has been called.'''
+        if self._event.is_set():
+            raise RenderCancelled('Render was cancelled.')
+
+class _Span:
+    __slots__ = ('hooks', 'args')
+
+    def __init__(self, hooks, args):
+        self.hooks = hooks
+        self.args = args
+
+    def __enter__(self):
+        event = RenderEvent('begin', *self.args)
+        for hook in self.hooks:
+            hook(event)
+
+    def __exit__(self, *exc):
+        event = RenderEvent('end', *self.args)
+        for hook in self.hooks:
+            hook(event)
+
+class _Null:
+    __slots__ = ()
+
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+_NULL = _Null()
+
+def span(sequencer, stage, track=None, start=None, end=None):
+    '''Context manager emitting the begin and end events of a stage to the
+    hooks of `sequencer` (doing nothing when it has none).'''
+    hooks = getattr(sequencer, '_hooks', None)
+    if not hooks:
+        return _NULL
+    return _Span(tuple(hooks), (stage, track, start, end))
+
+def check(sequencer):
+    '''Raise `RenderCancelled` if the render of `sequencer` was cancelled.'''
+    token = getattr(sequencer, 'cancel_token', None)
+    if token is not None:
+        token.check()
+
+class ChromeTrace:
+    '''
+    Render hook recording events in the Chrome trace-event format, which
+    can be viewed in chrome://tracing or https://ui.perfetto.dev.  Add it
+    to a Sequencer with `wubwub.sequencer.Sequencer.add_hook()`.
+    '''
+    def __init__(self):
+        self.events = []
+        self._origin = time.perf_counter()
+        self._pid = os.getpid()
+
+    def __repr__(self):
+        return f'ChromeTrace(events={len(self.events)})'
+
+    def __call__(self, event):
+        name = event.stage if event.track is None else f'{event.stage}: {event.track}'
+        self.events.append({'name': name,
+                            'cat': event.stage,
+                            'ph': 'B' if event.phase == 'begin' else 'E',
+                            'ts': (event.time - self._origin) * 1e6,
+                            'pid': self._pid,
+                            'tid': threading.get_ident(),
+                            'args': {'track': event.track,
+                                     'start': _jsonable(event.start),
+                                     'end': _jsonable(event.end)}})
+
+    def clear(self):
+        '''Remove all recorded events.'''
+        self.events.clear()
+        self._origin = time.perf_counter()
+
+    def to_json(self, path=None, **kwargs):
+        '''
+        Serialize the trace as JSON.
+
+        Parameters
+        ----------
+        path : str, optional
+            File to write to. The default is None.
+        **kwargs
+            Passed to `json.dumps()`.
+
+        Returns
+        -------
+        str
+            The JSON string.
+
+        '''
+        s = json.dumps({'traceEvents': self.events,
+                        'displayTimeUnit': 'ms'}, **kwargs)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(s)
+        return s
+
+def _jsonable(value):
+    if value is None or isinstance(value, (int, float)):
+        return value
+    return float(value)
@@ -0,0 +1,328 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Process-wide render metrics.  The render path (adding notes, pitch shifting,
+effects, loading sounds, building and exporting Sequencers) updates a set
+of cumulative counters and histograms, which can be read with `snapshot()`
+and written out (in the Prometheus text format or as JSON) with `export()`:
+
+```python
+import wubwub as wb
+from wubwub import metrics
+
+seq = wb.Sequencer(bpm=100, beats=8)
+...
+seq.build()
+metrics.snapshot()['wubwub_notes_rendered_total']
+
+# for a scraper (e.g. the node_exporter textfile collector)
+metrics.export('/var/lib/node_exporter/wubwub.prom')
+
+# or push to a socket
+metrics.export(('localhost', 9999), fmt='json')
+```
+
+Updating a metric is a lock and an addition, so metrics are always on.
+Use `wubwub.profiling` for a breakdown of a single render.
+"""
+
+__all__ = ['Counter', 'Histogram', 'MetricsRegistry', 'REGISTRY',
+           'snapshot', 'reset', 'to_prometheus', 'to_json', 'export']
+
+import bisect
+import itertools
+import json
+import math
+import os
+import socket
+import tempfile
+import threading
+
+from wubwub.errors import WubWubError
+
+__pdoc__ = {'cache': False}
+
+# seconds; spans a single note up to a long render
+DEFAULT_BUCKETS = (.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5,
+                   1, 2.5, 5, 10, 30, 60)
+
+class _Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def __repr__(self):
+        return f'{type(self).__name__}(name="{self.name}")'
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise WubWubError(f'{self.name} takes labels {self.labelnames}, '
+                              f'not {tuple(labels)}.')
+        return tuple(str(labels[l]) for l in self.labelnames)
+
+    def reset(self):
+        '''Clear all recorded values.'''
+        with self._lock:
+            self._values.clear()
+
+class Counter(_Metric):
+    '''A cumulative count, optionally split by labels.'''
+    kind = 'counter'
+
+    def inc(self, n=1, **labels):
+        '''Increase the count by `n` (for the given label values).'''
+        key = self._key(labels) if labels or self.labelnames else ()
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def get(self, **labels):
+        '''Return the current count (for the given label values).'''
+        return self._values.get(self._key(labels), 0)
+
+    def _items(self):
+        with self._lock:
+            values = dict(self._values)
+        if not self.labelnames:
+            values.setdefault((), 0)
+        return sorted(values.items())
+
+    def _snapshot(self):
+        items = self._items()
+        if not self.labelnames:
+            return items[0][1]
+        return [dict(zip(self.labelnames, k), value=v) for k, v in items]
+
+    def _prometheus(self):
+        return [f'{self.name}{_labelstr(self.labelnames, k)} {_num(v)}'
+                for k, v in self._items()]
+
+class Histogram(_Metric):
+    '''Distribution of observed values (e.g. durations in seconds), counted
+    in cumulative buckets, optionally split by labels.'''
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(),
+                 buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        '''Record one observation (for the given label values).'''
+        key = self._key(labels) if labels or self.labelnames else ()
+        i = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1),
+                                             0.0, 0]
+            entry[0][i] += 1
+            entry[1] += value
+            entry[2] += 1
+
+    def _items(self):
+        '''Sorted (labels, cumulative bucket counts, sum, count).'''
+        with self._lock:
+            values = {k: (list(c), s, n) for k, (c, s, n) in self._values.items()}
+        if not self.labelnames:
+            values.setdefault((), ([0] * (len(self.buckets) + 1), 0.0, 0))
+        return [(k, list(itertools.accumulate(c)), s, n)
+                for k, (c, s, n) in sorted(values.items())]
+
+    def _snapshot(self):
+        out = []
+        les = [_num(b) for b in self.buckets] + ['+Inf']
+        for key, cumulative, total, n in self._items():
+            entry = dict(zip(self.labelnames, key))
+            entry.update(count=n, sum=total,
+                         buckets=dict(zip(les, cumulative)))
+            out.append(entry)
+        return out if self.labelnames else out[0]
+
+    def _prometheus(self):
+        lines = []
+        les = [_num(b) for b in self.buckets] + ['+Inf']
+        for key, cumulative, total, n in self._items():
+            for le, c in zip(les, cumulative):
+                labels = _labelstr(self.labelnames + ('le',), key + (le,))
+                lines.append(f'{self.name}_bucket{labels} {c}')
+            labels = _labelstr(self.labelnames, key)
+            lines.append(f'{self.name}_sum{labels} {_num(total)}')
+            lines.append(f'{self.name}_count{labels} {n}')
+        return lines
+
+def _num(value):
+    if isinstance(value, float):
+        if math.isinf(value):
+            return '+Inf' if value > 0 else '-Inf'
+        return repr(value)
+    return str(value)
+
+def _labelstr(names, values):
+    if not names:
+        return ''
+    escape = lambda v: (v.replace('\\', r'\\').replace('"', r'\"')
+                        .replace('\n', r'\n'))
+    inner = ','.join(f'{n}="{escape(v)}"' for n, v in zip(names, values))
+    return '{' + inner + '}'
+
+class MetricsRegistry:
+    '''Collection of named metrics.  wubwub records into `REGISTRY`.'''
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f'MetricsRegistry(metrics={len(self._metrics)})'
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def __iter__(self):
+        return iter(self._metrics.values())
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            if name in self._metrics:
+                metric = self._metrics[name]
+                if not isinstance(metric, cls):
+                    raise WubWubError(f'Metric "{name}" is already registered '
+                                      f'as a {metric.kind}.')
+                return metric
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+            return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        '''Create (or return the existing) Counter called `name`.'''
+        return self._register(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(),
+                  buckets=DEFAULT_BUCKETS):
+        '''Create (or return the existing) Histogram called `name`.'''
+        return self._register(Histogram, name, documentation, labelnames,
+                              buckets=buckets)
+
+    def snapshot(self):
+        '''Return the current value of every metric, as a dict.'''
+        return {m.name: m._snapshot() for m in self}
+
+    def reset(self):
+        '''Clear the values of every metric.'''
+        for m in self:
+            m.reset()
+
+    def to_prometheus(self):
+        '''Return every metric in the Prometheus text exposition format.'''
+        lines = []
+        for m in self:
+            lines.append(f'# HELP {m.name} {m.documentation}')
+            lines.append(f'# TYPE {m.name} {m.kind}')
+            lines.extend(m._prometheus())
+        return '\n'.join(lines) + '\n'
+
+    def to_json(self, **kwargs):
+        '''Return `snapshot()` as JSON; `kwargs` are passed to `json.dumps()`.'''
+        return json.dumps(self.snapshot(), **kwargs)
+
+    def export(self, target, fmt='prometheus'):
+        '''
+        Write every metric to a file or socket.
+
+        Parameters
+        ----------
+        target : str, tuple, or socket.socket
+            Where to write.  A str is a file path (written atomically, so
+            readers never see a partial file); a `(host, port)` tuple is a
+            TCP address to connect to; a connected socket is written to
+            directly (and not closed).
+        fmt : str -> "prometheus" or "json", optional
+            Output format. The default is 'prometheus'.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if fmt == 'prometheus':
+            data = self.to_prometheus()
+        elif fmt == 'json':
+            data = self.to_json(indent=2) + '\n'
+        else:
+            raise WubWubError('fmt must be "prometheus" or "json".')
+        data = data.encode('utf-8')
+
+        if isinstance(target, socket.socket):
+            target.sendall(data)
+        elif isinstance(target, tuple):
+            with socket.create_connection(target) as sock:
+                sock.sendall(data)
+        elif isinstance(target, (str, os.PathLike)):
+            folder = os.path.dirname(os.path.abspath(target))
+            fd, tmp = tempfile.mkstemp(dir=folder, prefix='.wubwub-metrics-')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    f.write(data)
+                os.replace(tmp, target)
+            except BaseException:
+                os.remove(tmp)
+                raise
+        else:
+            raise WubWubError('target must be a path, a (host, port) tuple, '
+                              'or a socket.')
+
+REGISTRY = MetricsRegistry()
+
+def snapshot():
+    '''Return the current value of every wubwub metric, as a dict.'''
+    return REGISTRY.snapshot()
+
+def reset():
+    '''Clear the values of every wubwub metric.'''
+    REGISTRY.reset()
+
+def to_prometheus():
+    '''Return every wubwub metric in the Prometheus text format.'''
+    return REGISTRY.to_prometheus()
+
+def to_json(**kwargs):
+    '''Return every wubwub metric as JSON.'''
+    return REGISTRY.to_json(**kwargs)
+
+def export(target, fmt='prometheus'):
+    '''Write every wubwub metric to a file or socket; see
+    `MetricsRegistry.export()`.'''
+    REGISTRY.export(target, fmt)
+
+# metrics updated by the render path
+NOTES_RENDERED = REGISTRY.counter(
+    'wubwub_notes_rendered_total', 'Notes added to audio.')
+RESAMPLES = REGISTRY.counter(
+    'wubwub_resamples_total', 'Samples resampled to shift their pitch.')
+SAMPLE_CONVERSIONS = REGISTRY.counter(
+    'wubwub_sample_conversions_total',
+    'Samples converted to the render format of a Sequencer.')
+OVERLAY_BYTES = REGISTRY.counter(
+    'wubwub_overlay_bytes_total', 'Bytes of audio copied by overlays.')
+EFFECT_LAUNCHES = REGISTRY.counter(
+    'wubwub_effect_launches_total', 'Effects chains (sox processes) run.')
+CACHE_LOOKUPS = REGISTRY.counter(
+    'wubwub_cache_lookups_total', 'Render cache lookups.',
+    labelnames=('cache', 'result'))
+SAMPLE_DECODE_SECONDS = REGISTRY.histogram(
+    'wubwub_sample_decode_seconds', 'Time to decode a sample file.')
+TRACK_BUILD_SECONDS = REGISTRY.histogram(
+    'wubwub_track_build_seconds', 'Time to build a Track in a Sequencer.',
+    labelnames=('kind',))
+SEQUENCER_BUILD_SECONDS = REGISTRY.histogram(
+    'wubwub_sequencer_build_seconds', 'Time to build a Sequencer.')
+EXPORT_SECONDS = REGISTRY.histogram(
+    'wubwub_export_seconds', 'Time to build and export a Sequencer.',
+    labelnames=('format',))
+
+def cache(name, hit):
+    '''Count a lookup in one of the render caches.'''
+    CACHE_LOOKUPS.inc(cache=name, result='hit' if hit else 'miss')
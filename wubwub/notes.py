@@ -16,21 +16,54 @@ used by the `wubwub.tracks.Arpeggiator`.
 
 """
 
-__all__ = ['Note', 'Chord', 'ArpChord', 'arpeggiate', 'arpeggio_generator',
-           'alter_notes', 'new_chord', 'chord_from_name']
+__all__ = ['Note', 'Chord', 'ArpChord', 'arpeggiate', 'arpeggiate_arrays',
+           'arpeggio_generator', 'arpeggio_indices', 'alter_notes',
+           'merge_notes', 'new_chord', 'chord_from_name']
 
 from collections.abc import Iterable
 from fractions import Fraction
 from itertools import cycle, chain
-from sortedcontainers import SortedList
+import math
+import weakref
+
+import numpy as np
 
 from wubwub.errors import WubWubError
 from wubwub.pitch import named_chords, pitch_from_semitones, relative_pitch_to_int
 from wubwub.resources import random_choice_generator
 
+def _intern(cls, key, attrs):
+    '''Return the pooled instance of `cls` for `key`, or create (and pool)
+    a new one with the given attributes.  Objects with unhashable attributes
+    are not pooled.'''
+    try:
+        return cls._pool[key]
+    except KeyError:
+        pass
+    except TypeError:
+        key = None
+    new = object.__new__(cls)
+    for name, value in attrs.items():
+        object.__setattr__(new, name, value)
+    if key is not None:
+        cls._pool[key] = new
+    return new
+
 class Note(object):
-    '''Class to represent an atomic MIDI-like note in wubwub.'''
-    __slots__ = ('pitch', 'length', 'volume')
+    '''Class to represent an atomic MIDI-like note in wubwub.
+
+    Notes are immutable and interned: creating a Note with the same pitch,
+    length, and volume (of the same types) as an existing Note returns the
+    existing object, so repeated Notes cost no extra memory.'''
+    __slots__ = ('pitch', 'length', 'volume', '_sortkey', '__weakref__')
+    _pool = weakref.WeakValueDictionary()
+
+    def __new__(cls, pitch=0, length=1, volume=0):
+        '''Return the interned Note for the given attributes.'''
+        key = (cls, type(pitch), pitch, type(length), length,
+               type(volume), volume)
+        attrs = {'pitch': pitch, 'length': length, 'volume': volume}
+        return _intern(cls, key, attrs)
 
     def __init__(self, pitch=0, length=1, volume=0):
         '''
@@ -54,9 +87,11 @@ class Note(object):
         None.
 
         '''
-        object.__setattr__(self, "pitch", pitch)
-        object.__setattr__(self, "length", length)
-        object.__setattr__(self, "volume", volume)
+        # attributes are set in __new__
+
+    def __reduce__(self):
+        '''Pickle (and copy) Notes by recreating them.'''
+        return (self.__class__, (self.pitch, self.length, self.volume))
 
     def __setattr__(self, *args):
         '''Lock setting of attributes for Notes.'''
@@ -84,13 +119,18 @@ class Note(object):
         except:
             return False
 
+    def __hash__(self):
+        '''Hash based on the pitch, length, and volume.'''
+        return hash((self.pitch, self.length, self.volume))
+
     def __add__(self, other):
         '''Create a Chord by summing this and another Note.'''
         if hasattr(other, 'notes'):
-            other = other.notes
+            # this Note goes after the Notes of the Chord with equal pitch
+            notes = list(other.notes) + [self]
         else:
-            other = [other]
-        return Chord([self] + other)
+            notes = [self, other]
+        return Chord(notes)
 
     def __radd__(self, other):
         '''Create a Chord by summing this and another Note.'''
@@ -124,9 +164,37 @@ class Note(object):
         volume = self.volume if volume is False else volume
         return Note(pitch, length, volume)
 
+def _chord_sortkey(note):
+    '''Sort key for the Notes of a Chord.  This is computed once per Note
+    (Notes are immutable), so merging Chords only compares cached keys.'''
+    try:
+        return note._sortkey
+    except AttributeError:
+        pass
+    if isinstance(note.pitch, str):
+        key = relative_pitch_to_int('C4', note.pitch)
+    else:
+        key = note.pitch
+    object.__setattr__(note, '_sortkey', key)
+    return key
+
 class Chord(object):
-    '''Class to represent an atomic MIDI-like chord in wubwub.'''
-    __slots__ = ('notes')
+    '''Class to represent an atomic MIDI-like chord in wubwub.  Like Notes,
+    Chords are interned, based on the identity of their (sorted) Notes.'''
+    __slots__ = ('notes', '__weakref__')
+    _pool = weakref.WeakValueDictionary()
+
+    def __new__(cls, notes, **attrs):
+        '''Return the interned Chord for the given Notes (and any other
+        attributes, e.g. the length of an ArpChord).  The Notes are stably
+        sorted by pitch; when they are given as already sorted runs (e.g.
+        the Notes of two Chords being added), this is a linear merge.  The
+        Notes are stored as a tuple, so interned Chords cannot be mutated.'''
+        notes = tuple(sorted(notes, key=_chord_sortkey))
+        key = ((cls, tuple(map(id, notes))) +
+               tuple((k, type(v), v) for k, v in attrs.items()))
+        return _intern(cls, key, dict(notes=notes, **attrs))
+
     def __init__(self, notes):
         '''
         Initialze the Chord with a set of Notes.
@@ -134,8 +202,8 @@ class Chord(object):
         Parameters
         ----------
         notes : list-like
-            Collection of `wubwub.notes.Note` objects.  These are added
-            to a SortedList, where the key is the pitch.  Any notes with
+            Collection of `wubwub.notes.Note` objects.  These are stored
+            in a tuple, sorted by pitch.  Any notes with
             scientific pitch notation values for the pitch are given a semitone
             value relative to C4 for sorting purposes.
 
@@ -144,13 +212,11 @@ class Chord(object):
         None
 
         '''
-        def keyfunc(note):
-            if isinstance(note.pitch, str):
-                val = relative_pitch_to_int('C4', note.pitch)
-            else:
-                val = note.pitch
-            return val
-        object.__setattr__(self, "notes", SortedList(notes, key=keyfunc))
+        # attributes are set in __new__
+
+    def __reduce__(self):
+        '''Pickle (and copy) Chords by recreating them.'''
+        return (self.__class__, (list(self.notes),))
 
     def __repr__(self):
         '''String representation of the Chord.'''
@@ -198,13 +264,17 @@ class Chord(object):
         except:
             return False
 
+    def __hash__(self):
+        '''Hash based on the Notes.'''
+        return hash(tuple(self.notes))
+
     def __add__(self, other):
         '''Create a new Chord by adding another Note or Chord.'''
         if hasattr(other, 'notes'):
-            other = other.notes
+            other = list(other.notes)
         else:
             other = [other]
-        return Chord(self.notes + other)
+        return Chord(list(self.notes) + other)
 
     def __radd__(self, other):
         '''Create a new Chord by adding another Note or Chord.'''
@@ -232,7 +302,12 @@ class ArpChord(Chord):
     '''Class to represent a Chord for use by the Arpeggiator Track.  Very
     similar to the Chord class, but has its own length attribute for setting
     the duration of arpeggiation.'''
-    __slots__ = ('notes', 'length')
+    __slots__ = ('length',)
+
+    def __new__(cls, notes, length):
+        '''Return the interned ArpChord for the given Notes and length.'''
+        return super().__new__(cls, notes, length=length)
+
     def __init__(self, notes, length):
         '''
         Initialze the ArpChord with a set of Notes and a length.
@@ -240,8 +315,8 @@ class ArpChord(Chord):
         Parameters
         ----------
         notes : list-like
-            Collection of `wubwub.notes.Note` objects.  These are added
-            to a SortedList, where the key is the pitch.  Any notes with
+            Collection of `wubwub.notes.Note` objects.  These are stored
+            in a tuple, sorted by pitch.  Any notes with
             scientific pitch notation values for the pitch are given a semitone
             value relative to C4 for sorting purposes.
         length : number
@@ -252,8 +327,11 @@ class ArpChord(Chord):
         None
 
         '''
-        super().__init__(notes)
-        object.__setattr__(self, "length", length)
+        # attributes are set in __new__
+
+    def __reduce__(self):
+        '''Pickle (and copy) ArpChords by recreating them.'''
+        return (self.__class__, (list(self.notes), self.length))
 
     def __repr__(self):
         '''Set the string representation for the ArpChord'''
@@ -271,6 +349,10 @@ class ArpChord(Chord):
         except:
             return False
 
+    def __hash__(self):
+        '''Hash based on the Notes and length.'''
+        return hash((tuple(self.notes), self.length))
+
     def __add__(self, other):
         '''Generate a new ArpChord by adding another Note, Chord, or ArpChord.
         The new Chord will have the notes of self and the note(s) of other.  If
@@ -284,7 +366,7 @@ class ArpChord(Chord):
                 newl = max(newl, other.length)
         else:
             toadd = [other]
-        return ArpChord(self.notes + toadd, newl)
+        return ArpChord(list(self.notes) + list(toadd), newl)
 
     def __radd__(self, other):
         '''Generate a new ArpChord by adding another Note, Chord, or ArpChord.
@@ -317,6 +399,14 @@ class ArpChord(Chord):
 # keep track of all Note types
 _notetypes_ = [Note, Chord, ArpChord]
 
+ARPEGGIO_METHODS = ['up', 'down', 'updown', 'downup', 'up&down', 'down&up',
+                    'random']
+
+def _check_arpeggio_method(method):
+    if method not in ARPEGGIO_METHODS:
+        formatted = ', '.join(m for m in ARPEGGIO_METHODS)
+        raise WubWubError(f'Arpeggiator method must be one of {formatted}')
+
 def arpeggio_generator(notes, method):
     '''
     Helper method for generating arpeggiated notes.  Takes a collection of Notes,
@@ -342,11 +432,7 @@ def arpeggio_generator(notes, method):
         Generator of the arpeggiated notes.
 
     '''
-    methods = ['up', 'down', 'updown', 'downup', 'up&down', 'down&up',
-               'random']
-    if method not in methods:
-        formatted = ', '.join(m for m in methods)
-        raise WubWubError(f'Arpeggiator method must be one of {formatted}')
+    _check_arpeggio_method(method)
 
     if method == 'up':
         return cycle(notes)
@@ -363,7 +449,125 @@ def arpeggio_generator(notes, method):
     if method == 'random':
         return random_choice_generator(notes)
 
-def arpeggiate(chord, beat, length=None, freq=0.5, method='up', auto_chord_length='max'):
+def arpeggio_indices(size, steps, method, seed=None):
+    '''
+    Array version of `arpeggio_generator()`.  Returns the indices of the
+    first `steps` arpeggiated Notes, for a collection of `size` Notes.
+
+    Parameters
+    ----------
+    size : int
+        Number of Notes being arpeggiated.
+    steps : int
+        Number of arpeggiated Notes to return.
+    method : 'up', 'down', 'updown', 'downup', 'up&down', 'down&up', `or` 'random'
+        Identifier for the arpeggiation pattern.
+    seed : int or list of int, optional
+        Seed for the random number generator used by the `'random'` method.
+        The default is None, in which case the arpeggiation is not
+        reproducible.
+
+    Raises
+    ------
+    WubWubError
+        `method` is not recognized, or there are no Notes.
+
+    Returns
+    -------
+    numpy.ndarray
+        Integer array of indices.
+
+    '''
+    _check_arpeggio_method(method)
+    if size < 1:
+        raise WubWubError('Cannot arpeggiate a Chord without Notes.')
+
+    up = np.arange(size)
+    if method == 'random':
+        return np.random.default_rng(seed).integers(0, size, steps)
+    patterns = {'up': up,
+                'down': up[::-1],
+                'updown': np.concatenate([up, up[-2:0:-1]]),
+                'downup': np.concatenate([up[::-1], up[1:-1]]),
+                'up&down': np.concatenate([up, up[::-1]]),
+                'down&up': np.concatenate([up[::-1], up])}
+    return np.resize(patterns[method], steps)
+
+def _arpeggio_length(chord, length, auto_chord_length):
+    '''Infer the duration of arpeggiating `chord`.'''
+    if length is not None:
+        return length
+    if isinstance(chord, ArpChord):
+        return chord.length
+    if isinstance(chord, Chord):
+        choices = {'min':min, 'max':max}
+        return choices[auto_chord_length]([note.length for note in chord.notes])
+    raise WubWubError('chord must be wubwub.Chord or wubwub.ArpChord')
+
+def arpeggiate_arrays(chord, beat, length=None, freq=0.5, method='up',
+                      auto_chord_length='max', seed=None):
+    '''
+    Array version of `arpeggiate()`.  Rather than creating Notes, returns
+    the beat, Note index (into `chord.notes`), and length of each
+    arpeggiated Note.  The beats and lengths are the same as those
+    produced by `arpeggiate()`.
+
+    Parameters
+    ----------
+    chord : wubwub.notes.ArpChord or wubwub.notes.Chord
+        Chord to arpeggiate.
+    beat : int or float
+        Beat to start the arpeggiation from.
+    length : int or float, optional
+        Duration of the arpeggiation. The default is None, in which case the
+        duration is inferred from the `chord`.
+    freq : int or float, optional
+        How fast (in beats) the arpeggiation is. The default is 0.5.
+    method : str, optional
+        Arpeggiation method. The default is 'up'.
+    auto_chord_length : 'max' or 'min', optional
+        How to handle inferring the length of the arpeggiation when a
+        `wubwub.notes.Chord` is passed. The default is 'max'.
+    seed : int or list of int, optional
+        Seed for the `'random'` method. The default is None.
+
+    Raises
+    ------
+    WubWubError
+        `chord` is not a wubwub Chord type.
+
+    Returns
+    -------
+    beats : numpy.ndarray
+        Beat of each arpeggiated Note.
+    indices : numpy.ndarray
+        Index of the Note of `chord` played at each beat.
+    lengths : numpy.ndarray
+        Length of each arpeggiated Note.
+
+    '''
+    length = _arpeggio_length(chord, length, auto_chord_length)
+
+    # exact arithmetic, so that beats land exactly on the arpeggiation grid
+    freq = Fraction(freq).limit_denominator()
+    start = Fraction(beat).limit_denominator()
+    end = Fraction(beat + length)
+    steps = max(math.ceil((end - start) / freq), 0)
+
+    p, q = start.numerator, start.denominator
+    r, s = freq.numerator, freq.denominator
+    beats = (p * s + np.arange(steps) * (r * q)) / (q * s)
+    lengths = np.full(steps, r / s)
+    if steps:
+        last = start + (steps - 1) * freq
+        if last + freq > end:
+            lengths[-1] = float(end - last)
+
+    indices = arpeggio_indices(len(chord.notes), steps, method, seed)
+    return beats, indices, lengths
+
+def arpeggiate(chord, beat, length=None, freq=0.5, method='up',
+               auto_chord_length='max', seed=None):
     '''
     Create an arpeggiation of notes in time, based on a chord, a starting beat,
     and pattern.  Produces a dictionary of beat & note pairs.
@@ -384,6 +588,8 @@ def arpeggiate(chord, beat, length=None, freq=0.5, method='up', auto_chord_lengt
     auto_chord_length : 'max' or 'min', optional
         How to handle inferring the length of the arpeggiation when a
         `wubwub.notes.Chord` is passed. The default is 'max'.
+    seed : int or list of int, optional
+        Seed for the `'random'` method. The default is None.
 
     Raises
     ------
@@ -396,35 +602,73 @@ def arpeggiate(chord, beat, length=None, freq=0.5, method='up', auto_chord_lengt
         Dictionary of arpeggiated notes and their respective beats.
 
     '''
+    beats, indices, lengths = arpeggiate_arrays(chord, beat, length, freq,
+                                                method, auto_chord_length,
+                                                seed)
     notes = chord.notes
+    arpeggiated = {}
+    for pos, i, notelength in zip(beats.tolist(), indices.tolist(),
+                                  lengths.tolist()):
+        note = notes[i]
+        arpeggiated[pos] = Note(pitch=note.pitch, length=notelength,
+                                volume=note.volume)
 
-    if length is None:
-        if isinstance(chord, ArpChord):
-            length = chord.length
+    return arpeggiated
 
-        elif isinstance(chord, Chord):
-            choices = {'min':min, 'max':max}
-            length = choices[auto_chord_length]([note.length for note in notes])
+def merge_notes(elements):
+    '''
+    Combine many Notes, Chords, and/or ArpChords into one element, in a
+    single pass.  The result is the same as adding them together in order
+    (`elements[0] + elements[1] + ...`), which is how Tracks merge elements
+    placed on the same beat.
 
-        else:
-            raise WubWubError('chord must be wubwub.Chord or wubwub.ArpChord')
+    Parameters
+    ----------
+    elements : list-like
+        Notes, Chords, and/or ArpChords.
 
-    freq = Fraction(freq).limit_denominator()
-    current = Fraction(beat).limit_denominator()
-    end = beat + length
-    arpeggiated = {}
-    gen = arpeggio_generator(notes, method)
+    Raises
+    ------
+    WubWubError
+        No elements are given.
 
-    while current < end:
-        note = next(gen)
-        notelength = freq if current + freq <= end else end-current
-        pos = current.numerator / current.denominator
-        notelength = notelength.numerator / notelength.denominator
-        arpeggiated[pos] = Note(pitch=note.pitch, length=notelength,
-                                volume=note.volume)
-        current += freq
+    Returns
+    -------
+    wubwub.notes.Note, wubwub.notes.Chord, or wubwub.notes.ArpChord
+        The only element if there is one, otherwise the new Chord (or
+        ArpChord, when the first element is one).
 
-    return arpeggiated
+    '''
+    elements = list(elements)
+    if not elements:
+        raise WubWubError('No Notes to merge.')
+    if len(elements) == 1:
+        return elements[0]
+
+    first = elements[0]
+    arp = isinstance(first, ArpChord)
+    length = first.length if arp else None
+    notes = list(first.notes) if hasattr(first, 'notes') else [first]
+    for i, element in enumerate(elements[1:]):
+        if not hasattr(element, 'notes'):
+            notes.append(element)
+        elif i == 0 and not hasattr(first, 'notes'):
+            # Note + Chord is a Chord, with the Note after the Chord's Notes
+            notes = list(element.notes) + notes
+        elif not isinstance(element, ArpChord):
+            notes.extend(element.notes)
+        elif arp:
+            notes.extend(element.notes)
+            length = max(length, element.length)
+        else:
+            # Chord + ArpChord is handled by ArpChord.__radd__
+            notes = list(element.notes) + notes
+            arp = True
+            length = element.length
+
+    if arp:
+        return ArpChord(notes, length)
+    return Chord(notes)
 
 def alter_notes(array, pitch=False, length=False, volume=False):
     '''
@@ -0,0 +1,423 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Columnar storage for the notes of a Track.
+
+By default, Tracks store their musical elements in a SortedDict mapping
+beats to `wubwub.notes.Note`, `wubwub.notes.Chord`, or
+`wubwub.notes.ArpChord` objects.  For very large Tracks (e.g. generated
+Tracks with hundreds of thousands of notes), the `NoteTable` can be used
+instead.  It stores one row per Note in a structured NumPy array, so the
+memory overhead per note is small, and bulk operations (deleting ranges,
+shifting, rendering) can work on whole columns at once.
+
+The NoteTable mimics the parts of the SortedDict interface used by Tracks,
+so Track indexing and editing work the same with either storage.  Use
+`wubwub.tracks.Track.set_note_storage()` to switch a Track to a NoteTable.
+
+"""
+
+__all__ = ['NoteTable']
+
+import numpy as np
+
+from wubwub.errors import WubWubError
+from wubwub.notes import ArpChord, Chord, Note
+from wubwub.pitch import relative_pitch_to_int, valid_pitch_str
+
+NOTE_DTYPE = np.dtype([('beat', 'f8'),
+                       ('pitch', 'f8'),
+                       ('name', 'O'),
+                       ('length', 'f8'),
+                       ('volume', 'f8'),
+                       ('group', 'i8'),
+                       ('chordlength', 'f8'),
+                       ('ints', 'u1')])
+"""Data type of the rows of a `NoteTable`.  `pitch` holds the pitch in
+semitones (relative to C4 for scientific pitch strings), while `name` holds
+the original pitch when it is a string.  `group` is -1 for single Notes and
+otherwise identifies the Chord a Note belongs to.  `chordlength` is only
+set (non-NaN) for ArpChords.  `ints` flags (one bit per column, see
+`INT_BITS`) the values which were ints, so they are read back as ints."""
+
+INT_BITS = {'pitch': 1, 'length': 2, 'volume': 4, 'chordlength': 8}
+
+def _intbits(**values):
+    '''Return the `ints` flags of the row values given.'''
+    bits = 0
+    for column, value in values.items():
+        if isinstance(value, (int, np.integer)) and not isinstance(value, bool):
+            bits |= INT_BITS[column]
+    return bits
+
+def _pyvals(values, ints, column):
+    '''Convert a column of floats from the table back to Python numbers,
+    restoring ints.'''
+    isint = (np.atleast_1d(ints) & INT_BITS[column]) != 0
+    return [int(v) if i else v for v, i in zip(values, isint.tolist())]
+
+# marks a beat deleted in the pending writes of a NoteTable
+_DELETED = object()
+
+class NoteTable:
+    '''Array-backed, beat-sorted store of Notes, with a SortedDict-like
+    interface.  Setting or deleting a single beat is buffered, and the
+    buffered writes are merged into the array at once when it is next
+    read as a whole, so editing one Note at a time stays cheap.'''
+    def __init__(self, items=None):
+        '''
+        Initialize the NoteTable.
+
+        Parameters
+        ----------
+        items : dict or iterable of (beat, element) pairs, optional
+            Initial musical elements. The default is None.
+
+        Returns
+        -------
+        None.
+
+        '''
+        self._table = np.empty(0, dtype=NOTE_DTYPE)
+        self._nextgroup = 0
+        self._starts = None
+        self._pending = {}
+        if items:
+            self.update(items)
+
+    def __repr__(self):
+        '''String representation of the NoteTable.'''
+        return f'NoteTable(elements={len(self)}, notes={len(self.table)})'
+
+    def __len__(self):
+        '''Return the number of beats containing an element.'''
+        return len(self._groupstarts())
+
+    def __iter__(self):
+        '''Iterate over the beats containing an element.'''
+        return iter(self.keys())
+
+    def __contains__(self, beat):
+        '''Check if there is an element on `beat`.'''
+        return self.get(beat, _DELETED) is not _DELETED
+
+    def __getitem__(self, beat):
+        '''Return the element on `beat`.'''
+        element = self.get(beat, _DELETED)
+        if element is _DELETED:
+            raise KeyError(beat)
+        return element
+
+    def __setitem__(self, beat, element):
+        '''Set the element on `beat`, replacing any existing element.'''
+        if not isinstance(element, (Note, Chord)):
+            raise WubWubError('NoteTable can only store Notes, Chords, '
+                              f'or ArpChords, not {type(element)}')
+        self._pending[beat] = element
+
+    def __delitem__(self, beat):
+        '''Delete the element on `beat`.'''
+        if beat not in self:
+            raise KeyError(beat)
+        self._pending[beat] = _DELETED
+
+    @property
+    def table(self):
+        '''The structured array of rows (see `NOTE_DTYPE`), sorted by
+        beat.'''
+        if self._pending:
+            self._flush()
+        return self._table
+
+    def _flush(self):
+        '''Merge the buffered writes into the array.'''
+        pending = self._pending
+        self._pending = {}
+        added = {beat: element for beat, element in pending.items()
+                 if element is not _DELETED}
+        deleted = [beat for beat, element in pending.items()
+                   if element is _DELETED]
+        if deleted:
+            table = self._table
+            self._settable(table[~np.isin(table['beat'],
+                                          np.array(deleted, dtype=float))])
+        self.update(added)
+
+    def _settable(self, table):
+        '''Replace the underlying array, clearing cached indices.'''
+        self._table = table
+        self._starts = None
+
+    def _span(self, beat):
+        '''Return the rows (as start and stop indices) for `beat`, ignoring
+        buffered writes.'''
+        beats = self._table['beat']
+        lo = np.searchsorted(beats, beat, side='left')
+        hi = np.searchsorted(beats, beat, side='right')
+        return int(lo), int(hi)
+
+    def _groupstarts(self):
+        '''Return the index of the first row of each element.'''
+        beats = self.table['beat']
+        if self._starts is None:
+            self._starts = np.flatnonzero(np.diff(beats, prepend=-np.inf))
+        return self._starts
+
+    def _element_rows(self, beat, element):
+        '''Convert a Note, Chord, or ArpChord into a list of rows (tuples)
+        for the table.'''
+        if isinstance(element, Note):
+            notes = [element]
+            group = -1
+            chordlength = np.nan
+        elif isinstance(element, Chord):
+            notes = element.notes
+            group = self._nextgroup
+            self._nextgroup += 1
+            chordlength = getattr(element, 'length', np.nan)
+        else:
+            raise WubWubError('NoteTable can only store Notes, Chords, '
+                              f'or ArpChords, not {type(element)}')
+
+        rows = []
+        for note in notes:
+            pitch = note.pitch
+            name = None
+            if isinstance(pitch, str):
+                name = pitch
+                pitch = (relative_pitch_to_int('C4', pitch)
+                         if valid_pitch_str(pitch) else np.nan)
+            elif pitch is None:
+                pitch = np.nan
+            ints = _intbits(pitch=note.pitch, length=note.length,
+                            volume=note.volume, chordlength=chordlength)
+            rows.append((beat, pitch, name, note.length, note.volume,
+                         group, chordlength, ints))
+        return rows
+
+    def _notes(self, lo, hi):
+        '''Create the Notes for the rows between `lo` and `hi`.'''
+        rows = self._table[lo:hi]
+        pitches = self._pitches(rows)
+        lengths = _pyvals(rows['length'].tolist(), rows['ints'], 'length')
+        volumes = _pyvals(rows['volume'].tolist(), rows['ints'], 'volume')
+        return [Note(p, l, v) for p, l, v in zip(pitches, lengths, volumes)]
+
+    def _element(self, lo, hi):
+        '''Create the Note, Chord, or ArpChord for the rows between
+        `lo` and `hi`.'''
+        notes = self._notes(lo, hi)
+        row = self._table[lo]
+        if row['group'] == -1:
+            return notes[0]
+        chordlength = float(row['chordlength'])
+        if np.isnan(chordlength):
+            return Chord(notes)
+        length, = _pyvals([chordlength], row['ints'], 'chordlength')
+        return ArpChord(notes, length)
+
+    def pitches(self, lo=0, hi=None):
+        '''Return the pitch of each row as an object array, restoring
+        string pitches and `None`.'''
+        return self._pitches(self.table[lo:hi])
+
+    def _pitches(self, rows):
+        names = rows['name']
+        numeric = rows['pitch']
+        out = np.array(_pyvals(numeric.tolist(), rows['ints'], 'pitch'),
+                       dtype=object)
+        named = names != None
+        out[named] = names[named]
+        out[~named & np.isnan(numeric)] = None
+        return out
+
+    def _rowrange(self, start=None, stop=None):
+        '''Return the rows (as start and stop indices) with
+        `start <= beat < stop`.'''
+        beats = self.table['beat']
+        lo = 0 if start is None else np.searchsorted(beats, start, side='left')
+        hi = len(beats) if stop is None else np.searchsorted(beats, stop, side='left')
+        return int(lo), int(max(lo, hi))
+
+    def irange(self, minimum=None, maximum=None, inclusive=(True, True),
+               reverse=False):
+        '''Iterate over the beats between `minimum` and `maximum`, like
+        `SortedDict.irange()`.'''
+        beats = self.beats()
+        lo = 0
+        hi = len(beats)
+        if minimum is not None:
+            side = 'left' if inclusive[0] else 'right'
+            lo = np.searchsorted(beats, minimum, side=side)
+        if maximum is not None:
+            side = 'right' if inclusive[1] else 'left'
+            hi = np.searchsorted(beats, maximum, side=side)
+        keys = beats[lo:hi].tolist()
+        return reversed(keys) if reverse else iter(keys)
+
+    def beats(self):
+        '''Return an array of the beats containing an element.'''
+        return self.table['beat'][self._groupstarts()]
+
+    def keys(self):
+        '''Return a list of the beats containing an element.'''
+        return self.beats().tolist()
+
+    def values(self):
+        '''Return a list of the elements, sorted by beat.'''
+        starts = self._groupstarts()
+        stops = np.append(starts[1:], len(self.table))
+        return [self._element(lo, hi) for lo, hi in
+                zip(starts.tolist(), stops.tolist())]
+
+    def items(self):
+        '''Return a list of (beat, element) pairs, sorted by beat.'''
+        return list(zip(self.keys(), self.values()))
+
+    def get(self, beat, default=None):
+        '''Return the element on `beat`, or `default` if there is none.'''
+        element = self._pending.get(beat, default)
+        if beat in self._pending:
+            return default if element is _DELETED else element
+        lo, hi = self._span(beat)
+        if lo == hi:
+            return default
+        return self._element(lo, hi)
+
+    def copy(self):
+        '''Return a copy of the NoteTable.'''
+        new = NoteTable()
+        new._settable(self._table.copy())
+        new._pending = self._pending.copy()
+        new._nextgroup = self._nextgroup
+        return new
+
+    def clear(self):
+        '''Remove all elements.'''
+        self._pending = {}
+        self._settable(np.empty(0, dtype=NOTE_DTYPE))
+
+    def update(self, items):
+        '''
+        Add many elements at once, replacing any existing elements on the
+        same beats.
+
+        Parameters
+        ----------
+        items : dict or iterable of (beat, element) pairs
+            Elements to add.
+
+        Returns
+        -------
+        None.
+
+        '''
+        items = dict(items)
+        if not items:
+            return
+        # convert each distinct element object to rows only once, then
+        # repeat those rows for every beat the element is placed on
+        templates = {}
+        which = []
+        for element in items.values():
+            key = id(element)
+            if key not in templates:
+                rows = self._element_rows(0, element)
+                templates[key] = (len(templates), rows)
+            which.append(templates[key][0])
+        rows = [r for _, t in templates.values() for r in t]
+        rows = np.array(rows, dtype=NOTE_DTYPE)
+        counts = np.array([len(t) for _, t in templates.values()])
+        offsets = np.cumsum(counts) - counts
+        which = np.array(which)
+        percount = counts[which]
+        itemstarts = np.cumsum(percount) - percount
+        idx = (np.repeat(offsets[which] - itemstarts, percount) +
+               np.arange(percount.sum()))
+        new = rows[idx]
+        new['beat'] = np.repeat(np.array(list(items), dtype=float), percount)
+        # each placed Chord gets its own group
+        chords = new['group'] != -1
+        groups = self._nextgroup + np.repeat(np.arange(len(which)), percount)
+        new['group'][chords] = groups[chords]
+        self._nextgroup += len(which)
+        self._merge_rows(new)
+
+    def _merge_rows(self, new):
+        '''Merge new rows in, with new elements replacing existing ones.'''
+        old = self.table[~np.isin(self.table['beat'], new['beat'])]
+        table = np.concatenate([old, new])
+        order = np.argsort(table['beat'], kind='stable')
+        self._settable(table[order])
+
+    def delete_range(self, lo=None, hi=None):
+        '''Delete all elements with `lo <= beat < hi`.'''
+        a, b = self._rowrange(lo, hi)
+        if a != b:
+            self._settable(np.concatenate([self.table[:a], self.table[b:]]))
+
+    def delete_beats(self, beats):
+        '''Delete the elements on each of `beats`.  Raises a KeyError if
+        any of the beats has no element.'''
+        beats = np.asarray(beats, dtype=float)
+        missing = ~np.isin(beats, self.beats())
+        if missing.any():
+            raise KeyError(beats[missing][0])
+        self._settable(self.table[~np.isin(self.table['beat'], beats)])
+
+    def shift(self, beats, by):
+        '''
+        Move the elements on some beats by a number of beats.  When
+        an element is moved onto the beat of another element, the element
+        which comes later (in the original order) is kept.
+
+        Parameters
+        ----------
+        beats : array-like
+            Beats of the elements to move.
+        by : number
+            Number of beats to move by.
+
+        Returns
+        -------
+        None.
+
+        '''
+        if not len(self.table):
+            return
+        table = self.table.copy()
+        element = np.cumsum(np.diff(table['beat'], prepend=-np.inf) != 0)
+        moved = np.isin(table['beat'], np.asarray(beats, dtype=float))
+        table['beat'][moved] += by
+        order = np.lexsort((element, table['beat']))
+        table, element = table[order], element[order]
+        # on each beat, keep only the rows of the last element moved there
+        starts = np.flatnonzero(np.diff(table['beat'], prepend=-np.inf))
+        last = np.maximum.reduceat(element, starts)
+        counts = np.diff(np.append(starts, len(table)))
+        keep = element == np.repeat(last, counts)
+        self._settable(table[keep])
+
+    def columns(self, start=None, stop=None):
+        '''
+        Return the beat, pitch, length, and volume of every Note (with
+        Chords unpacked) with `start <= beat < stop`, sorted by beat.
+
+        Returns
+        -------
+        beats, pitches, lengths, volumes : numpy.ndarray
+            Arrays with one entry per Note.  `pitches` is an object array,
+            see `NoteTable.pitches()`.
+
+        '''
+        lo, hi = self._rowrange(start, stop)
+        rows = self.table[lo:hi]
+        return (rows['beat'], self.pitches(lo, hi),
+                rows['length'], rows['volume'])
+
+    def unpacked(self, start=None, stop=None):
+        '''Return a list of (beat, Note) pairs for every Note with
+        `start <= beat < stop`, with Chords unpacked.'''
+        lo, hi = self._rowrange(start, stop)
+        return list(zip(self.table['beat'][lo:hi].tolist(),
+                        self._notes(lo, hi)))
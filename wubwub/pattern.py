@@ -4,35 +4,102 @@
 Class for encoding rhythmic patterns.
 """
 
-from sortedcontainers import SortedList
+__all__ = ['Pattern']
+
+from numbers import Integral
+
+import numpy as np
+
+def _sorted_beats(beats):
+    '''Convert beats to a sorted 1D array.'''
+    beats = np.sort(np.asarray(beats).ravel(), kind='stable')
+    if beats.dtype.kind not in 'iuf':
+        beats = beats.astype(float)
+    return beats
 
 class Pattern:
-    '''Class for encoding a rhythmic pattern.'''
+    '''Class for encoding a rhythmic pattern.
+
+    Beats are held in a sorted NumPy array.  Repeating a Pattern (with `*`)
+    is lazy: the repeated beats are only computed when they are needed.'''
     def __init__(self, pattern, length):
         '''Initialize with a list of beats and a length of the pattern (in beats).
-        The `pattern` will be converted into a SortedList.'''
-        self.pattern = SortedList(pattern)
-        self.length = length
+        The `pattern` will be converted into a sorted array.'''
+        self._set(_sorted_beats(pattern), length)
+
+    def _set(self, base, period, repeats=1):
+        # `base` is repeated `repeats` times, every `period` beats
+        self._base = base
+        self._period = period
+        self._repeats = repeats
+        self._cache = base if repeats == 1 else None
+
+    @classmethod
+    def _new(cls, base, period, repeats=1):
+        '''Create a Pattern from an already sorted array.'''
+        new = cls.__new__(cls)
+        new._set(base, period, repeats)
+        return new
+
+    def _repeat_base(self, repeats):
+        '''Return the beats of the first `repeats` repeats of the base.'''
+        offsets = np.arange(repeats) * self._period
+        beats = (self._base[None, :] + offsets[:, None]).ravel()
+        if not self._is_ordered():
+            beats = np.sort(beats, kind='stable')
+        return beats
+
+    @property
+    def pattern(self):
+        '''Sorted array of the beats in the pattern.'''
+        if self._cache is None:
+            self._cache = self._repeat_base(self._repeats)
+        return self._cache
+
+    @pattern.setter
+    def pattern(self, beats):
+        self._set(_sorted_beats(beats), self.length)
+
+    @property
+    def length(self):
+        '''Length of the pattern (in beats).'''
+        return self._period * self._repeats
+
+    @length.setter
+    def length(self, value):
+        self._set(self.pattern, value)
+
+    def _is_ordered(self):
+        '''Whether the repeats of the base pattern do not interleave.'''
+        base = self._base
+        return len(base) < 2 or base[-1] - base[0] < self._period
 
     def __repr__(self):
         '''String representation'''
-        return f'Pattern(pattern={self.pattern}, length={self.length})'
+        return f'Pattern(pattern={self.pattern.tolist()}, length={self.length})'
 
     def __eq__(self, other):
         '''Returns True if the pattern and length of other equal that of self.'''
-        return self.pattern == other.pattern and self.length == other.length
+        if not isinstance(other, Pattern):
+            return False
+        return (np.array_equal(self.pattern, other.pattern) and
+                self.length == other.length)
 
     def __iter__(self):
         '''Iterate over the beats in the pattern of self.'''
-        return iter(self.pattern)
+        if self._cache is not None or not self._is_ordered():
+            return iter(self.pattern.tolist())
+        return (b + i * self._period
+                for i in range(self._repeats)
+                for b in self._base.tolist())
 
     def __add__(self, other):
         '''Create a new pattern with the beats of self followed by the beats of other.'''
         if not isinstance(other, Pattern):
             raise TypeError(f'Can only add Pattern with Pattern, not {type(other)}.')
-        newp = self.pattern + [p + self.length for p in other.pattern]
+        newp = np.concatenate([self.pattern, other.pattern + self.length])
         newl = self.length + other.length
-        return Pattern(newp, newl)
+        return Pattern._new(np.sort(newp, kind='stable'), newl)
 
     def __radd__(self, other):
         '''Create a new pattern with the beats of self followed by the beats of other.'''
@@ -43,20 +110,22 @@ class Pattern:
 
     def __iadd__(self, other):
         '''Add to the pattern of self.'''
-        self.pattern += [p + self.length for p in other.pattern]
-        self.length += other.length
+        new = self + other
+        self._set(new.pattern, new.length)
         return self
 
+    def _repeated(self, n):
+        if not isinstance(n, Integral):
+            raise TypeError(f'Can only multiply Pattern by int, not {type(n)}.')
+        if n <= 0:
+            return Pattern._new(self._base[:0], 0)
+        if self._repeats == 1:
+            return Pattern._new(self._base, self._period, n)
+        return Pattern._new(self.pattern, self.length, n)
+
     def __mul__(self, n):
         '''Repeat the pattern n times.'''
-        if not isinstance(n, int):
-            raise TypeError('Can only multiply Pattern by int, not {type(other)}.')
-        newp = SortedList()
-        newl = 0
-        for i in range(n):
-            newp += [p + newl for p in self.pattern]
-            newl += self.length
-        return Pattern(newp, newl)
+        return self._repeated(n)
 
     def __rmul__(self, n):
         '''Repeat the pattern n times.'''
@@ -64,20 +133,13 @@ class Pattern:
 
     def __imul__(self, n):
         '''Repeat the pattern n times.'''
-        if not isinstance(n, int):
-            raise TypeError('Can only multiply Pattern by int, not {type(other)}.')
-        newp = SortedList()
-        newl = 0
-        for i in range(n):
-            newp += [p + newl for p in self.pattern]
-            newl += self.length
-        self.pattern = newp
-        self.length = newl
+        new = self._repeated(n)
+        self._set(new._base, new._period, new._repeats)
         return self
 
     def __len__(self):
         '''Return the number of elements in the pattern of self.'''
-        return len(self.pattern)
+        return len(self._base) * self._repeats
 
     def merge(self, other):
         '''
@@ -102,17 +164,17 @@ class Pattern:
         >>> a = wb.Pattern([1, 3, 5, 7], length=8)
         >>> b = wb.Pattern([6, 8], length=4)
         >>> a.merge(b)
-        Pattern(pattern=SortedList([1, 3, 5, 6, 7, 8]), length=8)
+        Pattern(pattern=[1, 3, 5, 6, 7, 8], length=8)
 
         ```
 
         '''
-        newp = self.pattern.copy()
-        for p in other.pattern:
-            if p not in newp:
-                newp.add(p)
+        mine = self.pattern
+        new = np.unique(other.pattern)
+        new = new[~np.isin(new, mine)]
+        newp = np.sort(np.concatenate([mine, new]), kind='stable')
         newl = max(self.length, other.length)
-        return Pattern(newp, newl)
+        return Pattern._new(newp, newl)
 
     def on(self, beat):
         '''
@@ -137,12 +199,16 @@ class Pattern:
 
         >>> a = wb.Pattern([1, 1.25, 1.75, 2, 2.5], length=2)
         >>> a.on(42)
-        Pattern(pattern=SortedList([42, 42.25, 42.75, 43, 43.5]), length=2)
+        Pattern(pattern=[42.0, 42.25, 42.75, 43.0, 43.5], length=2)
 
         ```
 
         '''
-        return Pattern([(beat-1) + p for p in self.pattern], self.length)
+        new = Pattern._new(self._base + (beat - 1), self._period,
+                           self._repeats)
+        if self._cache is not None and self._repeats > 1:
+            new._cache = self._cache + (beat - 1)
+        return new
 
     def onmeasure(self, measure, measurelen=None):
         '''
@@ -169,7 +235,7 @@ class Pattern:
 
         >>> a = wb.Pattern([1, 1.25, 1.75, 2, 2.5], length=2)
         >>> a.onmeasure(3, measurelen=4)
-        Pattern(pattern=SortedList([9, 9.25, 9.75, 10, 10.5]), length=2)
+        Pattern(pattern=[9.0, 9.25, 9.75, 10.0, 10.5], length=2)
 
         ```
 
@@ -200,18 +266,27 @@ class Pattern:
 
         >>> a = wb.Pattern([1, 1.25, 1.5, 2, 3.25, 3.75, 4.25], length=4)
         >>> a.chop(3)
-        Pattern(pattern=SortedList([1, 1.25, 1.5, 2]), length=2)
+        Pattern(pattern=[1.0, 1.25, 1.5, 2.0], length=2)
 
         ```
 
         '''
-        newp = [p for p in self.pattern if p < beat]
+        if self._cache is None and self._is_ordered() and len(self._base):
+            # only materialize the repeats starting before the chop
+            first = self._base[0]
+            repeats = np.ceil((beat - first) / self._period)
+            section = self._repeat_base(int(np.clip(repeats, 0, self._repeats)))
+        else:
+            section = self.pattern
+        newp = section[:np.searchsorted(section, beat, side='left')]
         newl = beat - 1
-        return Pattern(newp, newl)
+        return Pattern._new(newp, newl)
 
     def copy(self):
         '''Return a copy of self.'''
-        return Pattern(self.pattern, self.length)
+        new = Pattern._new(self._base, self._period, self._repeats)
+        new._cache = self._cache
+        return new
 
     def until(self, beat):
         '''
@@ -234,12 +309,11 @@ class Pattern:
         >>> import wubwub as wb
 
         >>> a = wb.Pattern([1, 2, 3, 4], length=4)
-        >>> a = wb.Pattern([1, 2, 3, 4], length=4)
-        Pattern(pattern=SortedList([1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16]), length=16)
+        >>> a.until(16)
+        Pattern(pattern=[1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16], length=16)
 
         ```
 
         '''
         repeats, extra = divmod(beat, self.length)
-        return self.copy() * repeats + self.copy().chop(extra + 1)
-
+        return self.copy() * int(repeats) + self.copy().chop(extra + 1)
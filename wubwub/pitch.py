@@ -4,8 +4,11 @@
 Functions and resources for dealing with pitch in wubwub.
 """
 
+from functools import lru_cache
 import re
 
+import numpy as np
+
 from wubwub.errors import WubWubError
 
 NOTES = ['C' , 'C#', 'Db', 'D' , 'D#', 'Eb', 'E' , 'F', 'F#',
@@ -14,6 +17,14 @@ DIFF =  [0   , 1   , 1   , 2   , 3   , 3   , 4   , 5   , 6   ,
          6   , 7   , 8   , 8   , 9   , 10  , 10  , 11  ]
 NOTES_JOIN = '|'.join(NOTES)
 
+# lookups for converting between pitch classes and semitones (above C);
+# sharps are used when converting from semitones
+PITCH_CLASSES = dict(zip(NOTES, DIFF))
+SEMITONE_NAMES = {}
+for _name, _diff in zip(NOTES, DIFF):
+    SEMITONE_NAMES.setdefault(_diff, _name)
+del _name, _diff
+
 named_chords = (
     {''     : (0, 4, 7),
      'M'    : (0, 4, 7),
@@ -32,15 +43,60 @@ named_chords = (
 
 chordnames_re = '|'.join(named_chords.keys())
 
+_CHORD_RE = re.compile(f"^({NOTES_JOIN})({'|'.join(map(re.escape, named_chords))})$")
+_PITCH_RE = re.compile(f"^({NOTES_JOIN})(-?[0-9]+)$")
+
 def valid_chord_str(s):
     '''Returns True if `s` is a valid chord string.'''
-    pattern = f"^({NOTES_JOIN})({chordnames_re})$"
-    return bool(re.match(pattern, s))
+    return bool(_CHORD_RE.match(s))
 
 def valid_pitch_str(s):
     '''Returns True is `s` is a valid scientific pitch string.'''
-    pattern = f"^({NOTES_JOIN})[0-9]$"
-    return bool(re.match(pattern, s))
+    try:
+        parse_pitch(s)
+    except WubWubError:
+        return False
+    return True
+
+@lru_cache(maxsize=4096)
+def parse_pitch(pitch_str):
+    '''
+    Parse a scientific pitch string.  Results are memoized, so repeated
+    parsing of the same pitches (e.g. for every note in a render) is cheap.
+
+    Parameters
+    ----------
+    pitch_str : str
+        Scientific pitch string.
+
+    Raises
+    ------
+    WubWubError
+        Pitch string is not valid.
+
+    Returns
+    -------
+    pitch, octave, midi
+        Tuple of the pitch name, the octave (int), and the MIDI note number
+        (where C4 is 60).
+
+    '''
+    match = _PITCH_RE.match(pitch_str)
+    if match is None:
+        raise WubWubError(f'"{pitch_str}" is not a valid pitch string')
+    name, octave = match.groups()
+    octave = int(octave)
+    return name, octave, 12 * (octave + 1) + PITCH_CLASSES[name]
+
+@lru_cache(maxsize=4096)
+def _pitch_from_midi(midi):
+    '''Convert a MIDI note number to a scientific pitch string.'''
+    octave, semitones = divmod(midi, 12)
+    try:
+        name = SEMITONE_NAMES[semitones]
+    except KeyError:
+        raise WubWubError(f'Cannot convert {midi} to a pitch string')
+    return name + str(octave - 1)
 
 def pitch_from_semitones(pitch, semitones):
     '''
@@ -60,14 +116,7 @@ def pitch_from_semitones(pitch, semitones):
         New scientific pitch string
 
     '''
-    oldname, oldoct = splitoctave(pitch)
-    idx_old = NOTES.index(oldname)
-    old_diff = DIFF[idx_old]
-    octave_change = (old_diff + semitones) // 12
-    new_diff = semitones + old_diff
-    new_diff = (new_diff % 12) if (new_diff >= 0) else ((12 + (new_diff % -12)) % 12)
-    newpitch = NOTES[DIFF.index(new_diff)]
-    return newpitch + str(oldoct + octave_change)
+    return _pitch_from_midi(parse_pitch(pitch)[2] + semitones)
 
 def relative_pitch_to_int(a, b):
     '''
@@ -87,11 +136,96 @@ def relative_pitch_to_int(a, b):
         Integer.
 
     '''
-    pitch_a, octave_a = splitoctave(a)
-    pitch_b, octave_b = splitoctave(b)
-    octave_diff = octave_b - octave_a
-    pitch_diff = DIFF[NOTES.index(pitch_b)] - DIFF[NOTES.index(pitch_a)]
-    return pitch_diff + (12 * octave_diff)
+    return parse_pitch(b)[2] - parse_pitch(a)[2]
+
+def pitches_to_midi(pitches):
+    '''
+    Convert many scientific pitch strings to MIDI note numbers at once.
+
+    Parameters
+    ----------
+    pitches : list-like of str
+        Scientific pitch strings.
+
+    Returns
+    -------
+    numpy.ndarray
+        Integer array of MIDI note numbers (C4 is 60).
+
+    '''
+    pitches = np.asarray(pitches, dtype=str)
+    if not pitches.size:
+        return np.empty(pitches.shape, dtype=int)
+    unique, inverse = np.unique(pitches, return_inverse=True)
+    midi = np.array([parse_pitch(p)[2] for p in unique.tolist()], dtype=int)
+    return midi[inverse].reshape(pitches.shape)
+
+def midi_to_pitches(midi):
+    '''
+    Convert many MIDI note numbers to scientific pitch strings at once.
+    Sharps are used for black keys.
+
+    Parameters
+    ----------
+    midi : list-like of int
+        MIDI note numbers.
+
+    Returns
+    -------
+    numpy.ndarray
+        Array of scientific pitch strings.
+
+    '''
+    midi = np.asarray(midi)
+    if not np.all(np.mod(midi, 1) == 0):
+        raise WubWubError('MIDI note numbers must be integers')
+    octaves, semitones = np.divmod(midi.astype(int), 12)
+    names = np.array([SEMITONE_NAMES[i] for i in range(12)])
+    return np.char.add(names[semitones], (octaves - 1).astype(str))
+
+def pitches_to_semitones(pitches, basepitch=None):
+    '''
+    Convert many Note pitches to semitones relative to `basepitch`.
+    Numeric pitches are already relative, and are returned unchanged.
+
+    Parameters
+    ----------
+    pitches : list-like
+        Pitches, either numbers (semitones), scientific pitch strings,
+        or None.
+    basepitch : str, optional
+        Scientific pitch string for the reference pitch.  Only needed when
+        there are pitch strings. The default is None.
+
+    Raises
+    ------
+    WubWubError
+        Pitch strings are present without a `basepitch`.
+
+    Returns
+    -------
+    numpy.ndarray
+        Float array of semitones, with NaN for None pitches.
+
+    '''
+    pitches = list(pitches)
+    out = np.full(len(pitches), np.nan)
+    named = [i for i, p in enumerate(pitches) if isinstance(p, str)]
+    numeric = [i for i, p in enumerate(pitches)
+               if p is not None and not isinstance(p, str)]
+    out[numeric] = [pitches[i] for i in numeric]
+    if named:
+        if not isinstance(basepitch, str):
+            raise WubWubError('Cannot convert pitch strings to semitones '
+                              'without a `basepitch`.')
+        midi = pitches_to_midi([pitches[i] for i in named])
+        out[named] = midi - parse_pitch(basepitch)[2]
+    return out
+
+def semitones_to_ratios(semitones):
+    '''Convert semitones (e.g. from `pitches_to_semitones()`) to the
+    playback rate ratios used for repitching samples.'''
+    return 2.0 ** (np.asarray(semitones, dtype=float) / 12)
 
 def splitoctave(pitch_str, octave_type=int):
     '''
@@ -115,20 +249,17 @@ def splitoctave(pitch_str, octave_type=int):
         Tuple of the pitch name and octave.
 
     '''
-    if not valid_pitch_str(pitch_str):
-        raise WubWubError(f'"{pitch_str}" is not a valid pitch string')
-    return pitch_str[:-1], octave_type(pitch_str[-1])
+    name, octave, _ = parse_pitch(pitch_str)
+    return name, octave_type(str(octave))
 
 def splitchordname(chord_str):
     '''Split a named chord into the pitch and chord type.'''
-    if not valid_chord_str(chord_str):
+    match = _CHORD_RE.match(chord_str)
+    if match is None:
         raise WubWubError(f'"{chord_str}" is not a valid chord string')
-    if chord_str[1] in ['#, b']:
-        return chord_str[:2], chord_str[2:]
-    else:
-        return chord_str[:1], chord_str[1:]
+    return match.groups()
 
-def shift_pitch(sound, semitones):
+def shift_pitch(sound, semitones, frame_rate=44100):
     '''
     Pitch a pydub AudioSegment up or down.  Note that this is achieved by
     speeding up or slowing down the audio, like many samplers do.
@@ -139,6 +270,8 @@ def shift_pitch(sound, semitones):
         Sound to repitch.
     semitones : number
         Number of semitones to repitch the sound.  Can be int or float.
+    frame_rate : int, optional
+        Frame rate of the repitched sound. The default is 44100.
 
     Returns
     -------
@@ -149,5 +282,5 @@ def shift_pitch(sound, semitones):
     octaves = (semitones/12)
     new_sample_rate = int(sound.frame_rate * (2.0 ** octaves))
     new_sound = sound._spawn(sound.raw_data, overrides={'frame_rate': new_sample_rate})
-    new_sound = new_sound.set_frame_rate(44100)
+    new_sound = new_sound.set_frame_rate(frame_rate)
     return new_sound
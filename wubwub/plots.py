@@ -6,14 +6,14 @@ Various plots for visualizing the contents of a `wubwub.sequencer.Sequencer`.
 
 __pdoc__ = {'draw_pianoroll': False}
 
-from numbers import Number
-
 import matplotlib as mpl
 import matplotlib.pyplot as plt
 from matplotlib.ticker import AutoMinorLocator
+import numpy as np
 
 from wubwub.errors import WubWubError
-from wubwub.pitch import pitch_from_semitones, relative_pitch_to_int
+from wubwub.pitch import (midi_to_pitches, parse_pitch, pitches_to_midi,
+                          pitches_to_semitones)
 from wubwub.resources import MINUTE
 
 # get the color cycle from mpl
@@ -109,7 +109,7 @@ def sequencerplot(sequencer, timesig=4, grid=True, ax=None, scatter_kwds=None,
             marker = 'o'
 
         beats = track.array_of_beats()
-        notes = track.notedict.values()
+        notes = [n for _, n in track.noterange()]
 
         ax.scatter(beats, [-y] * len(beats), color=color, marker=marker,
                    zorder=5, **scatter_kwds)
@@ -139,18 +139,23 @@ def sequencerplot(sequencer, timesig=4, grid=True, ax=None, scatter_kwds=None,
 
     return ax.figure
 
-def _convert_semitones_str_yaxis(plottype, note, track):
-    '''Convert scientific pitch notations and relative semitones.'''
-    if plottype == 'semitones' and isinstance(note.pitch, str):
-        if not hasattr(track, 'basepitch'):
+# MIDI number of C1, which is 0 on the pitch axes
+_C1 = parse_pitch('C1')[2]
+
+def _convert_semitones_str_yaxis(plottype, pitches, track):
+    '''Convert scientific pitch notations and relative semitones for many
+    pitches at once.  Returns semitones relative to the `basepitch` for
+    `'semitones'`, or relative to C1 for `'pitch'`.'''
+    basepitch = getattr(track, 'basepitch', None)
+    named = np.array([isinstance(p, str) for p in pitches], dtype=bool)
+    if plottype == 'semitones':
+        if named.any() and basepitch is None:
             raise WubWubError('Cannot convert pitch to semitoes with no `basepitch` attribute.')
-        return relative_pitch_to_int(track.basepitch, note.pitch)
-    elif plottype == 'pitch' and isinstance(note.pitch, Number):
-        if not hasattr(track, 'basepitch'):
-            raise WubWubError('Cannot convert semitones to pitch with no `basepitch` attribute.')
-        return pitch_from_semitones(track.basepitch, note.pitch)
-    else:
-        return note.pitch
+        return pitches_to_semitones(pitches, basepitch)
+    if not named.all() and basepitch is None:
+        raise WubWubError('Cannot convert semitones to pitch with no `basepitch` attribute.')
+    ref = basepitch if basepitch is not None else 'C1'
+    return pitches_to_semitones(pitches, ref) + (parse_pitch(ref)[2] - _C1)
 
 def _format_pitch_yaxis(ax, pitchnums, max_range=24, max_pitches=12):
     '''Format the y-axis when plotting pitches.'''
@@ -160,8 +165,8 @@ def _format_pitch_yaxis(ax, pitchnums, max_range=24, max_pitches=12):
     if pitchrange > max_range or len(pitchnums) > max_pitches:
         yticks = [i for i in range(lo, hi) if i % 12 == 0]
     else:
-        yticks = list(pitchnums)
-    labels = [pitch_from_semitones('C1', y) for y in yticks]
+        yticks = sorted(pitchnums)
+    labels = midi_to_pitches(np.array(yticks, dtype=int) + _C1).tolist()
     ax.set_yticks(yticks)
     ax.set_yticklabels(labels)
 
@@ -236,8 +241,6 @@ def trackplot(track, yaxis='semitones', timesig=4, grid=True, ax=None,
     if plot_kwds is None:
         plot_kwds = {}
 
-    pitchnums = set()
-
     color = track.plotting.get('color')
     marker =  track.plotting.get('marker')
 
@@ -250,7 +253,7 @@ def trackplot(track, yaxis='semitones', timesig=4, grid=True, ax=None,
     notes = []
     lengths = []
 
-    for beat, element in track.notedict.items():
+    for beat, element in track.noterange():
 
         clss = element.__class__.__name__
 
@@ -266,16 +269,13 @@ def trackplot(track, yaxis='semitones', timesig=4, grid=True, ax=None,
                 lengths.append(_actual_soundlength(track, element))
 
     if yaxis in ['pitch', 'semitones']:
-        for b, n, l in zip(beats, notes, lengths):
-            p = _convert_semitones_str_yaxis(yaxis, n, track)
-            if isinstance(p, str):
-                p = relative_pitch_to_int('C1', p)
-                pitchnums.add(p)
-            ax.scatter(b, p, color=color, **scatter_kwds)
-
+        ps = _convert_semitones_str_yaxis(yaxis, [n.pitch for n in notes], track)
+        ax.scatter(beats, ps, color=color, **scatter_kwds)
+        for b, p, l in zip(beats, ps, lengths):
             ax.plot([b, b+l], [p, p], color=color, **plot_kwds)
 
         if yaxis == 'pitch':
+            pitchnums = set(ps[~np.isnan(ps)].astype(int).tolist())
             _format_pitch_yaxis(ax, pitchnums)
 
     elif yaxis == 'names':
@@ -304,8 +304,7 @@ def trackplot(track, yaxis='semitones', timesig=4, grid=True, ax=None,
 
 def draw_pianoroll(ax, lo, hi, notenames=True):
     '''Draw the pianoroll on Axes.'''
-    lo_num = relative_pitch_to_int('C1', lo) - 2
-    hi_num = relative_pitch_to_int('C1', hi) + 2
+    lo_num, hi_num = pitches_to_midi([lo, hi]) - _C1 + [-2, 2]
     num_notes = hi_num - lo_num
     if 14 < num_notes < 20:
         fontsize = 8
@@ -318,13 +317,13 @@ def draw_pianoroll(ax, lo, hi, notenames=True):
     ax.set_ylim(lo_num, hi_num+1)
 
     black = [1, 3, 6, 8, 10]
-    for i in range(lo_num, hi_num+1):
+    names = midi_to_pitches(np.arange(lo_num, hi_num+1) + _C1)
+    for i, note in zip(range(lo_num, hi_num+1), names.tolist()):
         facecolor = 'black' if i % 12 in black else 'white'
         rect = mpl.patches.Rectangle((0, i), width=1, height=1, facecolor=facecolor,
                                      edgecolor='black')
         ax.add_patch(rect)
         if notenames:
-            note = pitch_from_semitones('C1', i)
             textcolor = {'white':'black', 'black':'white'}[facecolor]
             ax.text(0.1, i + 0.5, note, color=textcolor, va='center', fontsize=fontsize)
 
@@ -372,24 +371,23 @@ def pianoroll(track, timesig=4, grid=True,):
     notes = []
     lengths = []
 
-    for beat, element in track.notedict.items():
+    for beat, element in track.noterange():
 
         clss = element.__class__.__name__
 
         if clss == "Note":
             beats.append(beat)
-            notes.append(_convert_semitones_str_yaxis('pitch', element, track))
+            notes.append(element.pitch)
             lengths.append(_actual_soundlength(track, element))
 
         else:
             for note in element.notes:
                 beats.append(beat)
-                notes.append(_convert_semitones_str_yaxis('pitch', note, track))
+                notes.append(note.pitch)
                 lengths.append(_actual_soundlength(track, element))
 
-    semitones = [relative_pitch_to_int('C1', n) for n in notes]
-    lo = notes[semitones.index(min(semitones))]
-    hi = notes[semitones.index(max(semitones))]
+    semitones = _convert_semitones_str_yaxis('pitch', notes, track).astype(int).tolist()
+    lo, hi = midi_to_pitches([min(semitones) + _C1, max(semitones) + _C1])
     draw_pianoroll(ax0, lo, hi)
     ax1.set_xlim(1, track.get_beats() + 1)
 
@@ -0,0 +1,307 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Profiling of renders.  Passing `profile=True` to `wubwub.sequencer.Sequencer.build()`
+or to the `build()` method of any Track returns a `RenderProfile` alongside
+the audio, which breaks down where the rendering time went:
+
+```python
+import wubwub as wb
+
+seq = wb.Sequencer(bpm=100, beats=8)
+...
+audio, profile = seq.build(profile=True)
+print(profile)
+profile.to_json('profile.json')
+```
+
+Nothing is recorded (and nearly no time is spent on profiling) unless a
+profiled build is running.
+"""
+
+__all__ = ['RenderProfile']
+
+from contextlib import contextmanager, nullcontext
+import heapq
+import itertools
+import json
+from time import perf_counter
+
+from wubwub.resources import MINUTE
+
+__pdoc__ = {'stage': False, 'note': False, 'count': False, 'cache': False,
+            'record_bytes': False, 'set_origin': False}
+
+# profile being recorded into; None when not profiling
+_active = None
+
+_NULL = nullcontext()
+
+class RenderProfile:
+    '''
+    Profile of one render, created by calling `build(profile=True)` on a
+    Sequencer or Track.  A Sequencer profile contains the profile of each
+    of its Tracks in `children`.
+
+    Attributes
+    ----------
+    name : str
+        Name of the Track (or `'Sequencer'`).
+    kind : str
+        Class name of the object rendered.
+    total : float
+        Wall time of the whole render (seconds).
+    stages : dict
+        Seconds spent in each stage of the render (e.g. `'pitch shift'`,
+        `'overlay'`, `'effects'`).
+    counts : dict
+        Event counts, e.g. `'notes'` rendered and `'resamples'` performed.
+    bytes : dict
+        Bytes of audio data produced by each stage.  pydub AudioSegments are
+        immutable, so each is a new allocation and copy.
+    caches : dict
+        `[hits, misses]` for each cache consulted during the render.
+    children : list of RenderProfile
+        Profiles of each Track of a Sequencer.
+
+    '''
+    def __init__(self, name, kind, mpb=None, keep=10):
+        self.name = name
+        self.kind = kind
+        self.mpb = mpb
+        self.total = 0.0
+        self.stages = {}
+        self.counts = {}
+        self.bytes = {}
+        self.caches = {}
+        self.children = []
+        self.origin = 0
+        self._keep = keep
+        self._slowest = []
+        self._tiebreak = itertools.count()
+
+    def __repr__(self):
+        return (f'RenderProfile(name="{self.name}", total={self.total:.4f}, '
+                f'children={len(self.children)})')
+
+    def __str__(self):
+        return self.table()
+
+    @classmethod
+    def for_track(cls, track):
+        '''Create an empty profile for rendering `track`.'''
+        return cls(track.name, type(track).__name__,
+                   mpb=(1 / track.get_bpm()) * MINUTE)
+
+    @contextmanager
+    def recording(self):
+        '''Make this the active profile, timing everything in the block.'''
+        global _active
+        from wubwub.pitch import parse_pitch
+        parent = _active
+        _active = self
+        pitch_cache = parse_pitch.cache_info()
+        start = perf_counter()
+        try:
+            yield self
+        finally:
+            self.total += perf_counter() - start
+            after = parse_pitch.cache_info()
+            hits = after.hits - pitch_cache.hits
+            misses = after.misses - pitch_cache.misses
+            if hits or misses:
+                self._cache('pitch parsing', hits, misses)
+            _active = parent
+            if parent is not None:
+                parent.children.append(self)
+
+    def _stage(self, name, seconds):
+        self.stages[name] = self.stages.get(name, 0.0) + seconds
+
+    def _count(self, name, n=1):
+        self.counts[name] = self.counts.get(name, 0) + n
+
+    def _bytes(self, name, n):
+        self.bytes[name] = self.bytes.get(name, 0) + n
+
+    def _cache(self, name, hits, misses):
+        entry = self.caches.setdefault(name, [0, 0])
+        entry[0] += hits
+        entry[1] += misses
+
+    def _note(self, seconds, position, pitch):
+        item = (seconds, next(self._tiebreak), self.origin + position, pitch)
+        if len(self._slowest) < self._keep:
+            heapq.heappush(self._slowest, item)
+        else:
+            heapq.heappushpop(self._slowest, item)
+
+    def slowest_notes(self):
+        '''
+        Return the slowest Notes to render, slowest first, as dicts with the
+        `track`, `beat`, `pitch`, and `seconds` of each (for a Sequencer,
+        across all of its Tracks).
+        '''
+        notes = [{'track': self.name,
+                  'beat': (pos / self.mpb + 1) if self.mpb else None,
+                  'pitch': pitch,
+                  'seconds': seconds}
+                 for seconds, _, pos, pitch in self._slowest]
+        for child in self.children:
+            notes.extend(child.slowest_notes())
+        notes.sort(key=lambda n: n['seconds'], reverse=True)
+        return notes[:self._keep]
+
+    def cache_hit_rates(self):
+        '''Return the hit rate (0 to 1, or None if unused) of each cache.'''
+        return {name: (hits / (hits + misses) if hits + misses else None)
+                for name, (hits, misses) in self.caches.items()}
+
+    def to_dict(self):
+        '''Return the profile as a (JSON serializable) dict.'''
+        return {'name': self.name,
+                'kind': self.kind,
+                'total': self.total,
+                'stages': dict(self.stages),
+                'counts': dict(self.counts),
+                'bytes': dict(self.bytes),
+                'caches': {k: {'hits': h, 'misses': m, 'rate': r}
+                           for (k, (h, m)), r in zip(self.caches.items(),
+                                                     self.cache_hit_rates().values())},
+                'slowest_notes': [dict(n, pitch=_jsonable(n['pitch']))
+                                  for n in self.slowest_notes()],
+                'children': [c.to_dict() for c in self.children]}
+
+    def to_json(self, path=None, **kwargs):
+        '''
+        Serialize the profile as JSON.
+
+        Parameters
+        ----------
+        path : str, optional
+            File to write to. The default is None.
+        **kwargs
+            Passed to `json.dumps()`; defaults to `indent=2`.
+
+        Returns
+        -------
+        str
+            The JSON string.
+
+        '''
+        kwargs.setdefault('indent', 2)
+        s = json.dumps(self.to_dict(), **kwargs)
+        if path is not None:
+            with open(path, 'w') as f:
+                f.write(s)
+        return s
+
+    def table(self):
+        '''Return a printable table summarizing the profile.'''
+        rows = self.children + [self] if self.children else [self]
+        stages = sorted({s for r in rows for s in r.stages})
+        header = (['name', 'kind', 'total', 'notes', 'resamples', 'MB']
+                  + stages + ['cache hits'])
+        lines = []
+        for r in rows:
+            hits = sum(h for h, _ in r.caches.values())
+            lookups = sum(h + m for h, m in r.caches.values())
+            lines.append([r.name,
+                          r.kind,
+                          f'{r.total:.3f}s',
+                          str(r._sum_counts('notes')),
+                          str(r._sum_counts('resamples')),
+                          f'{r._sum_bytes() / 1e6:.1f}']
+                         + [f'{r.stages[s]:.3f}s' if s in r.stages else ''
+                            for s in stages]
+                         + [f'{hits / lookups:.0%}' if lookups else ''])
+        widths = [max(len(row[i]) for row in [header] + lines)
+                  for i in range(len(header))]
+        fmt = lambda row: '  '.join(c.ljust(w) for c, w in zip(row, widths))
+        out = [fmt(header), fmt(['-' * w for w in widths])]
+        out += [fmt(row) for row in lines]
+
+        slowest = self.slowest_notes()
+        if slowest:
+            out += ['', 'slowest notes:']
+            for n in slowest:
+                beat = '' if n['beat'] is None else f"beat {n['beat']:g}"
+                out.append(f"  {n['seconds'] * 1000:8.2f}ms  {n['track']}  "
+                           f"{beat}  pitch {n['pitch']}")
+        return '\n'.join(out)
+
+    def _sum_counts(self, name):
+        return (self.counts.get(name, 0) +
+                sum(c._sum_counts(name) for c in self.children))
+
+    def _sum_bytes(self):
+        return (sum(self.bytes.values()) +
+                sum(c._sum_bytes() for c in self.children))
+
+def _jsonable(value):
+    if isinstance(value, (str, int, float)) or value is None:
+        return value
+    return str(value)
+
+class _Stage:
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile._stage(self.name, perf_counter() - self.start)
+
+def stage(name):
+    '''Context manager timing a stage of the active profile (if any).'''
+    if _active is None:
+        return _NULL
+    return _Stage(_active, name)
+
+class _Note:
+    __slots__ = ('profile', 'position', 'pitch', 'start')
+
+    def __init__(self, profile, position, pitch):
+        self.profile = profile
+        self.position = position
+        self.pitch = pitch
+
+    def __enter__(self):
+        self.start = perf_counter()
+
+    def __exit__(self, *exc):
+        self.profile._count('notes')
+        self.profile._note(perf_counter() - self.start, self.position,
+                           self.pitch)
+
+def note(position, pitch):
+    '''Context manager timing the rendering of one Note (at `position`
+    milliseconds) in the active profile (if any).'''
+    if _active is None:
+        return _NULL
+    return _Note(_active, position, pitch)
+
+def count(name, n=1):
+    '''Count an event in the active profile (if any).'''
+    if _active is not None:
+        _active._count(name, n)
+
+def cache(name, hit):
+    '''Record a cache hit or miss in the active profile (if any).'''
+    if _active is not None:
+        _active._cache(name, int(hit), int(not hit))
+
+def record_bytes(name, n):
+    '''Record bytes of audio produced in the active profile (if any).'''
+    if _active is not None:
+        _active._bytes(name, n)
+
+def set_origin(position):
+    '''Set the position (milliseconds) that note positions recorded in the
+    active profile are relative to.'''
+    if _active is not None:
+        _active.origin = position
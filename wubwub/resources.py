@@ -4,11 +4,27 @@
 General functions/constants used by wubwub.
 """
 
+from fractions import Fraction
+import math
 import random
 
+import numpy as np
+
 SECOND = 1000
 MINUTE = 60 * SECOND
 
+def fraction_range(start, stop, step):
+    '''Return a list of floats from `start` (inclusive) to `stop` (exclusive)
+    every `step`.  Values are computed exactly with fractions (limited to a
+    reasonable denominator) and then converted, so they do not accumulate
+    floating point error.'''
+    step = Fraction(step).limit_denominator()
+    start = Fraction(start).limit_denominator()
+    n = max(0, math.ceil((Fraction(stop) - start) / step))
+    numerators = (start.numerator * step.denominator +
+                  np.arange(n) * (step.numerator * start.denominator))
+    return (numerators / (start.denominator * step.denominator)).tolist()
+
 def random_choice_generator(x):
     '''Generate repeated random choices from `x`.'''
     while True:
@@ -5,14 +5,21 @@ This module contains the Sequencer class, and associated functions for
 working with Sequencers in wubwub.
 """
 
+from collections import deque
+from contextlib import nullcontext
 import os
 import time
+import wave
 
-import pydub
-
-from wubwub.audio import add_effects, play, _overhang_to_milli
+from wubwub.audio import (add_effects, play, sample_hash, BLOCK_FRAMES,
+                          _new_audio, _overhang_to_milli, _overlaid_bytes,
+                          _pan)
 from wubwub.errors import WubWubError
+from wubwub.estimate import estimate_sequencer, estimate_stitch, _choose_mode
+from wubwub.graph import RenderGraph
 from wubwub.plots import sequencerplot
+from wubwub import hooks, metrics, profiling
+from wubwub.profiling import RenderProfile
 from wubwub.resources import MINUTE, unique_name
 from wubwub.seqstring import seqstring
 from wubwub.tracks import Sampler, Arpeggiator, MultiSampler
@@ -30,12 +37,42 @@ class Sequencer:
     after creation by setting the value of the <code>bpm</code> or
     <code>beats</code> attributes.
 
+    Large renders can be limited by setting the <code>memory_budget</code>
+    attribute (in bytes): builds estimated to exceed it (see
+    `Sequencer.estimate()`) are streamed instead, or refused if
+    <code>over_budget</code> is set to <code>'error'</code>.
+
+    Setting the <code>optimize</code> attribute to True renders through a
+    `wubwub.graph.RenderGraph`, which removes redundant work (see
+    `Sequencer.render_graph()`).  Optimized renders round (and, where they
+    saturate, clip) differently, so they are not bit for bit identical.
+
+    When a render store is enabled (see `wubwub.store`), builds and exports
+    of a Sequencer which has been rendered before are read from the store.
+
+    Audio is rendered in one format, the <code>render_format</code>.  The
+    samples of each Track are converted to it when they are added, so
+    mixing Notes never converts audio; the samples of Samplers and
+    Arpeggiators keep their frame rate, as pitch shifting a Note resamples
+    it to the render frame rate.  Mono samples stay mono, and Tracks
+    are rendered with as many channels as their samples: they only become
+    stereo when panned (or when mixed).  Use `Sequencer.set_render_format()`
+    to change the format.
+
     Parameters
     ----------
     bpm : int or float
         Tempo of the sequencer (beats per minute).
     beats : int
         The length of the sequence, in beats.
+    frame_rate : int, optional
+        Frame rate of the rendered audio. The default is 44100.
+    channels : int, optional
+        Number of channels of the rendered audio. The default is 2.
+        Audio rendered in mono is not panned.
+    sample_width : int, optional
+        Sample width (in bytes) of the rendered audio. The default is 2
+        (16-bit).
 
     Examples
     --------
@@ -50,7 +87,8 @@ class Sequencer:
     ```
     '''
 
-    def __init__(self, bpm, beats):
+    def __init__(self, bpm, beats, frame_rate=44100, channels=2,
+                 sample_width=2):
         """Initialization function for the Sequencer.  Sets the BPM and beats
         based on user input, also defaults attributes related to post-processing
         the output audio and creates a container for subsidiary tracks."""
@@ -58,11 +96,20 @@ class Sequencer:
         self.bpm = bpm
         self.beats = beats
 
+        self._render_format = _check_format(frame_rate, channels, sample_width)
+
         self.effects = None
         self.volume = 0
         self.pan = 0
         self.postprocess_steps = ['effects', 'volume', 'pan']
 
+        self.cancel_token = None
+        self._hooks = []
+
+        self.memory_budget = None
+        self.over_budget = 'stream'
+        self.optimize = False
+
         self._tracks = []
 
     def __repr__(self):
@@ -70,6 +117,55 @@ class Sequencer:
         l = len(self.tracks())
         return f"Sequencer(bpm={self.bpm}, beats={self.beats}, tracks={l})"
 
+    def __getstate__(self):
+        """Pickle without the hooks and cancel token, which only apply to
+        renders in the current process."""
+        state = self.__dict__.copy()
+        state['cancel_token'] = None
+        state['_hooks'] = []
+        return state
+
+    def __setstate__(self, state):
+        """Unpickle, giving attributes added since the Sequencer was pickled
+        their default values."""
+        self.__init__(state['bpm'], state['beats'])
+        self.__dict__.update(state)
+
+    @property
+    def render_format(self):
+        """The frame rate, number of channels, and sample width (in bytes)
+        of the rendered audio; see `Sequencer.set_render_format()`."""
+        return self._render_format
+
+    def set_render_format(self, frame_rate=None, channels=None,
+                          sample_width=None):
+        '''
+        Change the format of the rendered audio, converting the samples of
+        every Track to it.  Note that converting samples to a lower frame
+        rate, fewer channels, or a smaller sample width loses information,
+        which is not restored by changing the format back.
+
+        Parameters
+        ----------
+        frame_rate : int, optional
+            New frame rate. The default is None (unchanged).
+        channels : int, optional
+            New number of channels. The default is None (unchanged).
+        sample_width : int, optional
+            New sample width (in bytes). The default is None (unchanged).
+
+        Returns
+        -------
+        None.
+
+        '''
+        fmt = [frame_rate, channels, sample_width]
+        fmt = [old if new is None else new
+               for old, new in zip(self._render_format, fmt)]
+        self._render_format = _check_format(*fmt)
+        for track in self.tracks():
+            track._conform_samples()
+
     def __getitem__(self, name):
         """Allows for retrieval of Track objects by their string name."""
         if not isinstance(name, str):
@@ -220,7 +316,7 @@ class Sequencer:
         return new
 
     def add_arpeggiator(self, sample, name=None, freq=0.5, method='up',
-                        basepitch='C4'):
+                        basepitch='C4', seed=None):
         '''
         Create a new `wubwub.tracks.Arpeggiator` Track and add to the Sequencer.
         Parameters here are initialization values for `wubwub.tracks.Arpeggiator`;
@@ -238,6 +334,9 @@ class Sequencer:
             Set the pattern of the new arpeggiator. The default is 'up'.
         basepitch : int or str, optional
             Set the base pitch for the new Sampler. The default is 'C4'.
+        seed : int, optional
+            Seed for the `'random'` arpeggiation method. The default is None,
+            in which case random arpeggiations differ for every build.
 
         Returns
         -------
@@ -259,7 +358,7 @@ class Sequencer:
         if name is None:
             name = unique_name('Track', self.tracknames())
         new = Arpeggiator(name=name, sample=sample, freq=freq,
-                          method=method, basepitch=basepitch,
+                          method=method, basepitch=basepitch, seed=seed,
                           sequencer=self)
         return new
 
@@ -317,7 +416,8 @@ class Sequencer:
     def duplicate_track(self, track, newname=None, with_notes=True):
         '''
         Create a copy of the specified Track within and add it to the
-        current Sequencer.
+        current Sequencer.  The notes and sample(s) are shared with the
+        original Track until either of them is modified.
 
         Parameters
         ----------
@@ -371,6 +471,10 @@ class Sequencer:
         Tracks) are *new objects*, so editing it will not affect this Sequencer
         (and vice versa).
 
+        Copying is cheap: the copied Tracks share their notes and samples
+        with the originals, and a Track only makes its own copy of the notes
+        the first time either side modifies them.
+
 
         Parameters
         ----------
@@ -407,6 +511,7 @@ class Sequencer:
 
         '''
         new = Sequencer(beats=self.beats, bpm=self.bpm)
+        new._render_format = self._render_format
         for track in self.tracks():
             track.copy(with_notes=with_notes, newseq=new)
         return new
@@ -502,7 +607,124 @@ class Sequencer:
         t.sequencer = None
         self._tracks.remove(t)
 
-    def build(self, overhang=0, overhang_type='beats'):
+    def add_hook(self, hook):
+        '''
+        Add a callback for instrumenting renders of this Sequencer.  The
+        hook is called with a `wubwub.hooks.RenderEvent` at the beginning
+        and end of each stage of `build()` (and `export()`): the whole
+        build, each Track, each batch of Notes, postprocessing, and
+        effects.  See `wubwub.hooks`.
+
+        Parameters
+        ----------
+        hook : callable
+            Function taking a `wubwub.hooks.RenderEvent`.  Raising an error
+            (such as `wubwub.errors.RenderCancelled`) stops the render.
+
+        Returns
+        -------
+        None.
+
+        Examples
+        --------
+        ```python
+        >>> import wubwub as wb
+
+        >>> seq = wb.Sequencer(bpm=120, beats=8)
+        >>> trace = wb.ChromeTrace()
+        >>> seq.add_hook(trace)
+        >>> audio = seq.build()
+        >>> trace.to_json('render.json')
+        ```
+
+        '''
+        if not callable(hook):
+            raise WubWubError('hook must be callable')
+        self._hooks.append(hook)
+
+    def remove_hook(self, hook):
+        '''Remove a callback added with `add_hook()`.'''
+        try:
+            self._hooks.remove(hook)
+        except ValueError:
+            raise WubWubError(f'{hook} is not a hook of this Sequencer')
+
+    def estimate(self, overhang=0, overhang_type='beats', mode='segment'):
+        '''
+        Predict the cost of `build()` without rendering anything: the
+        duration and size of the output, the peak memory used while
+        rendering, the number of Notes and resamples, and the approximate
+        CPU time.  See `wubwub.estimate`.
+
+        Parameters
+        ----------
+        overhang : int or number, optional
+            How much extra time to render beyond the length
+            (i.e., the `beats`) of the Sequencer. The default is 0.
+        overhang_type : str -> "beats" or "seconds", optional
+            Unit for the overhang. The default is 'beats'.
+        mode : str -> "segment" or "stream", optional
+            Render mode to estimate (see `build()`). The default is 'segment'.
+
+        Returns
+        -------
+        wubwub.estimate.RenderEstimate
+            The estimate, with the estimate for each Track in `tracks`.
+
+        Examples
+        --------
+        ```python
+        >>> import wubwub as wb
+
+        >>> seq = wb.Sequencer(beats=4, bpm=60)
+        >>> est = seq.estimate()
+        >>> est.duration
+        4000.0
+
+        # the largest render allowed (in bytes)
+        >>> seq.memory_budget = 500e6
+        ```
+
+        '''
+        return estimate_sequencer(self, overhang, overhang_type, mode)
+
+    def render_graph(self, overhang=0, overhang_type='beats'):
+        '''
+        Compile the Sequencer to a `wubwub.graph.RenderGraph`, which
+        renders each distinct pitched sample and Note voice once, and mixes
+        Tracks with the same (linear) postprocessing together.  Builds use
+        the graph when the `optimize` attribute is True.
+
+        Parameters
+        ----------
+        overhang : int or number, optional
+            How much extra time to render beyond the length
+            (i.e., the `beats`) of the Sequencer. The default is 0.
+        overhang_type : str -> "beats" or "seconds", optional
+            Unit for the overhang. The default is 'beats'.
+
+        Returns
+        -------
+        wubwub.graph.RenderGraph
+            The graph.  Its `report()` method compares its work with that
+            of an ordinary build, without rendering.
+
+        Examples
+        --------
+        ```python
+        >>> import wubwub as wb
+
+        >>> seq = wb.Sequencer(beats=4, bpm=60)
+        >>> graph = seq.render_graph()
+        >>> graph.report().voices
+        0
+        ```
+
+        '''
+        return RenderGraph(self, overhang, overhang_type)
+
+    def build(self, overhang=0, overhang_type='beats', profile=False,
+              mode=None):
         '''
         Render all the contained Tracks into one output, namely a pydub
         AudioSegment.  Calls the "build" method of each Track, and overlays
@@ -519,11 +741,34 @@ class Sequencer:
             Sequencer.
         overhang_type : str -> "beats" or "seconds", optional
             Unit for the overhang. The default is 'beats'.
+        profile : bool, optional
+            Record where the rendering time is spent. The default is False.
+            When True, a `wubwub.profiling.RenderProfile` (with the profile
+            of each Track as its `children`) is also returned.
+        mode : str -> "segment" or "stream", optional
+            How to render. In the `'segment'` mode, Tracks are rendered
+            onto pydub AudioSegments, which are copied for every Note added.
+            The `'stream'` mode mixes audio in place and postprocesses it a
+            block at a time, producing the same audio with a far lower peak
+            memory. The default is None, which uses the segment mode unless
+            the estimated peak memory (see `Sequencer.estimate()`) exceeds
+            the `memory_budget` of the Sequencer; then the stream mode is
+            used, or an error raised if `over_budget` is `'error'`.
 
         Returns
         -------
         pydub.AudioSegment
             The rendered audio.
+        wubwub.profiling.RenderProfile
+            Only returned when `profile` is True.
+
+        Raises
+        ------
+        wubwub.errors.RenderCancelled
+            When the `cancel_token` of the Sequencer (a
+            `wubwub.hooks.CancelToken`) is cancelled during the build.
+        wubwub.errors.MemoryBudgetError
+            When the render is estimated to exceed the `memory_budget`.
 
         Examples
         --------
@@ -548,13 +793,83 @@ class Sequencer:
         ```
 
         '''
+        store, key = (None, None) if profile else _store_lookup(self, overhang,
+                                                                overhang_type)
+        if key is not None:
+            audio = store.get(key)
+            if audio is None:
+                audio = self._timed_build(overhang, overhang_type, mode=mode)
+                store.put(key, audio)
+            return audio
+        return self._timed_build(overhang, overhang_type, profile, mode)
+
+    def _timed_build(self, overhang, overhang_type, profile=False, mode=None):
+        '''Render (as `build()`, without the render store).'''
         b = (1/self.bpm) * MINUTE
+        stream = self._render_mode(mode, overhang, overhang_type) == 'stream'
+        start = time.perf_counter()
+        if profile:
+            prof = RenderProfile('Sequencer', 'Sequencer', mpb=b)
+            with prof.recording():
+                audio = self._build(overhang, overhang_type, b, profile,
+                                    stream)
+            out = audio, prof
+        else:
+            out = self._build(overhang, overhang_type, b, stream=stream)
+        metrics.SEQUENCER_BUILD_SECONDS.observe(time.perf_counter() - start)
+        return out
+
+    def _build(self, overhang, overhang_type, b, profile=False, stream=False):
+        with hooks.span(self, 'sequencer', None, 1, self.beats + 1):
+            audio = self._render(overhang, overhang_type, b, profile, stream)
+            hooks.check(self)
+            if stream:
+                return self._postprocess_stream(audio)
+            return self.postprocess(audio)
+
+    def _render(self, overhang, overhang_type, b, profile=False,
+                stream=False):
+        '''Build and mix all the Tracks, without postprocessing the mix.'''
+        if self.optimize:
+            return RenderGraph(self, overhang, overhang_type).render(stream)
         seq_oh = _overhang_to_milli(overhang, overhang_type, b)
         tracklength = self.beats * b + seq_oh
-        audio = pydub.AudioSegment.silent(duration=tracklength)
+        audio = _new_audio(tracklength, stream, self._render_format)
         for track in self.tracks():
-            audio = audio.overlay(track.build(overhang, overhang_type))
-        return self.postprocess(audio)
+            hooks.check(self)
+            start = time.perf_counter()
+            if stream:
+                track._build_onto(audio, overhang, overhang_type, profile)
+            else:
+                # profiled Track builds are added to the Sequencer profile
+                build = track.build(overhang, overhang_type, profile=profile)
+                if profile:
+                    build, _ = build
+                with profiling.stage('mix'):
+                    audio = audio.overlay(build)
+                metrics.OVERLAY_BYTES.inc(_overlaid_bytes(audio))
+            metrics.TRACK_BUILD_SECONDS.observe(time.perf_counter() - start,
+                                                kind=type(track).__name__)
+        return audio
+
+    def _render_mode(self, mode, overhang, overhang_type):
+        '''Resolve the render `mode` of `build()`, checking the estimated
+        peak memory against the `memory_budget`.'''
+        return _choose_mode(mode, self.memory_budget, self.over_budget,
+                            lambda m: self.estimate(overhang, overhang_type, m))
+
+    def _pointwise_postprocess(self):
+        '''Whether postprocessing treats each frame independently (so it
+        can be applied to a block of audio at a time).'''
+        return self.effects is None or 'effects' not in self.postprocess_steps
+
+    def _postprocess_stream(self, audio):
+        '''Postprocess a `wubwub.audio._MixBuffer`, a block at a time when
+        possible, and return a pydub AudioSegment.'''
+        with hooks.span(self, 'postprocess'):
+            if not self._pointwise_postprocess() or not audio.frames:
+                return self._postprocess_steps(audio.to_segment())
+            return audio.transform(self._postprocess_steps, BLOCK_FRAMES)
 
     def postprocess(self, build):
         '''
@@ -594,13 +909,19 @@ class Sequencer:
             Audio with postprocessing steps applied.
 
         '''
+        with hooks.span(self, 'postprocess'):
+            return self._postprocess_steps(build)
+
+    def _postprocess_steps(self, build):
         for step in self.postprocess_steps:
-            if step == 'effects':
-                build = add_effects(build, self.effects)
-            if step == 'volume':
-                build += self.volume
-            if step == 'pan':
-                build = build.pan(self.pan)
+            with profiling.stage(step):
+                if step == 'effects':
+                    with hooks.span(self, 'effects'):
+                        build = add_effects(build, self.effects)
+                if step == 'volume':
+                    build += self.volume
+                if step == 'pan':
+                    build = _pan(build, self.pan, self._render_format[1])
         return build
 
     def play(self, start=1, end=None, overhang=0, overhang_type='beats'):
@@ -635,7 +956,8 @@ class Sequencer:
         build = self.build(overhang, overhang_type)
         play(build[start:end])
 
-    def loop(self, times=4, internal_overhang=0, end_overhang=0, overhang_type='beats'):
+    def loop(self, times=4, internal_overhang=0, end_overhang=0, overhang_type='beats',
+             mode=None):
         '''
         Return a looped rendering of the Sequencer.  This is akin to
         `Sequencer.build()`, but the content of the Sequencer is repeated
@@ -655,6 +977,10 @@ class Sequencer:
             i.e. after all loops are complete. The default is 0.
         overhang_type : str -> 'beats' or 'seconds', optional
             Units for the overhang. The default is 'beats'.
+        mode : str -> "segment" or "stream", optional
+            Render mode; see `Sequencer.build()`. The `memory_budget` and
+            `over_budget` of this Sequencer apply to the whole loop.
+            The default is None.
 
         Returns
         -------
@@ -663,7 +989,9 @@ class Sequencer:
 
         '''
         looped = loop(self, times=times, internal_overhang=internal_overhang,
-                      end_overhang=end_overhang, overhang_type=overhang_type)
+                      end_overhang=end_overhang, overhang_type=overhang_type,
+                      mode=mode, memory_budget=self.memory_budget,
+                      over_budget=self.over_budget)
         return looped
 
     def loopplay(self, times=4, internal_overhang=0, end_overhang=0, overhang_type='beats'):
@@ -687,7 +1015,8 @@ class Sequencer:
             track.soundtest(postprocess=postprocess)
             time.sleep(gap)
 
-    def export(self, path, overhang=0, overhang_type='beats', fmt=None):
+    def export(self, path, overhang=0, overhang_type='beats', fmt=None,
+               mode=None):
         '''
         Saves the rendered audio to a file.  The Sequencer creates
         a pydub AudioSegment which contains all Tracks overlaid,
@@ -708,6 +1037,13 @@ class Sequencer:
             Sequencer.
         overhang_type : str -> "beats" or "seconds", optional
             Unit for the overhang. The default is 'beats'.
+        fmt : str, optional
+            Audio format to export. The default is None, in which case it
+            is inferred from the extension of `path`.
+        mode : str -> "segment" or "stream", optional
+            Render mode; see `Sequencer.build()`. When streaming to a WAV
+            file, each block of audio is written as it is postprocessed.
+            The default is None.
 
         Returns
         -------
@@ -717,9 +1053,92 @@ class Sequencer:
         if fmt is None:
             _, fmt = os.path.splitext(path)
             fmt = fmt.lstrip('.')
-        build = self.build(overhang, overhang_type)
+        start = time.perf_counter()
+        with hooks.span(self, 'export', None, 1, self.beats + 1):
+            store, key = _store_lookup(self, overhang, overhang_type)
+            if key is None or not store._export(key, path, fmt):
+                self._export_new(path, overhang, overhang_type, fmt, mode,
+                                 store, key)
+        metrics.EXPORT_SECONDS.observe(time.perf_counter() - start, format=fmt)
+
+    def _export_new(self, path, overhang, overhang_type, fmt, mode,
+                    store=None, key=None):
+        '''Render and export, adding the render to the render `store` (when
+        given) under `key`.'''
+        mode = self._render_mode(mode, overhang, overhang_type)
+        if mode == 'stream' and fmt == 'wav':
+            self._export_wav_stream(path, overhang, overhang_type, store, key)
+            return
+        build = self._timed_build(overhang, overhang_type, mode=mode)
+        if key is not None:
+            store.put(key, build)
         build.export(path, format=fmt)
 
+    def _export_wav_stream(self, path, overhang, overhang_type, store=None,
+                           key=None):
+        '''Render in the streaming mode, writing each postprocessed block
+        to a WAV file (as pydub would write the whole build), and to the
+        render `store` when given.'''
+        b = (1/self.bpm) * MINUTE
+        start = time.perf_counter()
+        with hooks.span(self, 'sequencer', None, 1, self.beats + 1):
+            audio = self._render(overhang, overhang_type, b, stream=True)
+            hooks.check(self)
+            if not self._pointwise_postprocess() or not audio.frames:
+                build = self.postprocess(audio.to_segment())
+                if key is not None:
+                    store.put(key, build)
+                build.export(path, format='wav')
+                return
+            entry = store._writer(key) if key is not None else nullcontext()
+            with hooks.span(self, 'postprocess'), wave.open(path, 'wb') as f, \
+                    entry as entry:
+                for i, (_, block) in enumerate(audio.blocks(BLOCK_FRAMES)):
+                    block = self._postprocess_steps(block)
+                    if i == 0:
+                        f.setnchannels(block.channels)
+                        f.setsampwidth(block.sample_width)
+                        f.setframerate(block.frame_rate)
+                        f.setnframes(audio.frames)
+                    f.writeframesraw(block.raw_data)
+                    if entry is not None:
+                        entry.write(block)
+        metrics.SEQUENCER_BUILD_SECONDS.observe(time.perf_counter() - start)
+
+    def save(self, path, embed_samples=True):
+        '''
+        Save the Sequencer (with its Tracks, Notes, and samples) to a file,
+        which can be loaded with `wubwub.serialize.load_project()`.  See
+        `wubwub.serialize` for the format.
+
+        Parameters
+        ----------
+        path : str
+            File to write.
+        embed_samples : bool, optional
+            Store the audio of every sample in the file. The default is True.
+            When False, samples loaded from a file path are only stored as a
+            reference to the path.
+
+        Returns
+        -------
+        None.
+
+        Examples
+        --------
+        ```python
+        >>> import wubwub as wb
+
+        >>> seq = wb.Sequencer(bpm=120, beats=8)
+        >>> seq.save('song.wub')
+        >>> wb.load_project('song.wub')
+        Sequencer(bpm=120, beats=8, tracks=0)
+        ```
+
+        '''
+        from wubwub.serialize import save_project
+        save_project(self, path, embed_samples)
+
     def show(self, printout=True, name_cutoff=None, resolution=1,
              singlenote='■', multinote='■', empty='□', wrap=32):
         '''
@@ -797,7 +1216,18 @@ class Sequencer:
                              plot_kwds=plot_kwds)
 
 
-def stitch(sequencers, internal_overhang=0, end_overhang=0, overhang_type='beats'):
+def _check_format(frame_rate, channels, sample_width):
+    '''Validate a render format, returning it as a tuple.'''
+    if channels not in (1, 2):
+        raise WubWubError('channels must be 1 or 2')
+    if sample_width not in (1, 2, 4):
+        raise WubWubError('sample_width must be 1, 2, or 4 (bytes)')
+    if frame_rate <= 0:
+        raise WubWubError('frame_rate must be positive')
+    return (int(frame_rate), channels, sample_width)
+
+def stitch(sequencers, internal_overhang=0, end_overhang=0, overhang_type='beats',
+           mode=None, memory_budget=None, over_budget='stream'):
     """
     Take a list of Sequencers, and concatenate the audio produced by each one.
     A pydub `AudioSegment` is returned, which is the concatenation of
@@ -817,11 +1247,24 @@ def stitch(sequencers, internal_overhang=0, end_overhang=0, overhang_type='beats
         i.e. after all loops are complete. The default is 0.
     overhang_type : str -> 'beats' or 'seconds', optional
         Units for the overhang. The default is 'beats'.
+    mode : str -> "segment" or "stream", optional
+        Render mode, for the stitching and for building each Sequencer;
+        see `Sequencer.build()`. The default is None, which streams only if
+        needed to stay within the `memory_budget`.
+    memory_budget : int, optional
+        Peak memory (bytes) allowed for the render, as predicted by
+        `wubwub.estimate.estimate_stitch()`. The default is None (no limit).
+    over_budget : str -> "stream" or "error", optional
+        What to do when the segment mode would exceed the `memory_budget`:
+        stream, or raise a `wubwub.errors.MemoryBudgetError`.
+        The default is 'stream'.
 
     Returns
     -------
     stitched : pydub.AudioSegment
-        AudioSegment of the stitched audio.
+        AudioSegment of the stitched audio.  When a render store is enabled
+        (see `wubwub.store`), it is read from (or added to) the store, as
+        are the builds of each Sequencer.
 
     Examples
     --------
@@ -843,6 +1286,13 @@ def stitch(sequencers, internal_overhang=0, end_overhang=0, overhang_type='beats
     ```
 
     """
+    store, key = _stitch_store_lookup(sequencers, internal_overhang,
+                                      end_overhang, overhang_type)
+    if key is not None:
+        stitched = store.get(key)
+        if stitched is not None:
+            return stitched
+
     total_length = 0
     current = 0
     sectionstarts = []
@@ -854,29 +1304,59 @@ def stitch(sequencers, internal_overhang=0, end_overhang=0, overhang_type='beats
         current += seq_length
     total_length += _overhang_to_milli(end_overhang, overhang_type, b)
 
-    stitched = pydub.AudioSegment.silent(duration=total_length)
+    estimate = lambda m: estimate_stitch(sequencers, internal_overhang,
+                                         end_overhang, overhang_type, m)
+    requested = mode
+    mode = _choose_mode(mode, memory_budget, over_budget, estimate)
+    # unless streaming, each Sequencer applies its own memory budget
+    build_mode = mode if mode == 'stream' else requested
+
+    # in the format every build is converted to when mixed
+    formats = [seq.render_format for seq in sequencers]
+    fmt = tuple(map(max, zip(*formats))) if formats else None
+    stitched = _new_audio(total_length, mode == 'stream', fmt)
     for start, seq in zip(sectionstarts, sequencers):
-        build = seq.build(internal_overhang, overhang_type)
+        build = seq.build(internal_overhang, overhang_type, mode=build_mode)
         stitched = stitched.overlay(build, start)
 
+    if mode == 'stream':
+        stitched = stitched.to_segment()
+    if key is not None:
+        store.put(key, stitched)
     return stitched
 
-def _matchesforjoin(oldtracks, newtrack, on='name'):
-    '''Helper method for joining two Sequencers.  Given a list of tracks
-    (from one Sequencer) and a test track (from a different Sequencer), tries
-    to return a matching track.'''
-    ons = ['name', 'sample', 'sample+type']
-    if on not in ons:
-        raise WubWubError(f'`on` must be selected from {ons}')
-
-    if on == 'name':
-        return [track for track in oldtracks if track.name == newtrack.name]
-    if on == 'sample':
-        return [track for track in oldtracks if track.sample == newtrack.sample]
-    if on == 'sample+type':
-        return [track for track in oldtracks if track.sample == newtrack.sample
-                and type(track) == type(newtrack)]
-    return []
+def _store_lookup(sequencer, overhang, overhang_type):
+    '''The enabled render store and the key of a build (see
+    `wubwub.store`); Nones if there is no store.'''
+    # imported here, as wubwub.store imports this module
+    from wubwub.store import _lookup
+    return _lookup(sequencer, overhang, overhang_type)
+
+def _stitch_store_lookup(sequencers, internal_overhang, end_overhang,
+                         overhang_type):
+    '''As `_store_lookup()`, for `stitch()`.'''
+    from wubwub.store import _stitch_lookup
+    return _stitch_lookup(sequencers, internal_overhang, end_overhang,
+                          overhang_type)
+
+def _sample_key(track):
+    # Tracks without a sample (e.g. MultiSamplers) only match themselves
+    sample = getattr(track, 'sample', None)
+    return id(track) if sample is None else sample_hash(sample)
+
+# keys for matching Tracks in `join()`
+_JOIN_KEYS = {'name': lambda track: track.name,
+              'sample': _sample_key,
+              'sample+type': lambda track: (_sample_key(track), type(track))}
+
+def _joinindex(tracks, key):
+    '''Helper method for joining Sequencers.  Index a list of tracks (from
+    one Sequencer) by `key`, the function used to match them with the
+    tracks of another Sequencer; each key maps to its tracks, in order.'''
+    index = {}
+    for track in tracks:
+        index.setdefault(key(track), deque()).append(track)
+    return index
 
 def join(sequencers, on='name'):
     '''
@@ -894,9 +1374,10 @@ def join(sequencers, on='name'):
     on : str, "name", "sample", or "sample+type", optional
         Method to use for matching Tracks between adjacent Sequencers.
         If 'name' (default), match based on the Track name.  If 'sample',
-        match based on equivalence of the `sample` attribute. If `sample+type`,
-        match based on the sample, but also on the Track being of the same
-        class.
+        match based on equivalence of the `sample` attribute (compared by
+        `wubwub.audio.sample_hash()`). If `sample+type`, match based on the
+        sample, but also on the Track being of the same class.  Tracks
+        without a `sample` (i.e. MultiSamplers) are not matched by sample.
 
     Returns
     -------
@@ -904,36 +1385,46 @@ def join(sequencers, on='name'):
         The joined Sequencers.
 
     '''
+    if on not in _JOIN_KEYS:
+        raise WubWubError(f'`on` must be selected from {list(_JOIN_KEYS)}')
+    key = _JOIN_KEYS[on]
+
     beats = sum(seq.beats for seq in sequencers)
     out = Sequencer(bpm=sequencers[0].bpm, beats=beats)
+    out._render_format = sequencers[0].render_format
+    # notes for each new Track, added in one pass at the end
+    pending = {}
     offset = 0
     for i, seq in enumerate(sequencers):
-        oldtracks = out.tracks()
-        available = list(oldtracks)
+        available = _joinindex(out.tracks(), key)
 
         for track in seq.tracks():
-            match = None
-            matches = _matchesforjoin(available, track, on=on)
+            matches = available.get(key(track))
             if matches:
-                match = matches[0]
-                available.remove(match)
-
-            if match:
-                match.add_fromdict(track.notedict, offset=offset)
-
+                target = matches.popleft()
             else:
-                new = track.copy(with_notes=False, newseq=out)
-                new.add_fromdict(track.notedict, offset=offset)
-
+                target = track.copy(with_notes=False, newseq=out)
+                pending[id(target)] = (target, [], [])
+            _, newbeats, elements = pending[id(target)]
+            for beat, element in track.slice[:].items():
+                newbeats.append(beat + offset)
+                elements.append(element)
 
         offset = seq.beats
+
+    for target, newbeats, elements in pending.values():
+        target.add_many(newbeats, elements)
     return out
 
-def loop(sequencer, times=4, internal_overhang=0, end_overhang=0, overhang_type='beats'):
+def loop(sequencer, times=4, internal_overhang=0, end_overhang=0, overhang_type='beats',
+         mode=None, memory_budget=None, over_budget='stream'):
     '''Calls `stitch()` on one Sequencer multiple times, to create a looped
     AudioSegment.'''
 
     return stitch([sequencer] * times,
                   internal_overhang,
                   end_overhang,
-                  overhang_type)
+                  overhang_type,
+                  mode=mode,
+                  memory_budget=memory_budget,
+                  over_budget=over_budget)
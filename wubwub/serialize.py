@@ -0,0 +1,392 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Saving and loading Sequencers (and their Tracks, Notes, and samples) in a
+compact binary format:
+
+```python
+import wubwub as wb
+
+seq = wb.Sequencer(bpm=100, beats=8)
+...
+seq.save('song.wub')
+seq = wb.load_project('song.wub')
+```
+
+A file holds a small JSON description of the Sequencer and its Tracks,
+followed by binary blocks: one column (NumPy array) per Note attribute for
+each Track, and the audio of each sample.  Samples are identified by a hash
+of their content (plus the path they were loaded from, when known), and each
+distinct sample is stored once however many Tracks use it.  With
+`embed_samples=False`, samples loaded from a path are only referenced, and
+are read from that path (and checked against the hash) when loading.
+
+Effects are saved as the list of Sox arguments of their pysndfx
+AudioEffectsChain (its `command`), and rebuilt from it when loading; no
+Python objects are pickled, so loading a file never runs code from it.
+Effects of other types cannot be saved.
+
+Files are memory mapped when loaded.  The Note columns and samples are copied
+out of the mapping (the columns straight into the Note tables of the Tracks),
+so a loaded Sequencer does not keep its file open.  Files written by newer
+versions of the format than this version of wubwub supports are refused.
+"""
+
+__all__ = ['save_project', 'load_project', 'project_to_bytes',
+           'project_from_bytes']
+
+import io
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+import pydub
+from sortedcontainers import SortedDict
+
+from wubwub._version import v as _VERSION
+from wubwub.audio import conform, sample_hash
+from wubwub.errors import UnkeyableError, WubWubError
+from wubwub.notetable import NOTE_DTYPE, NoteTable
+from wubwub.sequencer import Sequencer
+from wubwub.tracks import Arpeggiator, MultiSampler, Sampler
+
+MAGIC = b'WUBWUB\x00\x1a'
+FORMAT_VERSION = 1
+
+# 8 byte magic, then the format version and the length of the JSON header
+_PREAMBLE = struct.Struct('<IQ')
+_ALIGN = 64
+
+_COLUMNS = {'beat': '<f8', 'pitch': '<f8', 'length': '<f8', 'volume': '<f8',
+            'group': '<i8', 'chordlength': '<f8', 'ints': '<u1'}
+
+_TRACKS = {'Sampler': Sampler, 'MultiSampler': MultiSampler,
+           'Arpeggiator': Arpeggiator}
+
+class _Writer:
+    '''Collects the binary blocks of a file, and the samples stored.'''
+    def __init__(self, embed_samples):
+        self.embed_samples = embed_samples
+        self.blocks = []
+        self.size = 0
+        self.samples = []
+        # index of each sample stored, by id and by hash
+        self._sampleids = {}
+        self._hashes = {}
+
+    def add(self, data):
+        '''Add a block of bytes; return its offset and size.'''
+        data = memoryview(data).cast('B')
+        pad = -self.size % _ALIGN
+        if pad:
+            self.blocks.append(bytes(pad))
+            self.size += pad
+        offset = self.size
+        self.blocks.append(data)
+        self.size += len(data)
+        return {'offset': offset, 'nbytes': len(data)}
+
+    def add_array(self, array, dtype):
+        ref = self.add(np.ascontiguousarray(array, dtype=dtype))
+        ref['dtype'] = dtype
+        return ref
+
+    def effects(self, fx):
+        '''Describe a pysndfx AudioEffectsChain by its Sox arguments.'''
+        if fx is None:
+            return None
+        command = getattr(fx, 'command', None)
+        if not isinstance(command, list):
+            raise UnkeyableError(f'Cannot save effects of type '
+                              f'{type(fx).__name__}; only pysndfx '
+                              'AudioEffectsChains can be saved.')
+        return list(command)
+
+    def sample(self, sample, path=None):
+        '''Store a sample (once); return its index.'''
+        if sample is None:
+            return None
+        key = id(sample)
+        if key in self._sampleids:
+            return self._sampleids[key]
+        digest = sample_hash(sample)
+        if digest in self._hashes:
+            i = self._sampleids[key] = self._hashes[digest]
+            entry = self.samples[i]
+            if path is not None and entry['path'] is None:
+                entry['path'] = path
+            return i
+        entry = {'hash': digest,
+                 'path': path,
+                 'frame_rate': sample.frame_rate,
+                 'channels': sample.channels,
+                 'sample_width': sample.sample_width}
+        if self.embed_samples or path is None:
+            entry['data'] = self.add(sample.raw_data)
+        self.samples.append(entry)
+        i = self._sampleids[key] = self._hashes[digest] = len(self.samples) - 1
+        return i
+
+def _notes_to_columns(notes, writer):
+    if isinstance(notes, NoteTable):
+        table = notes.table
+        storage = 'table'
+    else:
+        table = NoteTable(notes.items()).table
+        storage = 'dict'
+    strings = []
+    index = {}
+    names = np.full(len(table), -1, dtype='<i4')
+    for i, name in enumerate(table['name'].tolist()):
+        if name is not None:
+            if name not in index:
+                index[name] = len(strings)
+                strings.append(name)
+            names[i] = index[name]
+    columns = {c: writer.add_array(table[c], dtype)
+               for c, dtype in _COLUMNS.items()}
+    columns['name'] = writer.add_array(names, '<i4')
+    return {'storage': storage, 'rows': len(table), 'strings': strings,
+            'columns': columns}
+
+def _json_default(obj):
+    if isinstance(obj, np.generic):
+        return obj.item()
+    raise TypeError(f'{obj!r} is not JSON serializable')
+
+def _json_key(key):
+    if isinstance(key, (np.integer, np.floating)):
+        return key.item()
+    if key is None or isinstance(key, (str, int, float)):
+        return key
+    raise UnkeyableError(f'Cannot save MultiSampler sample key {key!r}.')
+
+def _track_to_dict(track, writer):
+    kind = type(track).__name__
+    if kind not in _TRACKS:
+        raise UnkeyableError(f'Cannot save Tracks of type {kind}.')
+    d = {'type': kind,
+         'name': track.name,
+         'volume': track.volume,
+         'pan': track.pan,
+         'postprocess_steps': list(track.postprocess_steps),
+         'effects': writer.effects(track.effects),
+         'plotting': track.plotting,
+         'samplepath': track.samplepath,
+         'notes': _notes_to_columns(track._notes.data, writer)}
+    if 'handle_outside_notes' in vars(track):
+        d['handle_outside_notes'] = track.handle_outside_notes
+    if isinstance(track, MultiSampler):
+        d['overlap'] = track.overlap
+        d['samples'] = [[_json_key(k), writer.sample(s)]
+                        for k, s in track.samples.items()]
+        d['default_sample'] = writer.sample(track.default_sample)
+    else:
+        d['sample'] = writer.sample(track.sample, track.samplepath)
+        d['basepitch'] = track.basepitch
+    if isinstance(track, Sampler):
+        d['overlap'] = track.overlap
+    if isinstance(track, Arpeggiator):
+        d['freq'] = track.freq
+        d['method'] = track.method
+        d['seed'] = track.seed
+    return d
+
+def project_to_bytes(sequencer, embed_samples=True):
+    '''Serialize a Sequencer; see `save_project()`.'''
+    writer = _Writer(embed_samples)
+    tracks = [_track_to_dict(t, writer) for t in sequencer.tracks()]
+    header = {'wubwub': _VERSION,
+              'sequencer': {'bpm': sequencer.bpm,
+                            'beats': sequencer.beats,
+                            'volume': sequencer.volume,
+                            'pan': sequencer.pan,
+                            'postprocess_steps': list(sequencer.postprocess_steps),
+                            'effects': writer.effects(sequencer.effects),
+                            'memory_budget': sequencer.memory_budget,
+                            'over_budget': sequencer.over_budget,
+                            'optimize': sequencer.optimize,
+                            'render_format': list(sequencer.render_format)},
+              'samples': writer.samples,
+              'tracks': tracks}
+    try:
+        header = json.dumps(header, default=_json_default).encode('utf-8')
+    except TypeError as e:
+        raise UnkeyableError(f'Cannot save Sequencer: {e}')
+    out = io.BytesIO()
+    out.write(MAGIC)
+    out.write(_PREAMBLE.pack(FORMAT_VERSION, len(header)))
+    out.write(header)
+    out.write(bytes(-out.tell() % _ALIGN))
+    for block in writer.blocks:
+        out.write(block)
+    return out.getvalue()
+
+def save_project(sequencer, path, embed_samples=True):
+    '''
+    Save a Sequencer to a file, which can be loaded with `load_project()`.
+
+    Parameters
+    ----------
+    sequencer : wubwub.sequencer.Sequencer
+        Sequencer to save.
+    path : str
+        File to write.
+    embed_samples : bool, optional
+        Store the audio of every sample in the file. The default is True.
+        When False, samples loaded from a file path (e.g. a Sampler created
+        with a path) are stored as a reference to the path.
+
+    Returns
+    -------
+    None.
+
+    '''
+    data = project_to_bytes(sequencer, embed_samples)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+def _read_header(buffer):
+    if bytes(buffer[:len(MAGIC)]) != MAGIC:
+        raise WubWubError('Not a wubwub project file.')
+    start = len(MAGIC) + _PREAMBLE.size
+    version, length = _PREAMBLE.unpack(bytes(buffer[len(MAGIC):start]))
+    if version > FORMAT_VERSION:
+        raise WubWubError(f'Project file has format version {version}, but '
+                          f'this version of wubwub reads up to {FORMAT_VERSION}.')
+    header = json.loads(bytes(buffer[start:start + length]).decode('utf-8'))
+    end = start + length
+    return header, end + (-end % _ALIGN)
+
+class _Reader:
+    def __init__(self, buffer, base):
+        self.buffer = buffer
+        self.base = base
+
+    def block(self, ref):
+        start = self.base + ref['offset']
+        return self.buffer[start:start + ref['nbytes']]
+
+    def array(self, ref):
+        # a view of the buffer; no copy is made
+        return np.frombuffer(self.block(ref), dtype=ref['dtype'])
+
+    def effects(self, command):
+        '''Rebuild a pysndfx AudioEffectsChain from its Sox arguments.'''
+        if command is None:
+            return None
+        try:
+            from pysndfx import AudioEffectsChain
+        except ImportError:
+            raise WubWubError('pysndfx is needed to load a project with '
+                              'effects; install it with `pip install pysndfx`.')
+        fx = AudioEffectsChain()
+        fx.command = list(command)
+        return fx
+
+def _load_sample(entry, reader):
+    if 'data' in entry:
+        return pydub.AudioSegment(data=bytes(reader.block(entry['data'])),
+                                  sample_width=entry['sample_width'],
+                                  frame_rate=entry['frame_rate'],
+                                  channels=entry['channels'])
+    path = entry['path']
+    _, ext = os.path.splitext(path)
+    sample = pydub.AudioSegment.from_file(path, format=ext.lower().strip('.'))
+    # saved in the render format of the Sequencer
+    sample = conform(sample, (entry['frame_rate'], entry['channels'],
+                              entry['sample_width']))
+    if sample_hash(sample) != entry['hash']:
+        raise WubWubError(f'Sample "{path}" has changed since the project '
+                          'was saved.')
+    return sample
+
+def _columns_to_notes(d, reader):
+    table = np.empty(d['rows'], dtype=NOTE_DTYPE)
+    for c in _COLUMNS:
+        table[c] = reader.array(d['columns'][c])
+    names = reader.array(d['columns']['name'])
+    strings = np.array(d['strings'] + [None], dtype=object)
+    table['name'] = strings[names]
+    notes = NoteTable()
+    notes._settable(table)
+    notes._nextgroup = int(table['group'].max(initial=-1)) + 1
+    if d['storage'] == 'table':
+        return notes
+    return SortedDict(notes.items())
+
+def _dict_to_track(d, sequencer, samples, reader):
+    cls = _TRACKS[d['type']]
+    if cls is MultiSampler:
+        track = cls(name=d['name'], sequencer=sequencer, overlap=d['overlap'])
+        for key, i in d['samples']:
+            track.add_sample(key, samples[i])
+        if d['default_sample'] is not None:
+            track.default_sample = track._ingest(samples[d['default_sample']])
+    elif cls is Sampler:
+        track = cls(name=d['name'], sample=samples[d['sample']],
+                    sequencer=sequencer, basepitch=d['basepitch'],
+                    overlap=d['overlap'])
+    else:
+        track = cls(name=d['name'], sample=samples[d['sample']],
+                    sequencer=sequencer, basepitch=d['basepitch'],
+                    freq=d['freq'], method=d['method'], seed=d['seed'])
+    track.samplepath = d['samplepath']
+    track.volume = d['volume']
+    track.pan = d['pan']
+    track.postprocess_steps = d['postprocess_steps']
+    track.effects = reader.effects(d['effects'])
+    track.plotting = d['plotting']
+    if 'handle_outside_notes' in d:
+        track.handle_outside_notes = d['handle_outside_notes']
+    track._set_notes(_columns_to_notes(d['notes'], reader))
+    return track
+
+def project_from_bytes(buffer):
+    '''Load a Sequencer from bytes (or any buffer) created by
+    `project_to_bytes()`.'''
+    buffer = memoryview(buffer)
+    header, base = _read_header(buffer)
+    reader = _Reader(buffer, base)
+    s = header['sequencer']
+    sequencer = Sequencer(bpm=s['bpm'], beats=s['beats'])
+    sequencer.volume = s['volume']
+    sequencer.pan = s['pan']
+    sequencer.postprocess_steps = s['postprocess_steps']
+    sequencer.effects = reader.effects(s['effects'])
+    sequencer.memory_budget = s['memory_budget']
+    sequencer.over_budget = s['over_budget']
+    sequencer.optimize = s.get('optimize', False)
+    if 'render_format' in s:
+        sequencer.set_render_format(*s['render_format'])
+    samples = [_load_sample(entry, reader) for entry in header['samples']]
+    for d in header['tracks']:
+        _dict_to_track(d, sequencer, samples, reader)
+    return sequencer
+
+def load_project(path):
+    '''
+    Load a Sequencer saved with `save_project()` (or
+    `wubwub.sequencer.Sequencer.save()`).  Other files (e.g. pickled
+    Sequencers) are refused.
+
+    Parameters
+    ----------
+    path : str
+        File to load.
+
+    Returns
+    -------
+    wubwub.sequencer.Sequencer
+        The loaded Sequencer.
+
+    '''
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise WubWubError(f'{path} is not a wubwub project file.')
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    # the mapping is closed once nothing refers to it; the Notes and
+    # samples are copied out of it into the Tracks
+    return project_from_bytes(mapped)
@@ -7,11 +7,14 @@ Created on Fri May 14 09:49:09 2021
 
 import os
 import shutil
+from time import perf_counter
 import zipfile
 
 import gdown
 import pydub
 
+from wubwub import metrics
+
 __all__ = ('available', 'download', 'load', 'listall', 'refresh',
            'search',)
 
@@ -101,8 +104,10 @@ def load(key):
         fullpath = os.path.join(folder, file)
 
         r = 44100
+        start = perf_counter()
         audio = (pydub.AudioSegment.from_file(fullpath, format=ext).
                  set_frame_rate(r))
+        metrics.SAMPLE_DECODE_SECONDS.observe(perf_counter() - start)
         samples[name] = audio
 
     return samples
@@ -0,0 +1,483 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+A persistent store of rendered audio, shared between processes and
+sessions.  When a store is enabled, `wubwub.sequencer.Sequencer.build()`,
+`wubwub.sequencer.Sequencer.export()`, and `wubwub.sequencer.stitch()`
+(and so `loop()`) look up their output in it before rendering, and add
+what they render:
+
+```python
+import wubwub as wb
+
+wb.set_render_store('~/.cache/wubwub', max_bytes=2e9)
+
+seq = wb.Sequencer(bpm=100, beats=8)
+...
+seq.build()     # rendered, and stored
+seq.build()     # read from the store
+```
+
+Renders are keyed by a hash of everything that determines the audio (see
+`render_key()`): the Notes, samples (by content), effects, volume and
+panning of each Track and of the Sequencer, the tempo and length, the
+overhang, and the version of wubwub.  Names and plotting settings are not
+part of the key.  The render mode is not either, as both modes produce the
+same audio.  Profiled builds, and Sequencers which cannot be keyed (see
+`render_key()`), are always rendered.
+
+Each render is a file of raw PCM (after a 64 byte header), which can be
+memory mapped with `RenderStore.view()`; WAV exports are copied from the
+mapping without decoding the whole render.  Files are written to a
+temporary name and moved into place, so any number of processes can use
+a store at once.  When the store grows beyond `max_bytes`, the least
+recently used renders are removed.
+"""
+
+__all__ = ['RenderStore', 'render_key', 'set_render_store',
+           'get_render_store']
+
+import contextlib
+import hashlib
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+import wave
+
+import numpy as np
+import pydub
+
+from wubwub import metrics, profiling
+from wubwub._version import v as _VERSION
+from wubwub.audio import BLOCK_FRAMES, sample_hash
+from wubwub.errors import UnkeyableError, WubWubError
+from wubwub.serialize import (FORMAT_VERSION, _json_default, _track_to_dict,
+                              _Writer)
+from wubwub.tracks import Arpeggiator
+
+# 1 GB
+DEFAULT_MAX_BYTES = 1 << 30
+
+_MAGIC = b'WUBPCM\x00\x01'
+# magic, frame rate, channels, sample width, frames
+_HEADER = struct.Struct('<8sIHHQ')
+_DATA = 64
+_SUFFIX = '.pcm'
+_TMP_PREFIX = '.tmp-'
+# temporary files older than this (seconds) were left by a crashed process
+_STALE = 3600
+
+_DTYPES = {1: 'i1', 2: '<i2', 4: '<i4'}
+
+# Track attributes which do not affect the audio
+_UNKEYED = ('name', 'plotting', 'samplepath')
+
+class _KeyWriter(_Writer):
+    '''A `wubwub.serialize._Writer` which hashes blocks rather than
+    storing them, and refers to samples by their hash.'''
+    def __init__(self):
+        super().__init__(embed_samples=False)
+
+    def add(self, data):
+        return hashlib.sha256(memoryview(data).cast('B')).hexdigest()
+
+    def add_array(self, array, dtype):
+        return self.add(np.ascontiguousarray(array, dtype=dtype))
+
+    def sample(self, sample, path=None):
+        if sample is None:
+            return None
+        key = id(sample)
+        if key not in self._sampleids:
+            self._sampleids[key] = sample_hash(sample)
+        return self._sampleids[key]
+
+def _digest(state):
+    try:
+        data = json.dumps(state, sort_keys=True, default=_json_default)
+    except TypeError as e:
+        raise UnkeyableError(f'Cannot key render: {e}')
+    return hashlib.sha256(data.encode('utf-8')).hexdigest()
+
+def render_key(sequencer, overhang=0, overhang_type='beats'):
+    '''
+    Hash of everything which determines the output of
+    `wubwub.sequencer.Sequencer.build()`; the key of the render in a
+    `RenderStore`.
+
+    Parameters
+    ----------
+    sequencer : wubwub.sequencer.Sequencer
+        Sequencer to hash.
+    overhang, overhang_type
+        As passed to `wubwub.sequencer.Sequencer.build()`.
+
+    Raises
+    ------
+    wubwub.errors.UnkeyableError
+        The Sequencer cannot be saved (see `wubwub.serialize`), or it has
+        an Arpeggiator playing in a random order without a `seed`, whose
+        builds differ.
+
+    Returns
+    -------
+    str
+        Hexadecimal SHA-256 hash.
+
+    '''
+    writer = _KeyWriter()
+    tracks = []
+    for track in sequencer.tracks():
+        if (isinstance(track, Arpeggiator) and track.method == 'random' and
+                track.seed is None):
+            raise UnkeyableError(f'Arpeggiator "{track.name}" has no seed, '
+                                 'so its builds differ.')
+        d = _track_to_dict(track, writer)
+        for attr in _UNKEYED:
+            del d[attr]
+        del d['notes']['storage']
+        tracks.append(d)
+    state = {'wubwub': _VERSION,
+             'format': FORMAT_VERSION,
+             'sequencer': {'bpm': sequencer.bpm,
+                           'beats': sequencer.beats,
+                           'volume': sequencer.volume,
+                           'pan': sequencer.pan,
+                           'postprocess_steps': list(sequencer.postprocess_steps),
+                           'effects': writer.effects(sequencer.effects),
+                           'optimize': sequencer.optimize,
+                           'render_format': list(sequencer.render_format)},
+             'tracks': tracks,
+             'overhang': [overhang, overhang_type]}
+    return _digest(state)
+
+def _stitch_key(keys, internal_overhang, end_overhang, overhang_type):
+    '''Key of `wubwub.sequencer.stitch()`, from the keys of the sections.'''
+    return _digest({'wubwub': _VERSION,
+                    'stitch': keys,
+                    'overhang': [internal_overhang, end_overhang,
+                                 overhang_type]})
+
+class _Entry:
+    '''A render being written to a `RenderStore`, a block at a time.'''
+    def __init__(self, file):
+        self.file = file
+        self.params = None
+
+    def write(self, audio):
+        '''Append a pydub AudioSegment.'''
+        if self.params is None:
+            self.params = (audio.frame_rate, audio.channels,
+                           audio.sample_width)
+        self.file.write(audio.raw_data)
+
+class RenderStore:
+    '''
+    A directory of rendered audio, keyed by `render_key()`.  Enable one for
+    this process with `set_render_store()`; see the module documentation.
+
+    Parameters
+    ----------
+    path : str
+        Directory of the store (created if needed).
+    max_bytes : int, optional
+        Size the store is kept under, by removing the least recently
+        used renders. Renders larger than this are not stored.
+        The default is 1 GB.  None means no limit.
+
+    '''
+    def __init__(self, path, max_bytes=DEFAULT_MAX_BYTES):
+        self.path = os.path.abspath(os.path.expanduser(path))
+        self.max_bytes = max_bytes
+        os.makedirs(self.path, exist_ok=True)
+
+    def __repr__(self):
+        return f'RenderStore(path="{self.path}", max_bytes={self.max_bytes})'
+
+    def __contains__(self, key):
+        return self._header(key) is not None
+
+    def __len__(self):
+        return len(self._entries())
+
+    def _file(self, key):
+        return os.path.join(self.path, key + _SUFFIX)
+
+    def _header(self, key):
+        '''Frame rate, channels, sample width, and frames of the render
+        stored for `key`; None if there is no (complete) render.'''
+        try:
+            with open(self._file(key), 'rb') as f:
+                size = os.fstat(f.fileno()).st_size
+                head = f.read(_HEADER.size)
+        except OSError:
+            return None
+        if len(head) != _HEADER.size:
+            return None
+        magic, rate, channels, width, frames = _HEADER.unpack(head)
+        if magic != _MAGIC or size != _DATA + frames * channels * width:
+            return None
+        return rate, channels, width, frames
+
+    @contextlib.contextmanager
+    def _mapped(self, key):
+        '''Yield the header and a memory map of the render for `key` (Nones
+        if there is none), marking it as recently used.'''
+        path = self._file(key)
+        header = self._header(key)
+        mapping = b''
+        if header is not None and header[3]:
+            # the file may be replaced (or evicted) after reading the header,
+            # so the mapping is checked too; an open mapping stays valid
+            rate, channels, width, frames = header
+            try:
+                with open(path, 'rb') as f:
+                    mapping = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            except (OSError, ValueError):
+                header = None
+            else:
+                if (_HEADER.unpack_from(mapping) != (_MAGIC,) + header or
+                        len(mapping) != _DATA + frames * channels * width):
+                    mapping.close()
+                    header = None
+        hit = header is not None
+        profiling.cache('render store', hit)
+        metrics.cache('render store', hit)
+        if not hit:
+            yield None, None
+            return
+        with contextlib.suppress(OSError):
+            os.utime(path)
+        try:
+            yield header, mapping
+        finally:
+            if isinstance(mapping, mmap.mmap):
+                mapping.close()
+
+    def get(self, key):
+        '''
+        Return the render stored for `key`, or None.
+
+        Parameters
+        ----------
+        key : str
+            From `render_key()`.
+
+        Returns
+        -------
+        pydub.AudioSegment or None
+            The stored audio.
+
+        '''
+        with self._mapped(key) as (header, mapping):
+            if header is None:
+                return None
+            rate, channels, width, _ = header
+            return pydub.AudioSegment(data=bytes(mapping[_DATA:]),
+                                      sample_width=width,
+                                      frame_rate=rate,
+                                      channels=channels)
+
+    def view(self, key):
+        '''
+        Memory map the render stored for `key`, without reading it.
+
+        Parameters
+        ----------
+        key : str
+            From `render_key()`.
+
+        Returns
+        -------
+        numpy.memmap or None
+            Read only array of samples, with one row per frame and one
+            column per channel; None if nothing is stored for `key`.
+
+        Raises
+        ------
+        wubwub.errors.WubWubError
+            For 24 bit audio, which has no NumPy type.
+
+        '''
+        header = self._header(key)
+        if header is None:
+            return None
+        rate, channels, width, frames = header
+        if width not in _DTYPES:
+            raise WubWubError(f'Cannot view audio with sample width {width}.')
+        if frames == 0:
+            return np.empty((0, channels), dtype=_DTYPES[width])
+        return np.memmap(self._file(key), dtype=_DTYPES[width], mode='r',
+                         offset=_DATA, shape=(frames, channels))
+
+    def put(self, key, audio):
+        '''
+        Store a render.
+
+        Parameters
+        ----------
+        key : str
+            From `render_key()`.
+        audio : pydub.AudioSegment
+            The rendered audio.
+
+        Returns
+        -------
+        None.
+
+        '''
+        with self._writer(key) as entry:
+            entry.write(audio)
+
+    @contextlib.contextmanager
+    def _writer(self, key):
+        '''Yield an `_Entry` to write a render to; it is added to the store
+        (atomically) if the block exits without an error.'''
+        fd, tmp = tempfile.mkstemp(dir=self.path, prefix=_TMP_PREFIX)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(bytes(_DATA))
+                entry = _Entry(f)
+                yield entry
+                size = f.tell()
+                if entry.params is not None:
+                    rate, channels, width = entry.params
+                    frames = (size - _DATA) // (channels * width)
+                    f.seek(0)
+                    f.write(_HEADER.pack(_MAGIC, rate, channels, width,
+                                         frames))
+            if entry.params is None or (self.max_bytes is not None and
+                                        size > self.max_bytes):
+                os.remove(tmp)
+            else:
+                os.replace(tmp, self._file(key))
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp)
+            raise
+        self._evict()
+
+    def _export(self, key, path, fmt):
+        '''Export the render stored for `key` (as
+        `wubwub.sequencer.Sequencer.export()` would); return whether
+        there was one.'''
+        if fmt != 'wav':
+            audio = self.get(key)
+            if audio is not None:
+                audio.export(path, format=fmt)
+            return audio is not None
+        with self._mapped(key) as (header, mapping):
+            if header is None:
+                return False
+            rate, channels, width, frames = header
+            step = BLOCK_FRAMES * channels * width
+            with wave.open(path, 'wb') as f:
+                f.setnchannels(channels)
+                f.setsampwidth(width)
+                f.setframerate(rate)
+                f.setnframes(frames)
+                for i in range(_DATA, len(mapping), step):
+                    f.writeframesraw(mapping[i:i + step])
+        return True
+
+    def _entries(self):
+        '''Modification time, size, and path of each render; temporary
+        files left by crashed processes are removed.'''
+        entries = []
+        now = time.time()
+        with os.scandir(self.path) as it:
+            for e in it:
+                try:
+                    stat = e.stat()
+                except OSError:
+                    continue
+                if e.name.endswith(_SUFFIX):
+                    entries.append((stat.st_mtime, stat.st_size, e.path))
+                elif e.name.startswith(_TMP_PREFIX) and now - stat.st_mtime > _STALE:
+                    with contextlib.suppress(OSError):
+                        os.remove(e.path)
+        return entries
+
+    def _evict(self):
+        if self.max_bytes is None:
+            return
+        entries = sorted(self._entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            # another process may have removed it already
+            with contextlib.suppress(OSError):
+                os.remove(path)
+            total -= size
+
+    def size(self):
+        '''Total size (bytes) of the stored renders.'''
+        return sum(size for _, size, _ in self._entries())
+
+    def clear(self):
+        '''Remove every stored render.'''
+        for _, _, path in self._entries():
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
+_store = None
+
+def set_render_store(store, max_bytes=DEFAULT_MAX_BYTES):
+    '''
+    Enable (or disable) the render store for this process.
+
+    Parameters
+    ----------
+    store : RenderStore, str, or None
+        The store, or the path of its directory; None disables it.
+    max_bytes : int, optional
+        Size limit, when `store` is a path. The default is 1 GB.
+
+    Returns
+    -------
+    RenderStore or None
+        The store previously enabled.
+
+    '''
+    global _store
+    if isinstance(store, (str, os.PathLike)):
+        store = RenderStore(store, max_bytes)
+    elif store is not None and not isinstance(store, RenderStore):
+        raise WubWubError('store must be a RenderStore, a path, or None.')
+    previous, _store = _store, store
+    return previous
+
+def get_render_store():
+    '''Return the enabled `RenderStore`, or None.'''
+    return _store
+
+def _lookup(sequencer, overhang, overhang_type):
+    '''The enabled store and the key of a build of `sequencer`, or Nones
+    when there is no store (or the Sequencer cannot be keyed; see
+    `render_key()`).'''
+    store = _store
+    if store is None:
+        return None, None
+    try:
+        return store, render_key(sequencer, overhang, overhang_type)
+    except UnkeyableError:
+        return None, None
+
+def _stitch_lookup(sequencers, internal_overhang, end_overhang, overhang_type):
+    '''As `_lookup()`, for `wubwub.sequencer.stitch()`.'''
+    store = _store
+    if store is None:
+        return None, None
+    keys = {}
+    for seq in sequencers:
+        if id(seq) not in keys:
+            keys[id(seq)] = _lookup(seq, internal_overhang, overhang_type)[1]
+            if keys[id(seq)] is None:
+                return None, None
+    key = _stitch_key([keys[id(seq)] for seq in sequencers],
+                      internal_overhang, end_overhang, overhang_type)
+    return store, key
@@ -11,7 +11,6 @@ from abc import ABCMeta, abstractmethod
 from collections.abc import Iterable
 from collections import defaultdict
 import copy
-from fractions import Fraction
 import itertools
 from numbers import Number
 import os
@@ -22,11 +21,56 @@ import numpy as np
 import pydub
 from sortedcontainers import SortedDict
 
-from wubwub.audio import add_note_to_audio, add_effects, play, _overhang_to_milli
+from wubwub.audio import (add_sample_to_audio, add_effects, conform, play,
+                          _mix_postprocessed, _new_audio, _overhang_to_milli,
+                          _overlaid_bytes, _pan, _shift_sample)
 from wubwub.errors import WubWubError, WubWubWarning
-from wubwub.notes import ArpChord, Chord, Note, arpeggiate, _notetypes_
+from wubwub.notes import (ArpChord, Chord, Note, arpeggiate_arrays,
+                          merge_notes, _notetypes_)
+from wubwub.notetable import NoteTable
+from wubwub.pattern import Pattern
+from wubwub.pitch import pitches_to_semitones
 from wubwub.plots import trackplot, pianoroll
-from wubwub.resources import random_choice_generator, MINUTE, SECOND
+from wubwub import hooks, metrics, profiling
+from wubwub.profiling import RenderProfile
+from wubwub.resources import (fraction_range, random_choice_generator,
+                              MINUTE, SECOND)
+
+class _Shared:
+    '''Reference-counted holder for data which copied Tracks share until
+    one of them needs to modify it.  Data which has been handed out (see
+    `Track.notedict`) is `exposed`, and is never shared, since it can be
+    modified without the Track knowing.'''
+    __slots__ = ('data', 'refs', 'exposed')
+
+    def __init__(self, data, exposed=False):
+        self.data = data
+        self.refs = 1
+        self.exposed = exposed
+
+    def share(self):
+        self.refs += 1
+        return self
+
+    def release(self):
+        self.refs -= 1
+
+def _range_items(notes, start=None, stop=None):
+    '''Return a list of the (beat, element) pairs of `notes` (a SortedDict
+    or `wubwub.notetable.NoteTable`) with `start <= beat < stop`.  The
+    range is found by bisection, so this only visits the elements returned.
+    `None` leaves the range unbounded on that side.'''
+    keys = notes.irange(start, stop, inclusive=(True, False))
+    return [(k, notes[k]) for k in keys]
+
+def _delete_range(notes, start=None, stop=None):
+    '''Delete (in place) the elements of `notes` with
+    `start <= beat < stop`.'''
+    if isinstance(notes, NoteTable):
+        notes.delete_range(start, stop)
+    else:
+        for k in list(notes.irange(start, stop, inclusive=(True, False))):
+            del notes[k]
 
 class SliceableDict:
     '''Helper class to implement the "note slice" feature of Tracks.'''
@@ -39,9 +83,7 @@ class SliceableDict:
         elif isinstance(keys, slice):
             start, stop = (keys.start, keys.stop)
             start = 0 if start is None else start
-            stop = np.inf if stop is None else stop
-            return {k:v for k, v in self.d.items()
-                    if start <= k < stop}
+            return dict(_range_items(self.d, start, stop))
         elif isinstance(keys, Iterable):
             if getattr(keys, 'dtype', False) == bool:
                 if not len(keys) == len(self.d):
@@ -51,7 +93,7 @@ class SliceableDict:
                         zip(keys, self.d.items()) if boolean}
 
             else:
-                return {k: dict.get(self.d, k) for k in keys}
+                return {k: self.d.get(k) for k in keys}
         else:
             raise IndexError('Could not interpret input as int, '
                              'slice, iterable, or boolean index.')
@@ -60,9 +102,11 @@ class Track(metaclass=ABCMeta):
     '''Generic Track class.'''
 
     handle_outside_notes = 'skip'
+    # whether Notes are pitch shifted from the samples
+    _pitched = False
 
     def __init__(self, name, sequencer,):
-        self.notedict = SortedDict()
+        self._notes = _Shared(SortedDict())
         self.samplepath = None
 
         self.effects = None
@@ -79,23 +123,23 @@ class Track(metaclass=ABCMeta):
         self.plotting = {}
 
     def __getitem__(self, beat):
+        notedict = self._notes.data
         if isinstance(beat, Number):
-            return self.notedict[beat]
+            return notedict[beat]
         elif isinstance(beat, slice):
             start, stop = (beat.start, beat.stop)
             start = 0 if start is None else start
-            stop = np.inf if stop is None else stop
-            return [self.notedict[k] for k in self.notedict.keys() if start <= k < stop]
+            return [v for _, v in _range_items(notedict, start, stop)]
         elif isinstance(beat, Iterable):
             if getattr(beat, 'dtype', False) == bool:
-                if not len(beat) == len(self.notedict):
+                if not len(beat) == len(notedict):
                     raise IndexError(f'Length of boolean index ({len(beat)}) '
-                                     f"does not match number of notes ({len(self.notedict)}).")
-                return [self.notedict[k] for k, b in zip(self.notedict.keys(), beat)
+                                     f"does not match number of notes ({len(notedict)}).")
+                return [notedict[k] for k, b in zip(notedict.keys(), beat)
                         if b]
 
             else:
-                return [self.notedict[b] for b in beat]
+                return [notedict[b] for b in beat]
         else:
             raise WubWubError('Index wubwub.Track with [beat], '
                               '[start:stop], or boolean index, '
@@ -103,55 +147,77 @@ class Track(metaclass=ABCMeta):
 
     def __setitem__(self, beat, value):
         if isinstance(beat, Number):
-            self.notedict[beat] = value
+            self._writable_notes()[beat] = value
         elif isinstance(beat, slice):
             start, stop, step = (beat.start, beat.stop, beat.step)
             if step is None:
                 # replace all notes in the range
                 start = 0 if start is None else start
-                stop = np.inf if stop is None else stop
-                for k, v in self.notedict.items():
-                    if k < start:
-                        continue
-                    if k >= stop:
-                        break
-                    self.notedict[k] = value
+                keys = list(self._notes.data.irange(start, stop,
+                                                    inclusive=(True, False)))
+                self._writable_notes().update(dict.fromkeys(keys, value))
             else:
                 # fill notes from start to stop every step
                 start = 1 if start is None else start
                 stop = self.get_beats() + 1 if stop is None else stop
-                while start < stop:
-                    self.notedict[start] = value
-                    start += step
+                self.add_many(fraction_range(start, stop, step), value)
         elif isinstance(beat, Iterable):
+            notedict = self._notes.data
             if getattr(beat, 'dtype', False) == bool:
-                if not len(beat) == len(self.notedict):
+                if not len(beat) == len(notedict):
                     raise IndexError(f'Length of boolean index ({len(beat)}) '
-                                     f"does not match number of notes ({len(self.notedict)}).")
+                                     f"does not match number of notes ({len(notedict)}).")
                 if not type(value) in _notetypes_:
                     raise IndexError('Can only set with single note using '
                                      'boolean index.')
-                for k, b in zip(self.notedict.keys(), beat):
-                    if b:
-                        self.notedict[k] = value
+                keys = list(itertools.compress(notedict.keys(), beat))
+                self._writable_notes().update(dict.fromkeys(keys, value))
             else:
-                if type(value) in _notetypes_:
-                    value = [value] * len(beat)
-                if len(beat) != len(value):
+                # Patterns, ranges, and arrays of beats are added in one pass
+                if isinstance(beat, Pattern):
+                    beat = beat.pattern
+                if type(value) not in _notetypes_ and len(beat) != len(value):
                     raise IndexError(f'Length of new values ({len(value)}) '
                                      'does not equal length of indexer '
                                      f'({len(beat)}).')
-                for b, v in zip(beat, value):
-                    self.notedict[b] = v
+                self.add_many(beat, value)
 
         else:
             raise WubWubError('Index wubwub.Track with [beat], '
                               '[start:stop], or boolean index, '
                               f'not {type(beat)}')
 
+    def __del__(self):
+        notes = self.__dict__.get('_notes')
+        if notes is not None:
+            notes.release()
+
+    @property
+    def notedict(self):
+        notes = self._writable_notes()
+        self._notes.exposed = True
+        return notes
+
+    @notedict.setter
+    def notedict(self, new):
+        self._set_notes(new, exposed=True)
+
+    def _writable_notes(self):
+        '''Return the notes, copying them first if they are shared.'''
+        if self._notes.refs > 1:
+            self._set_notes(self._notes.data.copy())
+        return self._notes.data
+
+    def _set_notes(self, new, exposed=False):
+        self._notes.release()
+        self._notes = _Shared(new, exposed)
+
     @property
     def slice(self):
-        return SliceableDict(self.notedict)
+        return SliceableDict(self._notes.data)
+
+    def noterange(self, start=None, stop=None):
+        return _range_items(self._notes.data, start, stop)
 
     @property
     def sequencer(self):
@@ -171,6 +237,43 @@ class Track(metaclass=ABCMeta):
 
         self._sequencer = sequencer
         self._sequencer._add_track(self)
+        self._conform_samples()
+
+    def _ingest(self, sample):
+        '''Return a sample (a path or pydub AudioSegment) as audio in the
+        render format of the Sequencer.  Samples of pitched Tracks keep
+        their frame rate: every Note is resampled to the render frame rate
+        when it is pitch shifted, so converting the sample too would
+        resample it twice.'''
+        if isinstance(sample, str):
+            _, ext = os.path.splitext(sample)
+            ext = ext.lower().strip('.')
+            sample = pydub.AudioSegment.from_file(sample, format=ext)
+        elif not isinstance(sample, pydub.AudioSegment):
+            raise WubWubError('sample must be a path or pydub.AudioSegment')
+        if self._sequencer is None:
+            return sample
+        fmt = self._sequencer.render_format
+        if self._pitched:
+            fmt = (sample.frame_rate,) + fmt[1:]
+        return conform(sample, fmt, keep_mono=True)
+
+    def _conform_samples(self):
+        '''Convert the samples of the Track to the render format of the
+        Sequencer (after either changes).'''
+        pass
+
+    def _samples(self):
+        '''The samples of the Track.'''
+        return ()
+
+    def _render_format(self):
+        '''Format to render the Track in: the render format of the
+        Sequencer, with only as many channels as the samples (so mono
+        samples are mixed in mono, until the Track is panned).'''
+        rate, _, width = self.sequencer.render_format
+        channels = max((s.channels for s in self._samples()), default=1)
+        return (rate, channels, width)
 
     @property
     def name(self):
@@ -182,44 +285,102 @@ class Track(metaclass=ABCMeta):
             raise WubWubError(f'track name "{new}" already in use.')
         self._name = new
 
+    def set_note_storage(self, storage):
+        '''Store the notes of this Track in either a SortedDict (`'dict'`,
+        the default) or a `wubwub.notetable.NoteTable` (`'table'`), which
+        uses much less memory for Tracks with very many notes.'''
+        options = {'dict': SortedDict, 'table': NoteTable}
+        if storage not in options:
+            raise WubWubError(f'`storage` must be one of {list(options)}')
+        notes = self._notes.data
+        if not isinstance(notes, options[storage]):
+            self._set_notes(options[storage](notes.items()))
+
+    def _keep_outside(self, outsiders=None):
+        '''Apply the `handle_outside_notes` policy (or `outsiders`, if
+        given) for adding notes beyond the length of the Sequencer.  Returns
+        True if those notes should be added.'''
+        method = self.handle_outside_notes if outsiders is None else outsiders
+        options = ['skip', 'add', 'warn', 'raise']
+        if method not in options:
+            w = ('`method` not recognized, '
+                 'defaulting to "skip".')
+            warnings.warn(w, WubWubWarning)
+            method = 'skip'
+        if method == 'skip':
+            return False
+        if method == 'warn':
+            s = ("Adding note on beat beyond the "
+                 "sequencer's length.  See `handle_outside_notes` "
+                 "in class docstring for `wb.Track` to toggle "
+                 "this behavior.")
+            warnings.warn(s, WubWubWarning)
+
+        elif method == 'raise':
+            s = ("Tried to add note on beat beyond the "
+                 "sequencer's length.  See `handle_outside_notes` "
+                 "in class docstring for `wb.Track` to toggle "
+                 "this behavior.")
+            raise WubWubError(s)
+        return True
+
     def add(self, beat, element, merge=False, outsiders=None):
 
-        if beat >= self.get_beats() + 1:
-            method = self.handle_outside_notes if outsiders is None else outsiders
-            options = ['skip', 'add', 'warn', 'raise']
-            if method not in options:
-                w = ('`method` not recognized, '
-                     'defaulting to "skip".',)
-                warnings.warn(w, WubWubWarning)
-                method = 'skip'
-            if method == 'skip':
-                return
-            if method == 'warn':
-                s = ("Adding note on beat beyond the "
-                     "sequencer's length.  See `handle_outside_notes` "
-                     "in class docstring for `wb.Track` to toggle "
-                     "this behavior.")
-                warnings.warn(s, WubWubWarning)
-
-            elif method == 'raise':
-                s = ("Tried to add note on beat beyond the "
-                     "sequencer's length.  See `handle_outside_notes` "
-                     "in class docstring for `wb.Track` to toggle "
-                     "this behavior.")
-                raise WubWubError(s)
-        existing = self.notedict.get(beat, None)
+        if beat >= self.get_beats() + 1 and not self._keep_outside(outsiders):
+            return
+        existing = self._writable_notes().get(beat, None)
         if existing and merge:
             element = existing + element
-        self.notedict[beat] = element
+        self._writable_notes()[beat] = element
+
+    def add_many(self, beats, elements, merge=False, outsiders=None):
+        '''Add many elements at once; `elements` is either a single element
+        (added on every beat) or a sequence of the same length as `beats`.
+        This is equivalent to calling `add()` for each pair, but the beats
+        are checked and the elements inserted in one pass.'''
+        if isinstance(beats, Pattern):
+            beats = beats.pattern
+        beats = beats.tolist() if isinstance(beats, np.ndarray) else list(beats)
+        if type(elements) in _notetypes_:
+            elements = [elements] * len(beats)
+        else:
+            elements = list(elements)
+        if len(beats) != len(elements):
+            raise WubWubError(f'Length of elements ({len(elements)}) '
+                              f'does not equal length of beats ({len(beats)}).')
+        if not beats:
+            return
 
-    def add_fromdict(self, d, offset=0, outsiders=None, merge=False):
-        for beat, element in d.items():
+        outside = np.asarray(beats, dtype=float) >= self.get_beats() + 1
+        if outside.any() and not self._keep_outside(outsiders):
+            inside = np.flatnonzero(~outside).tolist()
+            beats = [beats[i] for i in inside]
+            elements = [elements[i] for i in inside]
+
+        notes = self._writable_notes()
+        if not merge:
+            notes.update(zip(beats, elements))
+            return
 
-            self.add(beat=beat + offset, element=element, merge=merge,
-                     outsiders=outsiders)
+        # gather everything landing on each beat, then merge each beat once
+        new = defaultdict(list)
+        for beat, element in zip(beats, elements):
+            new[beat].append(element)
+        for beat, group in new.items():
+            existing = notes.get(beat, None)
+            if existing:
+                group.insert(0, existing)
+        notes.update((beat, merge_notes(group)) for beat, group in new.items())
+
+    def add_fromdict(self, d, offset=0, outsiders=None, merge=False):
+        beats = [beat + offset for beat in d] if offset else d.keys()
+        self.add_many(beats, d.values(), merge=merge, outsiders=outsiders)
 
     def array_of_beats(self):
-        return np.array(self.notedict.keys())
+        notes = self._notes.data
+        if isinstance(notes, NoteTable):
+            return notes.beats()
+        return np.array(notes.keys())
 
     def copy(self, newname=None, newseq=False, with_notes=True,):
         if newname is None:
@@ -228,7 +389,19 @@ class Track(metaclass=ABCMeta):
             newseq = self.sequencer
         new = copy.copy(self)
         for k, v in vars(new).items():
-            if k == 'notedict':
+            if k == '_notes':
+                # notes are shared until either track modifies them
+                if not with_notes:
+                    v = _Shared(type(v.data)())
+                elif v.exposed:
+                    v = _Shared(v.data.copy())
+                else:
+                    v = v.share()
+                setattr(new, k, v)
+            elif k in ['_sample', 'default_sample']:
+                # AudioSegments are immutable, so can be shared
+                setattr(new, k, v)
+            elif k == 'samples':
                 setattr(new, k, v.copy())
             elif k == '_name':
                 setattr(new, k, newname)
@@ -237,8 +410,6 @@ class Track(metaclass=ABCMeta):
             else:
                 setattr(new, k, copy.deepcopy(v))
         new.sequencer = newseq
-        if not with_notes:
-            new.delete_all()
         return new
 
     def copypaste(self, start, stop, newstart, outsiders=None, merge=False,):
@@ -246,44 +417,74 @@ class Track(metaclass=ABCMeta):
         if section:
             offset = start - 1
             at_one = {k-offset:v for k, v in section.items()}
-            self.add_fromdict(at_one, offset=newstart-1)
+            self.add_fromdict(at_one, offset=newstart-1, outsiders=outsiders,
+                              merge=merge)
 
     def _handle_beats_dict_boolarray(self, beats):
         if getattr(beats, 'dtype', False) == bool:
-            beats = self[beats].keys()
+            beats = self.array_of_beats()[beats]
         elif isinstance(beats, dict):
             beats = beats.keys()
         elif isinstance(beats, Number):
             return [beats]
         return beats
 
-    def quantize(self, resolution=1/4, merge=False):
+    def quantize(self, resolution=1/4, merge=False, strength=1, swing=0):
+        '''Move notes towards the closest beat of a grid with the given
+        `resolution` (or list of resolutions).  `strength` is the fraction
+        of the distance to the grid to move each note, and `swing` is the
+        fraction of a grid step by which every other grid point is delayed
+        (e.g. 1/3 for triplet swing).'''
         bts = self.get_beats()
-        targets = np.empty(0)
         if isinstance(resolution, Number):
             resolution = [resolution]
+        grids = []
         for r in resolution:
             if ((1 / r) % 1) != 0:
                 raise WubWubError('`resolution` must evenly divide 1')
             steps = int(bts * (1 / r))
-            beats = np.linspace(1, bts + 1, steps, endpoint=False)
-            targets = np.append(targets, beats)
-        targets = np.unique(targets)
-        for b, note in self.notedict.copy().items():
-            diffs = np.abs(targets - b)
-            argmin = np.argmin(diffs)
-            closest = targets[argmin]
-            if b != closest:
-                del self.notedict[b]
-                self.add(closest, note, merge=merge)
+            grid = np.linspace(1, bts + 1, steps, endpoint=False)
+            grid[1::2] += swing * r
+            grids.append(grid)
+        targets = np.unique(np.concatenate(grids))
+
+        beats = self.array_of_beats()
+        if not len(beats) or not len(targets):
+            return
+        # nearest grid point; ties go to the earlier point
+        idx = np.searchsorted(targets, beats)
+        left = targets[np.clip(idx - 1, 0, len(targets) - 1)]
+        right = targets[np.clip(idx, 0, len(targets) - 1)]
+        closest = np.where(np.abs(beats - left) <= np.abs(right - beats),
+                           left, right)
+        newbeats = beats + strength * (closest - beats)
+        moved = newbeats != beats
+        if not moved.any():
+            return
+
+        notes = self._writable_notes()
+        oldbeats = beats[moved].tolist()
+        moves = [(new, notes[old]) for old, new in
+                 zip(oldbeats, newbeats[moved].tolist())]
+        self._delete_beats(oldbeats)
+        if merge:
+            self.add_many(*zip(*moves), merge=True)
+        else:
+            notes.update(moves)
 
     def shift(self, beats, by, merge=False):
-        beats = self._handle_beats_dict_boolarray(beats)
-        newkeys = [k + by if k in beats else k
-                   for k in self.notedict.keys()]
-        oldnotes = self.notedict.values()
-        self.delete_all_notes()
-        for newbeat, note in zip(newkeys, oldnotes):
+        beats = set(self._handle_beats_dict_boolarray(beats))
+        if isinstance(self._notes.data, NoteTable) and not merge:
+            notes = self._writable_notes()
+            notes.shift(list(beats), by)
+            end = self.get_beats() + 1
+            if len(notes) and notes.beats()[-1] >= end and not self._keep_outside():
+                notes.delete_range(end, np.inf)
+            return
+        oldnotes = list(self._notes.data.items())
+        self.delete_all()
+        for k, note in oldnotes:
+            newbeat = k + by if k in beats else k
             self.add(newbeat, note, merge=merge)
 
     def get_bpm(self):
@@ -301,30 +502,40 @@ class Track(metaclass=ABCMeta):
         return dict(out)
 
     def pprint_notedict(self):
-        pprint.pprint(self.notedict)
+        pprint.pprint(self._notes.data)
 
     def clean(self):
         maxi = self.get_beats()
-        self.notedict = SortedDict({b:note for b, note in self.notedict.items()
-                                    if 1 <= b < maxi +1})
+        self.delete_fromrange(None, 1)
+        self.delete_fromrange(maxi + 1, None)
 
     def delete_all(self):
-        self.notedict = SortedDict({})
+        self._set_notes(type(self._notes.data)())
 
     def delete(self, beats):
         beats = self._handle_beats_dict_boolarray(beats)
-        for beat in beats:
-            del self.notedict[beat]
+        self._delete_beats(beats)
+
+    def _delete_beats(self, beats):
+        notes = self._writable_notes()
+        if isinstance(notes, NoteTable):
+            notes.delete_beats(beats)
+        else:
+            for beat in beats:
+                del notes[beat]
 
     def delete_fromrange(self, lo, hi):
-        self.notedict = SortedDict({b:note for b, note in self.notedict.items()
-                                    if not lo <= b < hi})
+        # only take ownership of shared notes when there is something to delete
+        keys = self._notes.data.irange(lo, hi, inclusive=(True, False))
+        if next(keys, None) is not None:
+            _delete_range(self._writable_notes(), lo, hi)
 
     def unpack_notes(self, start=0, stop=np.inf,):
+        notes = self._notes.data
+        if isinstance(notes, NoteTable):
+            return notes.unpacked(start, stop)
         unpacked = []
-        for b, element in self.notedict.items():
-            if not start <= b < stop:
-                continue
+        for b, element in _range_items(notes, start, stop):
             if isinstance(element, Note):
                 unpacked.append((b, element))
             elif type(element) in [Chord, ArpChord]:
@@ -332,20 +543,98 @@ class Track(metaclass=ABCMeta):
                     unpacked.append((b, note))
         return unpacked
 
+    def _note_columns(self, start=None, stop=None):
+        '''Return arrays of the beat, pitch, length, and volume of each
+        Note (with Chords unpacked) with `start <= beat < stop`, sorted
+        by beat.'''
+        notes = self._notes.data
+        if isinstance(notes, NoteTable):
+            return notes.columns(start, stop)
+        unpacked = Track.unpack_notes(self, start, stop)
+        beats = np.array([b for b, _ in unpacked], dtype=float)
+        pitches = np.empty(len(unpacked), dtype=object)
+        pitches[:] = [n.pitch for _, n in unpacked]
+        lengths = np.array([n.length for _, n in unpacked], dtype=float)
+        volumes = np.array([n.volume for _, n in unpacked], dtype=float)
+        return beats, pitches, lengths, volumes
+
+    def build(self, overhang=0, overhang_type='beats', profile=False):
+        if profile:
+            return self._profiled_build(overhang, overhang_type)
+        with self._span('track', 1, self.get_beats() + 1):
+            return self.postprocess(self._render(overhang, overhang_type))
+
     @abstractmethod
-    def build(self, overhang=0, overhang_type='beats'):
+    def _render(self, overhang=0, overhang_type='beats', stream=False):
+        '''Render the Notes of the Track (without postprocessing).  With
+        `stream`, render onto a `wubwub.audio._MixBuffer` rather than a
+        pydub AudioSegment.'''
         pass
 
+    def _build_onto(self, master, overhang=0, overhang_type='beats',
+                    profile=False):
+        '''Build the Track in the streaming mode, overlaying it onto
+        `master` (a `wubwub.audio._MixBuffer`).'''
+        if profile:
+            with RenderProfile.for_track(self).recording():
+                self._build_onto(master, overhang, overhang_type)
+            return
+        with self._span('track', 1, self.get_beats() + 1):
+            audio = self._render(overhang, overhang_type, stream=True)
+            with self._span('postprocess'):
+                _mix_postprocessed(master, audio, self._postprocess_steps,
+                                   self._pointwise_postprocess())
+
     def postprocess(self, build):
+        with self._span('postprocess'):
+            return self._postprocess_steps(build)
+
+    def _postprocess_steps(self, build):
         for step in self.postprocess_steps:
-            if step == 'effects':
-                build = add_effects(build, self.effects)
-            if step == 'volume':
-                build += self.volume
-            if step == 'pan':
-                build = build.pan(self.pan)
+            with profiling.stage(step):
+                if step == 'effects':
+                    with self._span('effects'):
+                        build = add_effects(build, self.effects)
+                if step == 'volume':
+                    build += self.volume
+                if step == 'pan':
+                    build = _pan(build, self.pan,
+                                 self.sequencer.render_format[1])
         return build
 
+    def _pointwise_postprocess(self):
+        '''Whether postprocessing treats each frame independently (so it
+        can be applied to a block of audio at a time).'''
+        return self.effects is None or 'effects' not in self.postprocess_steps
+
+    def _span(self, stage, start=None, end=None):
+        '''Emit begin/end events for a stage of rendering this Track to the
+        hooks of its Sequencer; see `wubwub.hooks`.'''
+        return hooks.span(self.sequencer, stage, self.name, start, end)
+
+    def _note_batches(self, schedule, b):
+        '''Split a note schedule (see `_note_schedule()`) into batches,
+        emitting events and checking for cancellation between them.'''
+        seq = self.sequencer
+        if not seq._hooks and seq.cancel_token is None:
+            yield schedule
+            return
+        schedule = list(schedule)
+        for i in range(0, len(schedule), hooks.NOTE_BATCH):
+            hooks.check(seq)
+            batch = schedule[i:i + hooks.NOTE_BATCH]
+            beats = [position / b + 1 for position, *_ in batch]
+            with self._span('notes', min(beats), max(beats)):
+                yield batch
+
+    def _profiled_build(self, overhang, overhang_type):
+        '''Build while recording a `wubwub.profiling.RenderProfile`;
+        returns the audio and the profile.'''
+        profile = RenderProfile.for_track(self)
+        with profile.recording():
+            audio = self.build(overhang, overhang_type)
+        return audio, profile
+
     def play(self, start=1, end=None, overhang=0, overhang_type='beats'):
         b = (1/self.get_bpm()) * MINUTE
         start = (start-1) * b
@@ -375,6 +664,30 @@ class SamplerLikeTrack(Track):
     def __init__(self, name, sequencer, **kwargs):
         super().__init__(name=name, sequencer=sequencer)
 
+    def _note_schedule(self, b, semitones=False):
+        '''Return the position, duration, pitch, and volume of each Note
+        (in milliseconds, given `b` milliseconds per beat), in the order
+        they are rendered.  Notes are cut at the next beat when the Track
+        does not allow overlap.  With `semitones`, pitches are converted to
+        semitones relative to the `basepitch`, and Notes without a pitch
+        are dropped.'''
+        beats, pitches, lengths, volumes = self._note_columns()
+        if semitones:
+            pitches = pitches_to_semitones(pitches, self.basepitch)
+        positions = (beats - 1) * b
+        durations = lengths * b
+        if not self.overlap:
+            unique, inverse = np.unique(beats, return_inverse=True)
+            nextpos = (np.append(unique[1:], np.inf)[inverse] - 1) * b
+            durations = np.where(positions + durations > nextpos,
+                                 nextpos - positions, durations)
+        # latest beats first; Notes of a Chord in order
+        order = np.lexsort((np.arange(len(beats)), -beats))
+        if semitones:
+            order = order[~np.isnan(pitches[order])]
+        return zip(positions[order].tolist(), durations[order].tolist(),
+                   pitches[order].tolist(), volumes[order].tolist())
+
     def make_notes(self, beats, pitches=0, lengths=1, volumes=0,
                    pitch_select='cycle', length_select='cycle',
                    volume_select='cycle', merge=False):
@@ -395,22 +708,17 @@ class SamplerLikeTrack(Track):
                          start=1, end=None, pitch_select='cycle',
                          length_select='cycle', volume_select='cycle', merge=False):
 
-        freq = Fraction(freq).limit_denominator()
-
         pitches = self._convert_select_arg(pitches, pitch_select)
         lengths = self._convert_select_arg(lengths, length_select)
         volumes = self._convert_select_arg(volumes, volume_select)
 
-        b = Fraction(start + offset).limit_denominator()
         if end is None:
             end = self.get_beats() + 1
-        d = {}
-        while b < end:
-            pos = b.numerator / b.denominator
-            d[pos] = Note(next(pitches), next(lengths), next(volumes))
-            b += freq
+        beats = fraction_range(start + offset, end, freq)
+        notes = [Note(next(pitches), next(lengths), next(volumes))
+                 for _ in beats]
 
-        self.add_fromdict(d, merge=merge)
+        self.add_many(beats, notes, merge=merge)
 
     def make_chord(self, beat, pitches, lengths=1, volumes=0, merge=False):
         chord = self._make_chord_assemble(pitches, lengths, volumes)
@@ -419,18 +727,11 @@ class SamplerLikeTrack(Track):
     def make_chord_every(self, freq, offset=0, pitches=0, lengths=1, volumes=0,
                          start=1, end=None, merge=False):
 
-        freq = Fraction(freq).limit_denominator()
-
         chord = self._make_chord_assemble(pitches, lengths, volumes)
-        b = Fraction(start + offset).limit_denominator()
         if end is None:
             end = self.get_beats() + 1
-        d = {}
-        while b < end:
-            pos = b.numerator / b.denominator
-            d[pos] = chord
-            b += freq
-        self.add_fromdict(d, merge=merge)
+        beats = fraction_range(start + offset, end, freq)
+        self.add_many(beats, chord, merge=merge)
 
     def _make_chord_assemble(self, pitches, lengths, volumes):
         if not isinstance(pitches, Iterable) or isinstance(pitches, str):
@@ -458,6 +759,8 @@ class SamplerLikeTrack(Track):
                               '"cycle" or "random".')
 
 class SingleSampleTrack(Track):
+    _pitched = True
+
     def __init__(self, name, sample, sequencer, **kwargs):
         super().__init__(name=name, sequencer=sequencer, **kwargs)
         self._sample = None
@@ -469,22 +772,32 @@ class SingleSampleTrack(Track):
 
     @sample.setter
     def sample(self, sample):
+        self._sample = self._ingest(sample)
         if isinstance(sample, str):
-            _, ext = os.path.splitext(sample)
-            ext = ext.lower().strip('.')
-            self._sample = pydub.AudioSegment.from_file(sample,
-                                                        format=ext)
             self.samplepath = os.path.abspath(sample)
-        elif isinstance(sample, pydub.AudioSegment):
-            self._sample = sample
-        else:
-            raise WubWubError('sample must be a path or pydub.AudioSegment')
+
+    def _conform_samples(self):
+        if self._sample is not None:
+            self._sample = self._ingest(self._sample)
+
+    def _samples(self):
+        return () if self._sample is None else (self._sample,)
 
 class MultiSampleTrack(Track):
     def __init__(self, name, sequencer, **kwargs):
         super().__init__(name=name, sequencer=sequencer, **kwargs)
         self.samples = {}
 
+    def _conform_samples(self):
+        samples = getattr(self, 'samples', {})
+        for key, sample in samples.items():
+            samples[key] = self._ingest(sample)
+        if hasattr(self, 'default_sample'):
+            self.default_sample = self._ingest(self.default_sample)
+
+    def _samples(self):
+        return tuple(self.samples.values()) + (self.default_sample,)
+
 class Sampler(SingleSampleTrack, SamplerLikeTrack):
     def __init__(self, name, sample, sequencer, basepitch='C4', overlap=True):
         super().__init__(name=name, sample=sample, sequencer=sequencer,
@@ -495,43 +808,25 @@ class Sampler(SingleSampleTrack, SamplerLikeTrack):
     def __repr__(self):
         return f'Sampler(name="{self.name}")'
 
-    def build(self, overhang=0, overhang_type='beats'):
+    def _render(self, overhang=0, overhang_type='beats', stream=False):
         b = (1/self.get_bpm()) * MINUTE
         overhang = _overhang_to_milli(overhang, overhang_type, b)
         tracklength = self.get_beats() * b + overhang
-        audio = pydub.AudioSegment.silent(duration=tracklength)
+        audio = _new_audio(tracklength, stream, self._render_format())
         sample = self.sample
         basepitch = self.basepitch
-        next_position = np.inf
-        for beat, value in sorted(self.notedict.items(), reverse=True):
-            position = (beat-1) * b
-            if isinstance(value, Note):
-                note = value
-                duration = note.length * b
-                if (position + duration) > next_position and not self.overlap:
-                    duration = next_position - position
-                next_position = position
-                audio = add_note_to_audio(note=note,
-                                          audio=audio,
-                                          sample=sample,
-                                          position=position,
-                                          duration=duration,
-                                          basepitch=basepitch)
-            elif isinstance(value, Chord):
-                chord = value
-                for note in chord.notes:
-                    duration = note.length * b
-                    if (position + duration) > next_position and not self.overlap:
-                        duration = next_position - position
-                    audio = add_note_to_audio(note=note,
-                                              audio=audio,
-                                              sample=sample,
-                                              position=position,
-                                              duration=duration,
-                                              basepitch=basepitch)
-                next_position = position
-
-        return self.postprocess(audio)
+        schedule = self._note_schedule(b, semitones=True)
+        for batch in self._note_batches(schedule, b):
+            for position, duration, pitch, volume in batch:
+                audio = add_sample_to_audio(audio=audio,
+                                            sample=sample,
+                                            position=position,
+                                            duration=duration,
+                                            pitch=pitch,
+                                            volume=volume,
+                                            basepitch=basepitch)
+
+        return audio
 
     def soundtest(self, duration=None, postprocess=True,):
         test = self.sample
@@ -547,46 +842,28 @@ class MultiSampler(MultiSampleTrack, SamplerLikeTrack):
     def __init__(self, name, sequencer, overlap=True):
         super().__init__(name=name, sequencer=sequencer)
         self.overlap = overlap
-        self.default_sample = pydub.AudioSegment.empty()
+        self.default_sample = self._ingest(pydub.AudioSegment.empty())
 
     def __repr__(self):
         return f'MultiSampler(name="{self.name}")'
 
-    def build(self, overhang=0, overhang_type='beats'):
+    def _render(self, overhang=0, overhang_type='beats', stream=False):
         b = (1/self.get_bpm()) * MINUTE
         overhang = _overhang_to_milli(overhang, overhang_type, b)
         tracklength = self.get_beats() * b + overhang
-        audio = pydub.AudioSegment.silent(duration=tracklength)
-        next_position = np.inf
-        for beat, value in sorted(self.notedict.items(), reverse=True):
-            position = (beat-1) * b
-            if isinstance(value, Note):
-                note = value
-                duration = note.length * b
-                if (position + duration) > next_position and not self.overlap:
-                    duration = next_position - position
-                next_position = position
-                audio = add_note_to_audio(note=note,
-                                          audio=audio,
-                                          sample=self.get_sample(note.pitch),
-                                          position=position,
-                                          duration=duration,
-                                          shift=False)
-            elif isinstance(value, Chord):
-                chord = value
-                for note in chord.notes:
-                    duration = note.length * b
-                    if (position + duration) > next_position and not self.overlap:
-                        duration = next_position - position
-                    audio = add_note_to_audio(note=note,
-                                              audio=audio,
-                                              sample=self.get_sample(note.pitch),
-                                              position=position,
-                                              duration=duration,
-                                              shift=False)
-                next_position = position
-
-        return self.postprocess(audio)
+        audio = _new_audio(tracklength, stream, self._render_format())
+        schedule = self._note_schedule(b)
+        for batch in self._note_batches(schedule, b):
+            for position, duration, pitch, volume in batch:
+                audio = add_sample_to_audio(audio=audio,
+                                            sample=self.get_sample(pitch),
+                                            position=position,
+                                            duration=duration,
+                                            pitch=pitch,
+                                            volume=volume,
+                                            shift=False)
+
+        return audio
 
     def soundtest(self, duration=None, postprocess=True,):
         for k, v in self.samples.items():
@@ -600,26 +877,19 @@ class MultiSampler(MultiSampleTrack, SamplerLikeTrack):
             play(test[:duration])
 
     def add_sample(self, key, sample):
-        if isinstance(sample, str):
-            _, ext = os.path.splitext(sample)
-            ext = ext.lower().strip('.')
-            self.samples[key] = pydub.AudioSegment.from_file(sample,
-                                                             format=ext)
-        elif isinstance(sample, pydub.AudioSegment):
-            self.samples[key] = sample
-        else:
-            raise WubWubError('sample must be a path or pydub.AudioSegment')
+        self.samples[key] = self._ingest(sample)
 
     def get_sample(self, key):
         return self.samples.get(key, self.default_sample)
 
 class Arpeggiator(SingleSampleTrack):
     def __init__(self, name, sample, sequencer, basepitch='C4', freq=.5,
-                 method='up'):
+                 method='up', seed=None):
         super().__init__(name=name, sample=sample, sequencer=sequencer,)
         self.freq = freq
         self.method = method
         self.basepitch = basepitch
+        self.seed = seed
 
     def __repr__(self):
         return (f'Arpeggiator(name="{self.name}", '
@@ -630,28 +900,63 @@ class Arpeggiator(SingleSampleTrack):
         chord = ArpChord(notes, length)
         self.add(beat, chord, merge=merge,)
 
+    def _arpeggiate(self, chord, beat, length=None):
+        # the random method is seeded per beat, so that builds and plots agree
+        seed = None if self.seed is None else [self.seed, hash(beat) & (2**63 - 1)]
+        return arpeggiate_arrays(chord, beat=beat, length=length,
+                                 freq=self.freq, method=self.method, seed=seed)
+
+    def _render_arpeggio(self, chord, offsets, indices, lengths, b, shifted):
+        '''Render one arpeggiated chord on its own, with Notes starting at
+        `offsets` (in milliseconds).  `shifted` caches the sample at each
+        pitch.'''
+        pitches = pitches_to_semitones(chord.pitches, self.basepitch)
+        volumes = chord.volumes
+        duration = offsets[-1] + lengths[-1] * b
+        audio = _new_audio(duration + 2, fmt=self._render_format())
+        for offset, i, length in zip(offsets.tolist(), indices.tolist(),
+                                     lengths.tolist()):
+            pitch = pitches[i]
+            if np.isnan(pitch):
+                continue
+            profiling.cache('pitched samples', pitch in shifted)
+            metrics.cache('pitched samples', pitch in shifted)
+            if pitch not in shifted:
+                shifted[pitch] = _shift_sample(self.sample, pitch,
+                                             audio.frame_rate)
+            audio = add_sample_to_audio(audio=audio,
+                                        sample=shifted[pitch],
+                                        position=offset,
+                                        duration=length * b,
+                                        pitch=pitch,
+                                        volume=volumes[i],
+                                        shift=False)
+        return audio
+
     def make_chord_every(self, freq, offset=0, pitches=0, length=1,
                          start=1, end=None, merge=False):
         notes = [Note(p) for p in pitches]
         chord = ArpChord(notes, length)
-        b = start + offset
         if end is None:
             end = self.get_beats() + 1
-        d = {}
-        while b < end:
-            d[b] = chord
-            b += freq
-        self.add_fromdict(d, merge=merge)
+        beats = fraction_range(start + offset, end, freq)
+        self.add_many(beats, chord, merge=merge)
 
-    def build(self, overhang=0, overhang_type='beats'):
+    def _render(self, overhang=0, overhang_type='beats', stream=False):
         b = (1/self.get_bpm()) * MINUTE
         overhang = _overhang_to_milli(overhang, overhang_type, b)
         tracklength = self.get_beats() * b + overhang
-        audio = pydub.AudioSegment.silent(duration=tracklength)
-        sample = self.sample
-        basepitch = self.basepitch
+        audio = _new_audio(tracklength, stream, self._render_format())
         next_beat = np.inf
-        for beat, chord in sorted(self.notedict.items(), reverse=True):
+        # the sample, basepitch, freq and method are fixed during a build,
+        # so arpeggios are keyed on the chord, its length, the Notes
+        # played, and where each Note lands relative to the first frame
+        rendered = {}
+        shifted = {0.0: _shift_sample(self.sample, 0, audio.frame_rate)}
+        rate = max(audio.frame_rate, shifted[0.0].frame_rate) / 1000.0
+        seq = self.sequencer
+        for beat, chord in reversed(self._notes.data.items()):
+            hooks.check(seq)
             try:
                 length = chord.length
             except AttributeError:
@@ -659,19 +964,25 @@ class Arpeggiator(SingleSampleTrack):
             if beat + length >= next_beat:
                 length = next_beat - beat
             next_beat = beat
-            arpeggiated = arpeggiate(chord, beat=beat, length=length,
-                                     freq=self.freq, method=self.method)
-            for arpbeat, note in arpeggiated.items():
-                position = (arpbeat-1) * b
-                duration = note.length * b
-                audio = add_note_to_audio(note=note,
-                                          audio=audio,
-                                          sample=sample,
-                                          position=position,
-                                          duration=duration,
-                                          basepitch=basepitch)
-
-        return self.postprocess(audio)
+            beats, indices, lengths = self._arpeggiate(chord, beat, length)
+            if not len(beats):
+                continue
+            frames = ((beats - 1) * b * rate).astype(int)
+            frames -= frames[0]
+            key = (chord, length, indices.tobytes(), frames.tobytes())
+            profiling.cache('arpeggios', key in rendered)
+            metrics.cache('arpeggios', key in rendered)
+            position = (beats[0] - 1) * b
+            with self._span('notes', beat, beat + length):
+                if key not in rendered:
+                    profiling.set_origin(position)
+                    offsets = (frames + 0.5) / rate
+                    rendered[key] = self._render_arpeggio(
+                        chord, offsets, indices, lengths, b, shifted)
+                audio = audio.overlay(rendered[key], position=position)
+            metrics.OVERLAY_BYTES.inc(_overlaid_bytes(audio))
+
+        return audio
 
     def soundtest(self, duration=None, postprocess=True,):
         test = self.sample
@@ -685,15 +996,15 @@ class Arpeggiator(SingleSampleTrack):
 
     def unpack_notes(self, start=0, stop=np.inf,):
         unpacked = []
-        for b, element in self.notedict.items():
-            if not start <= b < stop:
-                continue
+        for b, element in self.noterange(start, stop):
             if isinstance(element, Note):
                 unpacked.append((b, element))
             elif type(element) in [Chord, ArpChord]:
-                arpeggiated = arpeggiate(element, beat=b,
-                                         freq=self.freq, method=self.method)
-                for k, v in arpeggiated.items():
-                    unpacked.append((k, v))
+                beats, indices, lengths = self._arpeggiate(element, b)
+                notes = element.notes
+                for k, i, l in zip(beats.tolist(), indices.tolist(),
+                                   lengths.tolist()):
+                    note = notes[i]
+                    unpacked.append((k, Note(note.pitch, l, note.volume)))
 
         return unpacked
\ No newline at end of file